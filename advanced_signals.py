@@ -5,37 +5,181 @@ import talib
 from sklearn.ensemble import RandomForestRegressor
 import joblib
 from datetime import datetime, timedelta
+import asyncio
+import logging
+import os
+import threading
+import time
+from market_data import MarketDataSource, create_market_data_source
+from candle_store import CandleStore
+from candle_resampler import ResampledCandleFeed, sync_closed_candles
+from incremental_indicators import IncrementalIndicatorEngine
+from model_registry import ModelRegistry
+from forest_compiler import CompiledForest
+from feature_cache import FeatureCache, FeatureFrame
+
+logger = logging.getLogger(__name__)
+
+# Exit levels in multiples of ATR away from the entry price
+TAKE_PROFIT_ATR = (1.5, 2.5)
+STOP_LOSS_ATR = 1.0
+
+# Candles features are computed over, for training and for live signals alike
+FEATURE_WINDOW = 500
+
+def model_paths(symbol: str) -> Tuple[str, str]:
+    """Paths of a symbol's joblib pickle and of its compiled form"""
+    name = symbol.replace('/', '_')
+    return f"models/{name}_model.joblib", f"models/{name}_model.npz"
+
+def fit_signal_model(symbol: str, data: pd.DataFrame, holdout: int = 0) -> Dict:
+    """Fit, compile and save the model of a symbol.
+    
+    Picklable so it can run in a worker process. Files are written with a
+    .tmp suffix; `publish_model_files` moves them in place once the model
+    has been accepted. The last `holdout` candles are kept out of training
+    and used to score the model.
+    """
+    started = time.perf_counter()
+    features = AdvancedSignalGenerator._calculate_features(data)
+    target = data['close'].pct_change().shift(-1).fillna(0)
+    train = len(features) - holdout
+    
+    model = RandomForestRegressor(n_estimators=100, random_state=42)
+    model.fit(features.iloc[:train], target.iloc[:train])
+    compiled = CompiledForest.from_sklearn(model)
+    
+    # The last candle has no next close to score against
+    predictions = compiled.predict(features.iloc[train:-1]) if holdout > 1 else np.array([])
+    actual = target.iloc[train:-1].to_numpy()
+    accuracy = float(np.mean(np.sign(predictions) == np.sign(actual))) if len(predictions) else None
+    
+    model_path, compiled_path = model_paths(symbol)
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    joblib.dump(model, f"{model_path}.tmp")
+    compiled.save(f"{compiled_path}.tmp")
+    
+    return {
+        'symbol': symbol,
+        'model': compiled,
+        'predictions': predictions,
+        'accuracy': accuracy,
+        'duration': time.perf_counter() - started,
+        'files': [model_path, compiled_path]
+    }
+
+def publish_model_files(result: Dict, accept: bool = True):
+    """Atomically move freshly trained model files in place, or discard them"""
+    for path in result['files']:
+        if accept:
+            os.replace(f"{path}.tmp", path)
+        elif os.path.exists(f"{path}.tmp"):
+            os.remove(f"{path}.tmp")
+
+def combined_signal_score(indicators, ml_prediction):
+    """Score combining ML and technical analysis, positive means BUY.
+    
+    Works on a single feature row as well as on whole feature columns, the
+    backtester scores every bar of a history at once with it.
+    """
+    # Technical signals
+    trend_signal = np.where(indicators['ema_9'] > indicators['ema_21'], 1, -1)
+    momentum_signal = np.where(indicators['rsi'] > 50, 1, -1)
+    volume_signal = np.where(indicators['volume_trend'] > 1, 1, -1)
+    
+    # Combine signals with ML prediction
+    return (
+        0.4 * np.sign(ml_prediction) +
+        0.3 * trend_signal +
+        0.2 * momentum_signal +
+        0.1 * volume_signal
+    )
 
 class AdvancedSignalGenerator:
-    def __init__(self, config):
+    def __init__(self, config, data_source: MarketDataSource = None):
         self.config = config
-        self.ml_models = {}
-        self.load_ml_models()
+        self.data_source = data_source or create_market_data_source(config)
+        self.candle_store = CandleStore(config.CANDLE_STORE_PATH, config.CANDLE_RING_SIZE)
+        # Every timeframe resampled from 1m candles instead of fetched on its own
+        self.candle_feed = ResampledCandleFeed(
+            self.data_source,
+            self.candle_store,
+            config.CANDLE_HISTORY_LIMIT
+        ) if config.CANDLE_RESAMPLING else None
+        self.indicator_engine = IncrementalIndicatorEngine(FEATURE_WINDOW)
+        self.feature_cache = FeatureCache(config.FEATURE_CACHE_SIZE)
+        # Candles are synced and indicators updated from worker threads, one at a time
+        self._data_lock = threading.Lock()
+        # Models load on first use, missing ones are trained in the background
+        self.model_registry = ModelRegistry(
+            self._load_model,
+            self._train_new_model,
+            config.MODEL_TRAINING_WORKERS,
+            config.MODEL_RETRY_DELAY
+        )
+        self.ml_models = self.model_registry.models
     
     def load_ml_models(self):
-        """Load pre-trained ML models for each supported coin"""
+        """Warm up the models of every supported coin without blocking"""
         for coin in self.config.SUPPORTED_COINS:
-            try:
-                model_path = f"models/{coin.replace('/', '_')}_model.joblib"
-                self.ml_models[coin] = joblib.load(model_path)
-            except:
-                self.ml_models[coin] = self._train_new_model(coin)
+            self.model_registry.get(coin)
     
-    def _train_new_model(self, symbol: str) -> RandomForestRegressor:
-        """Train a new model if not existing"""
-        # Get historical data
-        data = self._get_historical_data(symbol)
-        features = self._calculate_features(data)
-        target = data['close'].pct_change().shift(-1).fillna(0)
-        
-        model = RandomForestRegressor(n_estimators=100, random_state=42)
-        model.fit(features, target)
+    def _model_path(self, symbol: str) -> str:
+        return model_paths(symbol)[0]
+    
+    def _compiled_model_path(self, symbol: str) -> str:
+        return model_paths(symbol)[1]
+    
+    def _load_model(self, symbol: str) -> CompiledForest:
+        """Load a pre-trained model, preferring its compiled form"""
+        if os.path.exists(self._compiled_model_path(symbol)):
+            return CompiledForest.load(self._compiled_model_path(symbol))
         
-        # Save model
-        joblib.dump(model, f"models/{symbol.replace('/', '_')}_model.joblib")
-        return model
+        # Older models only have the joblib pickle, compile them once
+        compiled = CompiledForest.from_sklearn(joblib.load(self._model_path(symbol), mmap_mode='r'))
+        compiled.save(self._compiled_model_path(symbol))
+        return compiled
+    
+    def _train_new_model(self, symbol: str) -> CompiledForest:
+        """Train a new model if not existing"""
+        result = fit_signal_model(symbol, self._get_historical_data(symbol))
+        publish_model_files(result)
+        return result['model']
+    
+    def validate_model(self, result: Dict) -> bool:
+        """Check a retrained model before it replaces the live one"""
+        if not np.all(np.isfinite(result['predictions'])):
+            return False
+        if result['accuracy'] is not None and result['accuracy'] < self.config.MODEL_MIN_ACCURACY:
+            return False
+        return True
+    
+    def publish_model(self, result: Dict):
+        """Move an accepted model's files in place and swap it in for new requests"""
+        publish_model_files(result)
+        self.model_registry.swap(result['symbol'], result['model'])
+    
+    def _get_historical_data(self, symbol: str, timeframe: str = '1h', limit: int = FEATURE_WINDOW) -> pd.DataFrame:
+        """Get OHLCV history from the local candle store"""
+        with self._data_lock:
+            self._sync_candles(symbol, timeframe)
+            return self.candle_store.to_frame(symbol, timeframe, limit)
     
-    def _calculate_features(self, df: pd.DataFrame) -> pd.DataFrame:
+    def ingest_candle(self, symbol: str, candle: Dict) -> List[Dict]:
+        """Store a closed 1m candle pushed by the market stream"""
+        # Under the same lock as the readers of the store and the indicator state
+        with self._data_lock:
+            return self.candle_feed.ingest(symbol, candle)
+    
+    def _sync_candles(self, symbol: str, timeframe: str):
+        """Fetch the closed candles the store doesn't have yet"""
+        if self.candle_feed is not None:
+            self.candle_feed.sync(symbol)
+        else:
+            sync_closed_candles(self.data_source, self.candle_store, symbol, timeframe, self.config.CANDLE_HISTORY_LIMIT)
+    
+    @staticmethod
+    def _calculate_features(df: pd.DataFrame) -> pd.DataFrame:
         """Calculate technical indicators as features"""
         df = df.copy()
         
@@ -67,49 +211,125 @@ class AdvancedSignalGenerator:
         
         return df.fillna(0)
     
-    async def generate_premium_signal(self, symbol: str) -> Dict:
+    async def generate_premium_signal(self, symbol: str, timeframe: str = '1h') -> Dict:
         """Generate advanced trading signals with ML predictions"""
-        try:
-            # Get recent data
-            data = self._get_historical_data(symbol)
-            features = self._calculate_features(data)
-            
-            # Get ML prediction
-            latest_features = features.iloc[-1:]
-            prediction = self.ml_models[symbol].predict(latest_features)[0]
-            
-            # Calculate confidence score
-            confidence = self._calculate_confidence(features.iloc[-1])
-            
-            # Generate signal based on multiple factors
-            signal = self._generate_combined_signal(features.iloc[-1], prediction)
+        result = await self.generate_premium_signals([symbol], timeframe)
+        return result['signals'].get(symbol)
+    
+    async def generate_premium_signals(self, symbols: List[str], timeframe: str = '1h') -> Dict:
+        """Generate premium signals for many symbols with one prediction call per model"""
+        # Candle fetches and TA-Lib block, they run in a thread
+        frames = await asyncio.to_thread(self._get_feature_frames, symbols, timeframe)
+        
+        predictions, batches = self._predict_batch({symbol: frame.row for symbol, frame in frames.items()})
+        
+        signals = {}
+        for symbol, frame in frames.items():
+            try:
+                signals[symbol] = self._build_premium_signal(symbol, frame, predictions.get(symbol))
+            except Exception as e:
+                logger.error(f"Error generating premium signal: {str(e)}")
+                signals[symbol] = None
+        
+        return {'signals': signals, 'batches': batches}
+    
+    def _get_feature_frames(self, symbols: List[str], timeframe: str) -> Dict[str, FeatureFrame]:
+        frames = {}
+        for symbol in symbols:
+            try:
+                frames[symbol] = self._get_feature_frame(symbol, timeframe)
+            except Exception as e:
+                logger.error(f"Error preparing premium signal for {symbol}: {str(e)}")
+        return frames
+    
+    def _get_feature_frame(self, symbol: str, timeframe: str) -> FeatureFrame:
+        """Features of the latest closed candle, computed once per candle"""
+        with self._data_lock:
+            self._sync_candles(symbol, timeframe)
+            key = (symbol, timeframe, self.candle_store.series(symbol, timeframe).last_timestamp)
+            return self.feature_cache.get_or_compute(key, lambda: self._compute_feature_frame(symbol, timeframe))
+    
+    def _compute_feature_frame(self, symbol: str, timeframe: str) -> FeatureFrame:
+        # Only candles we haven't seen yet update the indicators
+        data = self.candle_store.to_frame(symbol, timeframe, FEATURE_WINDOW)
+        row = self.indicator_engine.update(symbol, timeframe, data)
+        
+        if self.config.VERIFY_INCREMENTAL_INDICATORS:
+            self._verify_indicators(symbol, timeframe, data)
+        
+        return FeatureFrame(row)
+    
+    def _predict_batch(self, latest: Dict[str, pd.Series]) -> Tuple[Dict[str, float], List[Dict]]:
+        """Run one vectorized prediction per model over the stacked feature rows of its symbols"""
+        groups = {}
+        for symbol in latest:
+            # Rule-based only until the model is ready
+            model = self.model_registry.get(symbol)
+            if model is not None:
+                groups.setdefault(id(model), (model, []))[1].append(symbol)
+        
+        predictions = {}
+        batches = []
+        for model, symbols in groups.values():
+            try:
+                started = time.perf_counter()
+                rows = model.predict(pd.DataFrame([latest[symbol] for symbol in symbols]))
+                latency = (time.perf_counter() - started) * 1000
+            except Exception as e:
+                logger.error(f"Error predicting {symbols}: {str(e)}")
+                continue
             
-            return {
-                'symbol': symbol,
-                'timestamp': datetime.utcnow(),
-                'price': data['close'].iloc[-1],
-                'signal': signal['direction'],
-                'confidence': confidence,
-                'prediction': {
-                    'direction': 'UP' if prediction > 0 else 'DOWN',
-                    'expected_change': abs(prediction * 100),
-                    'timeframe': '24h'
-                },
-                'indicators': {
-                    'rsi': features['rsi'].iloc[-1],
-                    'macd': features['macd'].iloc[-1],
-                    'macd_signal': features['macd_signal'].iloc[-1],
-                    'adx': features['adx'].iloc[-1],
-                    'bb_position': features['price_position'].iloc[-1],
-                    'trend_strength': features['trend_strength'].iloc[-1]
-                },
-                'risk_level': self._calculate_risk_level(features.iloc[-1]),
-                'suggested_entry': self._calculate_entry_points(data, signal['direction']),
-                'suggested_exit': self._calculate_exit_points(data, signal['direction'])
-            }
-        except Exception as e:
-            logger.error(f"Error generating premium signal: {str(e)}")
-            return None
+            predictions.update(zip(symbols, rows))
+            batches.append({'symbols': symbols, 'size': len(symbols), 'latency_ms': latency})
+            logger.debug(f"Predicted {len(symbols)} symbols in {latency:.2f}ms")
+        
+        return predictions, batches
+    
+    def _build_premium_signal(self, symbol: str, features: FeatureFrame, prediction: float = None) -> Dict:
+        """Assemble the premium signal of a symbol from its latest features"""
+        latest = features.row
+        ml_prediction = prediction if prediction is not None else 0.0
+        
+        # Calculate confidence score
+        confidence = self._calculate_confidence(latest)
+        
+        # Generate signal based on multiple factors
+        signal = self._generate_combined_signal(latest, ml_prediction)
+        
+        return {
+            'symbol': symbol,
+            'timestamp': datetime.utcnow(),
+            'price': features.price,
+            'signal': signal['direction'],
+            'confidence': confidence,
+            'prediction': {
+                'direction': 'UP' if prediction > 0 else 'DOWN',
+                'expected_change': abs(prediction * 100),
+                'timeframe': '24h'
+            } if prediction is not None else None,
+            'indicators': {
+                'rsi': latest['rsi'],
+                'macd': latest['macd'],
+                'macd_signal': latest['macd_signal'],
+                'adx': latest['adx'],
+                'bb_position': latest['price_position'],
+                'trend_strength': latest['trend_strength']
+            },
+            'risk_level': self._calculate_risk_level(latest),
+            'suggested_entry': self._calculate_entry_points(features, signal['direction']),
+            'suggested_exit': self._calculate_exit_points(features, signal['direction'])
+        }
+    
+    def _verify_indicators(self, symbol: str, timeframe: str, data: pd.DataFrame):
+        """Check the live streamed features against a batch TA-Lib run over the latest candles"""
+        mismatches = self.indicator_engine.verify(
+            symbol,
+            timeframe,
+            self._calculate_features(data),
+            rtol=self.config.INDICATOR_VERIFY_TOLERANCE
+        )
+        if mismatches:
+            logger.warning(f"Incremental indicators for {symbol} {timeframe} differ from TA-Lib: {mismatches}")
     
     def _calculate_confidence(self, indicators) -> float:
         """Calculate signal confidence score"""
@@ -124,28 +344,17 @@ class AdvancedSignalGenerator:
     
     def _generate_combined_signal(self, indicators, ml_prediction) -> Dict:
         """Generate trading signal combining ML and technical analysis"""
-        # Technical signals
-        trend_signal = 1 if indicators['ema_9'] > indicators['ema_21'] else -1
-        momentum_signal = 1 if indicators['rsi'] > 50 else -1
-        volume_signal = 1 if indicators['volume_trend'] > 1 else -1
-        
-        # Combine signals with ML prediction
-        combined_score = (
-            0.4 * np.sign(ml_prediction) +
-            0.3 * trend_signal +
-            0.2 * momentum_signal +
-            0.1 * volume_signal
-        )
+        combined_score = float(combined_signal_score(indicators, ml_prediction))
         
         return {
             'direction': 'BUY' if combined_score > 0 else 'SELL',
             'strength': abs(combined_score)
         }
     
-    def _calculate_entry_points(self, data: pd.DataFrame, signal: str) -> Dict:
+    def _calculate_entry_points(self, features: FeatureFrame, signal: str) -> Dict:
         """Calculate suggested entry points"""
-        current_price = data['close'].iloc[-1]
-        atr = talib.ATR(data['high'], data['low'], data['close']).iloc[-1]
+        current_price = features.price
+        atr = features.atr
         
         if signal == 'BUY':
             return {
@@ -160,23 +369,17 @@ class AdvancedSignalGenerator:
                 'aggressive': current_price - 0.3 * atr
             }
     
-    def _calculate_exit_points(self, data: pd.DataFrame, signal: str) -> Dict:
+    def _calculate_exit_points(self, features: FeatureFrame, signal: str) -> Dict:
         """Calculate suggested exit points"""
-        current_price = data['close'].iloc[-1]
-        atr = talib.ATR(data['high'], data['low'], data['close']).iloc[-1]
+        current_price = features.price
+        atr = features.atr
+        side = 1 if signal == 'BUY' else -1
         
-        if signal == 'BUY':
-            return {
-                'take_profit_1': current_price + 1.5 * atr,
-                'take_profit_2': current_price + 2.5 * atr,
-                'stop_loss': current_price - atr
-            }
-        else:
-            return {
-                'take_profit_1': current_price - 1.5 * atr,
-                'take_profit_2': current_price - 2.5 * atr,
-                'stop_loss': current_price + atr
-            }
+        return {
+            'take_profit_1': current_price + side * TAKE_PROFIT_ATR[0] * atr,
+            'take_profit_2': current_price + side * TAKE_PROFIT_ATR[1] * atr,
+            'stop_loss': current_price - side * STOP_LOSS_ATR * atr
+        }
     
     def _calculate_risk_level(self, indicators) -> str:
         """Calculate risk level based on market conditions"""
@@ -0,0 +1,104 @@
+from typing import Dict, List, Tuple
+from bisect import bisect_left, bisect_right, insort
+import logging
+from sqlalchemy import select
+from database import Alert, follow_commits
+
+logger = logging.getLogger(__name__)
+
+class AlertIndex:
+    """In-memory index of the price alerts, two sorted lists per coin pair.
+
+    'above' alerts fire once the price is at or over their threshold,
+    'below' alerts once it is at or under it. Each list holds
+    (threshold, alert id) in ascending order, so the alerts a price
+    triggers are a prefix of one list and a suffix of the other, found by
+    bisection in O(log n + k).
+
+    Bound to sessions, the index follows the alerts committed through them:
+    changes are applied once their transaction commits.
+    """
+
+    def __init__(self):
+        self._above: Dict[str, List[Tuple[float, int]]] = {}
+        self._below: Dict[str, List[Tuple[float, int]]] = {}
+        self._alerts: Dict[int, Tuple[str, float, bool]] = {}
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._alerts)
+
+    def __contains__(self, alert_id: int) -> bool:
+        return alert_id in self._alerts
+
+    def pairs(self) -> List[str]:
+        """Coin pairs with at least one alert"""
+        return [pair for pair in set(self._above) | set(self._below)
+                if self._above.get(pair) or self._below.get(pair)]
+
+    def add(self, alert_id: int, coin_pair: str, threshold: float, is_above: bool):
+        if alert_id in self._alerts:
+            self.remove(alert_id)
+        side = self._above if is_above else self._below
+        insort(side.setdefault(coin_pair, []), (threshold, alert_id))
+        self._alerts[alert_id] = (coin_pair, threshold, is_above)
+
+    def remove(self, alert_id: int) -> bool:
+        entry = self._alerts.pop(alert_id, None)
+        if entry is None:
+            return False
+        coin_pair, threshold, is_above = entry
+        thresholds = (self._above if is_above else self._below)[coin_pair]
+        del thresholds[bisect_left(thresholds, (threshold, alert_id))]
+        return True
+
+    def reached_above(self, coin_pair: str, price: float) -> List[int]:
+        """Ids of the 'above' alerts at or under `price`"""
+        thresholds = self._above.get(coin_pair, [])
+        return [alert_id for _, alert_id in thresholds[:bisect_right(thresholds, (price, float('inf')))]]
+
+    def reached_below(self, coin_pair: str, price: float) -> List[int]:
+        """Ids of the 'below' alerts at or over `price`"""
+        thresholds = self._below.get(coin_pair, [])
+        return [alert_id for _, alert_id in thresholds[bisect_left(thresholds, (price, float('-inf'))):]]
+
+    def triggered(self, coin_pair: str, price: float) -> List[int]:
+        """Ids of the alerts the price has reached"""
+        return self.reached_above(coin_pair, price) + self.reached_below(coin_pair, price)
+
+    async def load(self, session):
+        """(Re)build the index from the alerts table"""
+        self._above.clear()
+        self._below.clear()
+        self._alerts.clear()
+
+        rows = await session.stream(
+            select(Alert.id, Alert.coin_pair, Alert.price_threshold, Alert.is_above).execution_options(yield_per=10000)
+        )
+        async for alert_id, coin_pair, threshold, is_above in rows:
+            side = self._above if is_above else self._below
+            side.setdefault(coin_pair, []).append((threshold, alert_id))
+            self._alerts[alert_id] = (coin_pair, threshold, is_above)
+        for thresholds in list(self._above.values()) + list(self._below.values()):
+            thresholds.sort()
+
+        self.loaded = True
+        logger.info(f"Indexed {len(self._alerts)} alerts on {len(self.pairs())} pairs")
+
+    def bind(self, target):
+        """Keep the index in sync with the alerts committed through `target`.
+
+        A session, or a Session class to follow every session of it (like
+        Database.session_class).
+        """
+        follow_commits(target, Alert, self._snapshot, self._apply)
+
+    @staticmethod
+    def _snapshot(alert: Alert) -> Tuple[str, float, bool]:
+        return alert.coin_pair, alert.price_threshold, alert.is_above
+
+    def _apply(self, alert_id: int, entry):
+        if entry is None:
+            self.remove(alert_id)
+        else:
+            self.add(alert_id, *entry)
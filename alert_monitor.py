@@ -0,0 +1,152 @@
+from typing import Awaitable, Callable, Dict, List, Set, Tuple
+from bisect import bisect_left
+import asyncio
+import logging
+import time
+from alert_index import AlertIndex
+
+logger = logging.getLogger(__name__)
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram, cheap enough to update on every alert"""
+
+    BOUNDS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds: float):
+        ms = seconds * 1000
+        self.counts[bisect_left(self.BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile, in ms"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.BOUNDS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(float(bound), self.max_ms)
+        return self.max_ms
+
+    def snapshot(self) -> Dict:
+        buckets = {f"<={bound}ms": count for bound, count in zip(self.BOUNDS_MS, self.counts)}
+        buckets[f">{self.BOUNDS_MS[-1]}ms"] = self.counts[-1]
+        return {
+            'count': self.count,
+            'avg_ms': self.total_ms / self.count if self.count else 0.0,
+            'p50_ms': self.quantile(0.5),
+            'p95_ms': self.quantile(0.95),
+            'p99_ms': self.quantile(0.99),
+            'max_ms': self.max_ms,
+            'buckets': buckets
+        }
+
+class AlertMonitor:
+    """Evaluates price alerts on every tick of the market stream.
+
+    Stream events are taken a micro-batch at a time; per symbol the highest
+    price of the batch is checked against the 'above' alerts and the lowest
+    against the 'below' ones, so a spike that reverts within the batch (or
+    within a kline) still fires. An alert is queued for notification once:
+    until its delivery is done it is skipped, a failed delivery is retried
+    after `retry_delay` seconds. The notification queue is bounded, a full
+    queue holds evaluation back rather than growing.
+
+    Latencies are measured from when the tick was received to when the
+    alert was queued and to when the notification went out.
+    """
+
+    def __init__(self, index: AlertIndex, queue_size: int = 1000, batch_size: int = 100,
+                 retry_delay: float = 60):
+        self.index = index
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self._pending: Set[int] = set()
+        self.latency = {'queued': LatencyHistogram(), 'notified': LatencyHistogram()}
+        self.stats = {'ticks': 0, 'batches': 0, 'triggered': 0, 'duplicates': 0, 'notified': 0, 'failed': 0}
+
+    async def evaluate(self, symbol: str, high: float, low: float, received: float):
+        """Queue the alerts the price range [low, high] of a symbol reached"""
+        for price, alert_ids in ((high, self.index.reached_above(symbol, high)),
+                                 (low, self.index.reached_below(symbol, low))):
+            for alert_id in alert_ids:
+                if alert_id in self._pending:
+                    self.stats['duplicates'] += 1
+                    continue
+                self._pending.add(alert_id)
+                self.stats['triggered'] += 1
+                await self.queue.put((alert_id, price, received))
+                self.latency['queued'].observe(time.monotonic() - received)
+
+    async def consume(self, events: asyncio.Queue):
+        """Evaluate trade, ticker and kline events as they arrive"""
+        while True:
+            batch = [await events.get()]
+            while not events.empty() and len(batch) < self.batch_size:
+                batch.append(events.get_nowait())
+            self.stats['ticks'] += len(batch)
+            self.stats['batches'] += 1
+
+            ranges: Dict[str, List[float]] = {}
+            for event in batch:
+                if event['type'] == 'kline':
+                    high, low = event['high'], event['low']
+                else:
+                    high = low = event['last']
+                received = event.get('received', time.monotonic())
+                span = ranges.get(event['symbol'])
+                if span is None:
+                    ranges[event['symbol']] = [high, low, received]
+                else:
+                    span[0] = max(span[0], high)
+                    span[1] = min(span[1], low)
+                    # Time from the first tick of the batch, on the safe side
+                    span[2] = min(span[2], received)
+
+            for symbol, (high, low, received) in ranges.items():
+                await self.evaluate(symbol, high, low, received)
+
+    async def dispatch(self, deliver: Callable[[Dict[int, float]], Awaitable[Set[int]]]):
+        """Hand queued alerts to `deliver` ({alert id: price} -> ids notified) in batches"""
+        while True:
+            batch: List[Tuple[int, float, float]] = [await self.queue.get()]
+            while not self.queue.empty() and len(batch) < self.batch_size:
+                batch.append(self.queue.get_nowait())
+
+            try:
+                delivered = await deliver({alert_id: price for alert_id, price, _ in batch})
+            except Exception as e:
+                logger.error(f"Error delivering alerts: {str(e)}")
+                delivered = set()
+
+            now = time.monotonic()
+            loop = asyncio.get_running_loop()
+            for alert_id, _, received in batch:
+                if alert_id in delivered:
+                    self.stats['notified'] += 1
+                    self.latency['notified'].observe(now - received)
+                    self._pending.discard(alert_id)
+                elif alert_id in self.index:
+                    self.stats['failed'] += 1
+                    loop.call_later(self.retry_delay, self._pending.discard, alert_id)
+                else:
+                    # Deleted in the meantime
+                    self._pending.discard(alert_id)
+
+    def metrics(self) -> Dict:
+        return {
+            **self.stats,
+            'queue_depth': self.queue.qsize(),
+            'pending': len(self._pending),
+            'latency': {stage: histogram.snapshot() for stage, histogram in self.latency.items()}
+        }
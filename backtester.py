@@ -0,0 +1,184 @@
+from typing import Dict, List
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+import time
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from advanced_signals import (
+    AdvancedSignalGenerator, combined_signal_score, model_paths, TAKE_PROFIT_ATR, STOP_LOSS_ATR
+)
+from candle_store import CandleStore, columns_to_frame
+from forest_compiler import CompiledForest
+
+def _first_hit(hits: np.ndarray) -> np.ndarray:
+    """Column of the first True of every row, the row length when there is none"""
+    return np.where(hits.any(axis=1), hits.argmax(axis=1), hits.shape[1])
+
+def simulate_exits(side: np.ndarray, close: np.ndarray, high: np.ndarray, low: np.ndarray,
+                   atr: np.ndarray, horizon: int, chunk_size: int = 50_000) -> Dict[str, np.ndarray]:
+    """Walk every bar's trade forward through the next `horizon` candles at once.
+
+    Half the position exits at TP1, the other half at TP2, both at the stop
+    loss if it comes first. When a target and the stop are touched by the
+    same candle the stop is assumed to have filled, the candles don't tell
+    which came first. Legs still open after `horizon` candles exit at its
+    close. Returns per trade the return and exit bar of both legs, as well
+    as how every leg ended.
+    """
+    trades = len(close) - horizon
+    side = side[:trades]
+    entry = close[:trades]
+    # Row i holds the candles i+1 .. i+horizon, views into the original columns
+    highs = sliding_window_view(high[1:], horizon)
+    lows = sliding_window_view(low[1:], horizon)
+
+    first = {name: np.empty(trades, dtype=np.int64) for name in ('tp1', 'tp2', 'sl')}
+    for lo in range(0, trades, chunk_size):
+        hi = min(lo + chunk_size, trades)
+        long = side[lo:hi, None] > 0
+        # Distances in the trade's favour and against it, in ATRs from the entry
+        favourable = np.where(long, highs[lo:hi], lows[lo:hi]) - entry[lo:hi, None]
+        adverse = np.where(long, lows[lo:hi], highs[lo:hi]) - entry[lo:hi, None]
+        favourable *= side[lo:hi, None] / atr[lo:hi, None]
+        adverse *= -side[lo:hi, None] / atr[lo:hi, None]
+
+        first['tp1'][lo:hi] = _first_hit(favourable >= TAKE_PROFIT_ATR[0])
+        first['tp2'][lo:hi] = _first_hit(favourable >= TAKE_PROFIT_ATR[1])
+        first['sl'][lo:hi] = _first_hit(adverse >= STOP_LOSS_ATR)
+
+    bars = np.arange(trades)
+    timeout_return = side * (close[horizon:] - entry) / entry
+    result = {}
+    for leg, target in (('tp1', TAKE_PROFIT_ATR[0]), ('tp2', TAKE_PROFIT_ATR[1])):
+        take_profit = first[leg] < first['sl']
+        stop_loss = ~take_profit & (first['sl'] < horizon)
+        result[f'{leg}_hit'] = take_profit
+        result[f'{leg}_stopped'] = stop_loss
+        result[f'{leg}_return'] = np.select(
+            [take_profit, stop_loss],
+            [target * atr[:trades] / entry, -STOP_LOSS_ATR * atr[:trades] / entry],
+            timeout_return
+        )
+        # A leg still open after `horizon` candles exits on the last of them, bar i + horizon
+        result[f'{leg}_exit_bar'] = bars + 1 + np.minimum(np.minimum(first[leg], first['sl']), horizon - 1)
+    result['timeout_return'] = timeout_return
+    return result
+
+def backtest_frame(data: pd.DataFrame, model: CompiledForest = None, horizon: int = 24,
+                   fee: float = 0.001, warmup: int = 200) -> Dict:
+    """Backtest the combined ML + TA signal on every candle of an OHLCV history.
+
+    Features, model predictions, signals and fills are all computed for the
+    whole history at once. With a model, bars it was trained on are scored
+    in-sample, so its share of the signal looks better than it is live.
+    PnL and drawdown are sums of per-trade returns at equal notional (0.01
+    is 1%), every bar with a non-zero ATR opens a trade and its legs are
+    realized on the bar they exit. `fee` is charged per side.
+    """
+    started = time.perf_counter()
+    features = AdvancedSignalGenerator._calculate_features(data)
+    # The first candles don't have enough history for the slower indicators
+    features = features.iloc[warmup:]
+    if len(features) <= horizon:
+        raise ValueError(f"Need more than {warmup + horizon} candles, got {len(data)}")
+
+    ml_prediction = model.predict(features) if model is not None else np.zeros(len(features))
+    side = np.where(combined_signal_score(features, ml_prediction) > 0, 1.0, -1.0)
+
+    close = features['close'].to_numpy(np.float64)
+    atr = features['atr'].to_numpy(np.float64)
+    # Every candle stays in the exit windows, candles without an ATR to size targets on just open no trade
+    entries = atr[:len(close) - horizon] > 0
+    if not entries.any():
+        raise ValueError("No candle with a non-zero ATR to trade on")
+    exits = simulate_exits(
+        side,
+        close,
+        features['high'].to_numpy(np.float64),
+        features['low'].to_numpy(np.float64),
+        np.where(atr > 0, atr, np.nan),
+        horizon
+    )
+    exits = {name: values[entries] for name, values in exits.items()}
+    trades = int(entries.sum())
+    returns = 0.5 * (exits['tp1_return'] + exits['tp2_return']) - 2 * fee
+
+    # Realized PnL per bar, then the equity curve it adds up to
+    realized = (
+        np.bincount(exits['tp1_exit_bar'], weights=0.5 * exits['tp1_return'] - fee, minlength=len(close)) +
+        np.bincount(exits['tp2_exit_bar'], weights=0.5 * exits['tp2_return'] - fee, minlength=len(close))
+    )
+    equity = np.cumsum(realized)
+    drawdown = np.maximum.accumulate(np.maximum(equity, 0)) - equity
+    entry_bars = np.flatnonzero(entries)
+
+    return {
+        'start': features.index[entry_bars[0]],
+        'end': features.index[entry_bars[-1]],
+        'trades': trades,
+        'long_share': float(np.mean(side[entry_bars] > 0)),
+        'accuracy': float(np.mean(exits['timeout_return'] > 0)),
+        'tp1_hit_rate': float(np.mean(exits['tp1_hit'])),
+        'tp2_hit_rate': float(np.mean(exits['tp2_hit'])),
+        'stop_rate': float(np.mean(exits['tp1_stopped'])),
+        'win_rate': float(np.mean(returns > 0)),
+        'avg_return': float(returns.mean()),
+        'pnl': float(returns.sum()),
+        'max_drawdown': float(drawdown.max()),
+        'runtime': time.perf_counter() - started
+    }
+
+def backtest_symbol(store_root: str, symbol: str, timeframe: str = '1h', start_ts: int = None,
+                    end_ts: int = None, use_model: bool = True, **kwargs) -> Dict:
+    """Backtest one symbol from the candle store, runs in a worker process"""
+    started = time.perf_counter()
+    columns = CandleStore(store_root).series(symbol, timeframe).range(start_ts, end_ts)
+    data = columns_to_frame(columns)
+
+    compiled_path = model_paths(symbol)[1]
+    model = CompiledForest.load(compiled_path) if use_model and os.path.exists(compiled_path) else None
+
+    report = backtest_frame(data, model, **kwargs)
+    report.update({'symbol': symbol, 'timeframe': timeframe, 'model': model is not None})
+    report['runtime'] = time.perf_counter() - started
+    return report
+
+def run_backtests(config, symbols: List[str], timeframe: str = '1h', processes: int = None,
+                  **kwargs) -> Dict[str, Dict]:
+    """Backtest many symbols in parallel, one worker process per symbol at a time"""
+    kwargs.setdefault('horizon', config.BACKTEST_HORIZON)
+    kwargs.setdefault('fee', config.BACKTEST_FEE)
+    reports = {}
+    with ProcessPoolExecutor(max_workers=processes or config.BACKTEST_PROCESSES) as pool:
+        futures = {
+            pool.submit(backtest_symbol, config.CANDLE_STORE_PATH, symbol, timeframe, **kwargs): symbol
+            for symbol in symbols
+        }
+        for future in as_completed(futures):
+            try:
+                reports[futures[future]] = future.result()
+            except Exception as e:
+                reports[futures[future]] = {'symbol': futures[future], 'error': str(e)}
+    return reports
+
+if __name__ == "__main__":
+    import sys
+    from config import BotConfig
+
+    config = BotConfig()
+    symbols = sys.argv[1:] or ['BTC/USDT', 'ETH/USDT', 'BNB/USDT', 'SOL/USDT']
+
+    started = time.perf_counter()
+    reports = run_backtests(config, symbols)
+    for symbol in symbols:
+        report = reports[symbol]
+        if 'error' in report:
+            print(f"{symbol}: {report['error']}")
+            continue
+        print(
+            f"{symbol}: {report['trades']} trades, accuracy {report['accuracy']:.1%}, "
+            f"TP1 {report['tp1_hit_rate']:.1%}, TP2 {report['tp2_hit_rate']:.1%}, SL {report['stop_rate']:.1%}, "
+            f"PnL {report['pnl']:+.2%}, max drawdown {report['max_drawdown']:.2%}, {report['runtime']:.2f}s"
+        )
+    print(f"Total: {time.perf_counter() - started:.2f}s")
@@ -1,8 +1,11 @@
 import logging
 from telegram import Update
-from telegram.ext import Updater, CommandHandler, MessageHandler, Filters, CallbackContext
+from telegram.ext import Application, CommandHandler, ContextTypes
 import ccxt
 import json
+from config import BotConfig
+from price_cache import shared_price_cache
+from request_scheduler import USER, shared_scheduler
 
 # Load configuration
 with open('config.json', 'r') as f:
@@ -21,52 +24,61 @@ exchange = ccxt.binance({
     'secret': config['apiSecret'],
 })
 
+bot_config = BotConfig()
+# Every exchange call of the process waits for its share of the rate limit, in one queue
+scheduler = shared_scheduler(bot_config)
+# /price and payment quotes share the same tickers, a burst of requests costs one round-trip
+price_cache = shared_price_cache(bot_config)
+
 # Define command handlers
-def start(update: Update, context: CallbackContext) -> None:
-    update.message.reply_text('Welcome to the Memecoin Trading Bot! Use /help to see available commands.')
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.message.reply_text('Welcome to the Memecoin Trading Bot! Use /help to see available commands.')
 
-def help_command(update: Update, context: CallbackContext) -> None:
-    update.message.reply_text('Available commands:\n'
-                              '/start - Start the bot\n'
-                              '/help - Get help\n'
-                              '/price <symbol> - Get the current price of a memecoin\n'
-                              '/trade <symbol> <amount> - Trade a memecoin\n'
-                              '/subscribe - Subscribe to the premium version')
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.message.reply_text('Available commands:\n'
+                                    '/start - Start the bot\n'
+                                    '/help - Get help\n'
+                                    '/price <symbol> - Get the current price of a memecoin\n'
+                                    '/trade <symbol> <amount> - Trade a memecoin\n'
+                                    '/subscribe - Subscribe to the premium version')
 
-def price(update: Update, context: CallbackContext) -> None:
+async def price(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     try:
         symbol = context.args[0].upper()
-        ticker = exchange.fetch_ticker(symbol)
-        update.message.reply_text(f"The current price of {symbol} is {ticker['last']}")
+        ticker = await price_cache.get(symbol)
+        await update.message.reply_text(f"The current price of {symbol} is {ticker['last']}")
     except Exception as e:
-        update.message.reply_text(f"Error fetching price: {e}")
+        await update.message.reply_text(f"Error fetching price: {e}")
 
-def trade(update: Update, context: CallbackContext) -> None:
+async def trade(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     try:
         symbol = context.args[0].upper()
         amount = float(context.args[1])
-        order = exchange.create_market_buy_order(symbol, amount)
-        update.message.reply_text(f"Trade successful: {order}")
+        order = await scheduler.submit(
+            exchange.create_market_buy_order, symbol, amount, endpoint='create_order', priority=USER
+        )
+        await update.message.reply_text(f"Trade successful: {order}")
     except Exception as e:
-        update.message.reply_text(f"Error executing trade: {e}")
+        await update.message.reply_text(f"Error executing trade: {e}")
 
-def subscribe(update: Update, context: CallbackContext) -> None:
+async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     # Implement subscription logic here
-    update.message.reply_text('Subscription feature is not implemented yet.')
+    await update.message.reply_text('Subscription feature is not implemented yet.')
 
-def main() -> None:
-    updater = Updater(config['telegramToken'])
+async def post_init(application: Application) -> None:
+    # Blocking exchange calls of worker threads queue on the bot's event loop
+    scheduler.attach()
 
-    dispatcher = updater.dispatcher
+def main() -> None:
+    application = Application.builder().token(config['telegramToken']).post_init(post_init).build()
 
-    dispatcher.add_handler(CommandHandler("start", start))
-    dispatcher.add_handler(CommandHandler("help", help_command))
-    dispatcher.add_handler(CommandHandler("price", price))
-    dispatcher.add_handler(CommandHandler("trade", trade))
-    dispatcher.add_handler(CommandHandler("subscribe", subscribe))
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("price", price))
+    application.add_handler(CommandHandler("trade", trade))
+    application.add_handler(CommandHandler("subscribe", subscribe))
 
-    updater.start_polling()
-    updater.idle()
+    application.run_polling()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,229 @@
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from market_data import MarketDataSource, TIMEFRAME_MS, TIMEFRAME_OFFSET_MS
+from candle_store import CandleStore, COLUMNS, frame_to_columns
+
+logger = logging.getLogger(__name__)
+
+BASE_TIMEFRAME = '1m'
+RESAMPLED_TIMEFRAMES = ('3m', '5m', '15m', '30m', '1h', '2h', '4h', '6h', '12h', '1d', '1w')
+
+def bucket_start(ts, timeframe: str):
+    """Open time of the `timeframe` candle containing `ts` (scalar or array)"""
+    step = TIMEFRAME_MS[timeframe]
+    offset = TIMEFRAME_OFFSET_MS.get(timeframe, 0)
+    return (ts - offset) // step * step + offset
+
+def resample_columns(columns: Dict[str, np.ndarray], timeframe: str) -> Tuple[Dict[str, np.ndarray], Optional[Dict]]:
+    """Aggregate base candle columns into `timeframe` candles.
+
+    Returns the closed candles and the still open last one (None when the
+    last base candle closed its bucket).
+    """
+    ts = np.asarray(columns['ts'], dtype=np.int64)
+    if not len(ts):
+        return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS}, None
+
+    buckets = bucket_start(ts, timeframe)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(ts)] - 1
+    candles = {
+        'ts': buckets[starts],
+        'open': np.asarray(columns['open'])[starts],
+        'high': np.maximum.reduceat(columns['high'], starts),
+        'low': np.minimum.reduceat(columns['low'], starts),
+        'close': np.asarray(columns['close'])[ends],
+        # Added up in order like the streaming resampler does, so both agree to the bit
+        'volume': np.array([sum(columns['volume'][lo:hi + 1].tolist()) for lo, hi in zip(starts, ends)])
+    }
+
+    if ts[-1] + TIMEFRAME_MS[BASE_TIMEFRAME] >= buckets[-1] + TIMEFRAME_MS[timeframe]:
+        return candles, None
+    partial = {name: values[-1].item() for name, values in candles.items()}
+    return {name: values[:-1] for name, values in candles.items()}, partial
+
+class CandleResampler:
+    """Builds every higher timeframe incrementally from closed base candles.
+
+    A bar closes as soon as the last base candle of its bucket closes, or
+    when a base candle of a later bucket shows up after a gap. Listeners get
+    one 'bar_closed' event per timeframe and bar.
+    """
+
+    def __init__(self, timeframes=RESAMPLED_TIMEFRAMES):
+        self.timeframes = timeframes
+        self._bars: Dict[Tuple[str, str], Dict] = {}
+        self._listeners: List[Callable[[Dict], None]] = []
+
+    def subscribe(self, listener: Callable[[Dict], None]):
+        self._listeners.append(listener)
+
+    def seed(self, symbol: str, timeframe: str, bar: Optional[Dict]):
+        """Resume from a partially built bar, e.g. after a restart"""
+        if bar is None:
+            self._bars.pop((symbol, timeframe), None)
+        else:
+            self._bars[(symbol, timeframe)] = dict(bar)
+
+    def add(self, symbol: str, candle: Dict) -> List[Dict]:
+        """Feed one closed base candle, returns the bar_closed events it caused"""
+        events = []
+        base_close = candle['ts'] + TIMEFRAME_MS[BASE_TIMEFRAME]
+        for timeframe in self.timeframes:
+            key = (symbol, timeframe)
+            bucket = bucket_start(candle['ts'], timeframe)
+            bar = self._bars.get(key)
+
+            if bar is not None and bar['ts'] != bucket:
+                # The end of the previous bucket is missing, close it with what it has
+                events.append(self._close(symbol, timeframe))
+                bar = None
+
+            if bar is None:
+                bar = self._bars[key] = {name: candle[name] for name, _ in COLUMNS}
+                bar['ts'] = bucket
+            else:
+                bar['high'] = max(bar['high'], candle['high'])
+                bar['low'] = min(bar['low'], candle['low'])
+                bar['close'] = candle['close']
+                bar['volume'] += candle['volume']
+
+            if base_close >= bucket + TIMEFRAME_MS[timeframe]:
+                events.append(self._close(symbol, timeframe))
+        return events
+
+    def _close(self, symbol: str, timeframe: str) -> Dict:
+        bar = self._bars.pop((symbol, timeframe))
+        event = {'event': 'bar_closed', 'symbol': symbol, 'timeframe': timeframe, **bar}
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error(f"Error in bar_closed listener: {str(e)}")
+        return event
+
+def sync_closed_candles(data_source: MarketDataSource, store: CandleStore, symbol: str, timeframe: str,
+                        limit: int = 1000, since: int = None) -> Dict[str, np.ndarray]:
+    """Fetch the closed candles the store doesn't have yet, returns the appended columns"""
+    series = store.series(symbol, timeframe)
+    step = TIMEFRAME_MS[timeframe]
+    now = data_source.now_ms()
+    appended = []
+
+    while True:
+        last = series.last_timestamp
+        # Nothing to do until the candle after the last stored one has closed
+        if last is not None and last + 2 * step > now:
+            break
+
+        candles = data_source.fetch_ohlcv(symbol, timeframe, since=last + step if last is not None else since,
+                                          limit=limit)
+        # Only closed candles go in, the store is append-only
+        opened = (candles.index - pd.Timestamp(0)) // pd.Timedelta(milliseconds=1)
+        closed = frame_to_columns(candles[opened + step <= now])
+        if last is not None:
+            closed = {name: values[closed['ts'] > last] for name, values in closed.items()}
+        if not series.append(closed):
+            break
+        appended.append(closed)
+        if len(candles) < limit:
+            break
+
+    if not appended:
+        return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS}
+    return {name: np.concatenate([columns[name] for columns in appended]) for name, _ in COLUMNS}
+
+class ResampledCandleFeed:
+    """Keeps every timeframe of the candle store current from 1m candles alone.
+
+    Only the base timeframe is fetched from the data source; higher
+    timeframes are resampled from the same stored candles, so they can't
+    disagree with each other. On a cold start the history before the
+    current week is fetched once per timeframe, everything from Monday
+    00:00 on comes from the base candles.
+    """
+
+    def __init__(self, data_source: MarketDataSource, store: CandleStore, history_limit: int = 1000,
+                 timeframes=RESAMPLED_TIMEFRAMES):
+        self.data_source = data_source
+        self.store = store
+        self.history_limit = history_limit
+        self.timeframes = timeframes
+        self.resampler = CandleResampler(timeframes)
+        self.resampler.subscribe(self._store_bar)
+        self._started = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, listener: Callable[[Dict], None]):
+        """Get a 'bar_closed' event for every bar of every resampled timeframe"""
+        self.resampler.subscribe(listener)
+
+    def sync(self, symbol: str) -> List[Dict]:
+        """Fetch new base candles and roll them into every timeframe"""
+        with self._lock:
+            if symbol not in self._started:
+                self._start(symbol)
+                self._started.add(symbol)
+                return []
+
+            appended = sync_closed_candles(self.data_source, self.store, symbol, BASE_TIMEFRAME, self.history_limit)
+            events = []
+            for i in range(len(appended['ts'])):
+                events.extend(self.resampler.add(symbol, {name: appended[name][i].item() for name, _ in COLUMNS}))
+            return events
+
+    def ingest(self, symbol: str, candle: Dict) -> List[Dict]:
+        """Roll in a closed base candle pushed by a stream instead of fetched"""
+        with self._lock:
+            if symbol not in self._started:
+                self._start(symbol)
+                self._started.add(symbol)
+
+            series = self.store.series(symbol, BASE_TIMEFRAME)
+            if not series.append({name: np.array([candle[name]], dtype=dtype) for name, dtype in COLUMNS}):
+                # Already fetched
+                return []
+            return self.resampler.add(symbol, candle)
+
+    def _start(self, symbol: str):
+        base = self.store.series(symbol, BASE_TIMEFRAME)
+        since = None
+        if base.last_timestamp is None:
+            since = int(bucket_start(self.data_source.now_ms(), '1w'))
+            for timeframe in self.timeframes:
+                self._seed_history(symbol, timeframe, since)
+        sync_closed_candles(self.data_source, self.store, symbol, BASE_TIMEFRAME, self.history_limit, since)
+
+        # Rebuild whatever the base candles have that the higher timeframes don't
+        first = base.range()['ts'][:1]
+        for timeframe in self.timeframes:
+            series = self.store.series(symbol, timeframe)
+            if series.last_timestamp is not None:
+                start = series.last_timestamp + TIMEFRAME_MS[timeframe]
+            elif len(first):
+                # Skip a first bucket the base candles only cover partly
+                start = int(bucket_start(first[0] - 1, timeframe)) + TIMEFRAME_MS[timeframe]
+            else:
+                continue
+            closed, partial = resample_columns(base.range(start), timeframe)
+            series.append(closed)
+            self.resampler.seed(symbol, timeframe, partial)
+
+    def _seed_history(self, symbol: str, timeframe: str, until: int):
+        """Fetch the closed candles before `until` of a timeframe the store doesn't have at all"""
+        series = self.store.series(symbol, timeframe)
+        if series.last_timestamp is not None:
+            return
+        step = TIMEFRAME_MS[timeframe]
+        candles = self.data_source.fetch_ohlcv(symbol, timeframe, since=until - self.history_limit * step,
+                                               limit=self.history_limit)
+        columns = frame_to_columns(candles)
+        series.append({name: values[columns['ts'] < until] for name, values in columns.items()})
+
+    def _store_bar(self, event: Dict):
+        self.store.series(event['symbol'], event['timeframe']).append(
+            {name: np.array([event[name]], dtype=dtype) for name, dtype in COLUMNS}
+        )
@@ -0,0 +1,175 @@
+from typing import Dict, Optional, Tuple
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+# Fixed-width on-disk columns, one file per column
+COLUMNS = (
+    ('ts', np.int64),
+    ('open', np.float64),
+    ('high', np.float64),
+    ('low', np.float64),
+    ('close', np.float64),
+    ('volume', np.float64)
+)
+
+def frame_to_columns(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Split an OHLCV DataFrame indexed by timestamp into store columns"""
+    columns = {'ts': ((df.index - pd.Timestamp(0)) // pd.Timedelta(milliseconds=1)).to_numpy(np.int64)}
+    for name, dtype in COLUMNS[1:]:
+        columns[name] = df[name].to_numpy(dtype)
+    return columns
+
+def columns_to_frame(columns: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """Build an OHLCV DataFrame indexed by timestamp from store columns"""
+    index = pd.to_datetime(columns['ts'], unit='ms')
+    index.name = 'timestamp'
+    return pd.DataFrame({name: columns[name] for name, _ in COLUMNS[1:]}, index=index)
+
+class CandleSeries:
+    """Append-only candle columns of one (symbol, timeframe).
+
+    Columns are raw fixed-width files read through memory maps. The newest
+    `ring_size` candles are also kept in RAM in a doubled ring buffer (every
+    value is written twice, `ring_size` apart) so any window of the hot tail
+    is a contiguous slice. Windows are returned as NumPy views, never copies,
+    and must be treated as read-only.
+    """
+
+    def __init__(self, path: str, ring_size: int = 1000):
+        self.path = path
+        self.ring_size = ring_size
+        os.makedirs(path, exist_ok=True)
+
+        self.length = self._recover()
+        self._maps: Dict[str, np.memmap] = {}
+        self._mapped_length = 0
+
+        self._ring = {name: np.empty(2 * ring_size, dtype=dtype) for name, dtype in COLUMNS}
+        self._ring_head = 0
+        self._ring_count = 0
+        self._lock = threading.Lock()
+        if self.length:
+            self._push_ring({name: view[-ring_size:] for name, view in self._map().items()})
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _recover(self) -> int:
+        """Find the number of complete rows, dropping a torn last append"""
+        lengths = []
+        for name, dtype in COLUMNS:
+            file = self._file(name)
+            size = os.path.getsize(file) if os.path.exists(file) else 0
+            lengths.append(size // np.dtype(dtype).itemsize)
+
+        length = min(lengths)
+        for name, dtype in COLUMNS:
+            file = self._file(name)
+            if os.path.exists(file) and os.path.getsize(file) != length * np.dtype(dtype).itemsize:
+                os.truncate(file, length * np.dtype(dtype).itemsize)
+        return length
+
+    def _map(self) -> Dict[str, np.memmap]:
+        """Memory map every column, remapping after appends"""
+        if self._mapped_length != self.length:
+            self._maps = {
+                name: np.memmap(self._file(name), dtype=dtype, mode='r', shape=(self.length,))
+                for name, dtype in COLUMNS
+            }
+            self._mapped_length = self.length
+        return self._maps
+
+    def _push_ring(self, columns: Dict[str, np.ndarray]):
+        count = len(columns['ts'])
+        if count > self.ring_size:
+            columns = {name: values[-self.ring_size:] for name, values in columns.items()}
+            count = self.ring_size
+
+        head = self._ring_head
+        first = min(count, self.ring_size - head)
+        for name, values in columns.items():
+            ring = self._ring[name]
+            for offset in (0, self.ring_size):
+                ring[offset + head:offset + head + first] = values[:first]
+                ring[offset:offset + count - first] = values[first:]
+
+        self._ring_head = (head + count) % self.ring_size
+        self._ring_count = min(self._ring_count + count, self.ring_size)
+
+    @property
+    def last_timestamp(self) -> Optional[int]:
+        if not self._ring_count:
+            return None
+        return int(self._ring['ts'][self._ring_head + self.ring_size - 1])
+
+    def append(self, columns: Dict[str, np.ndarray]) -> int:
+        """Append candles newer than the last stored one, returns how many were written"""
+        with self._lock:
+            ts = np.asarray(columns['ts'], dtype=np.int64)
+            last = self.last_timestamp
+            keep = ts > last if last is not None else np.ones(len(ts), dtype=bool)
+            if not keep.any():
+                return 0
+
+            columns = {name: np.ascontiguousarray(np.asarray(columns[name], dtype=dtype)[keep]) for name, dtype in COLUMNS}
+            for name, _ in COLUMNS:
+                with open(self._file(name), 'ab') as f:
+                    f.write(columns[name].tobytes())
+
+            self.length += len(columns['ts'])
+            self._push_ring(columns)
+            return len(columns['ts'])
+
+    def window(self, n: int = None) -> Dict[str, np.ndarray]:
+        """The last `n` candles (all of them when n is None) as read-only views.
+
+        Ring views hold at most `ring_size - 1` candles: a view of the whole
+        ring would include the slot the next append overwrites, so longer
+        windows are views into the memory maps instead. A ring view of `n`
+        candles stays intact for the next `ring_size - n` appends.
+        """
+        n = self.length if n is None else min(n, self.length)
+        if n <= self._ring_count and n < self.ring_size:
+            # Also covers the empty series, which has nothing to map
+            end = self._ring_head + self.ring_size
+            return {name: ring[end - n:end] for name, ring in self._ring.items()}
+        return {name: view[self.length - n:] for name, view in self._map().items()}
+
+    def range(self, start_ts: int = None, end_ts: int = None) -> Dict[str, np.ndarray]:
+        """Candles with start_ts <= ts < end_ts, straight from the memory maps"""
+        if not self.length:
+            return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS}
+        maps = self._map()
+        lo = 0 if start_ts is None else int(np.searchsorted(maps['ts'], start_ts, side='left'))
+        hi = self.length if end_ts is None else int(np.searchsorted(maps['ts'], end_ts, side='left'))
+        return {name: view[lo:hi] for name, view in maps.items()}
+
+class CandleStore:
+    """On-disk OHLCV store with one CandleSeries per (symbol, timeframe)"""
+
+    def __init__(self, root: str, ring_size: int = 1000):
+        self.root = root
+        self.ring_size = ring_size
+        self._series: Dict[Tuple[str, str], CandleSeries] = {}
+
+    def series(self, symbol: str, timeframe: str) -> CandleSeries:
+        key = (symbol, timeframe)
+        if key not in self._series:
+            path = os.path.join(self.root, symbol.replace('/', '_'), timeframe)
+            self._series[key] = CandleSeries(path, self.ring_size)
+        return self._series[key]
+
+    def append(self, symbol: str, timeframe: str, df: pd.DataFrame) -> int:
+        """Append the candles of an OHLCV DataFrame"""
+        if df.empty:
+            return 0
+        return self.series(symbol, timeframe).append(frame_to_columns(df))
+
+    def window(self, symbol: str, timeframe: str, n: int = None) -> Dict[str, np.ndarray]:
+        return self.series(symbol, timeframe).window(n)
+
+    def to_frame(self, symbol: str, timeframe: str, n: int = None) -> pd.DataFrame:
+        """The last `n` candles as an OHLCV DataFrame"""
+        return columns_to_frame(self.window(symbol, timeframe, n))
@@ -8,9 +8,89 @@ class BotConfig:
         self.TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
         self.ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
         self.DATABASE_URL = os.getenv("DATABASE_URL")
+        # Async connection pool: kept connections, extra ones under load, seconds to wait for one
+        self.DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+        self.DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+        self.DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+        self.DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+        # Group commits of position/trade writes: most writes per commit, seconds to wait for more
+        self.WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "100"))
+        self.WRITE_BATCH_DELAY = float(os.getenv("WRITE_BATCH_DELAY", "0.005"))
+        # Trades read and written per chunk of an export
+        self.EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+        # User preference cache: most users kept, seconds before a reload, seconds between write-backs
+        self.PREFERENCE_CACHE_SIZE = int(os.getenv("PREFERENCE_CACHE_SIZE", "10000"))
+        self.PREFERENCE_CACHE_TTL = float(os.getenv("PREFERENCE_CACHE_TTL", "300"))
+        self.PREFERENCE_FLUSH_INTERVAL = float(os.getenv("PREFERENCE_FLUSH_INTERVAL", "2"))
         self.REDIS_URL = os.getenv("REDIS_URL")
         self.BINANCE_API_KEY = os.getenv("BINANCE_API_KEY")
         self.BINANCE_API_SECRET = os.getenv("BINANCE_API_SECRET")
         self.NEWS_API_KEY = os.getenv("NEWS_API_KEY")
         self.ENABLE_PREMIUM_FEATURES = os.getenv("ENABLE_PREMIUM_FEATURES", "false").lower() == "true"
-        self.ENABLE_DEBUG_MODE = os.getenv("ENABLE_DEBUG_MODE", "false").lower() == "true"
\ No newline at end of file
+        self.ENABLE_DEBUG_MODE = os.getenv("ENABLE_DEBUG_MODE", "false").lower() == "true"
+        # Telegram user ids allowed to run admin commands, comma separated
+        self.ADMIN_IDS = {int(user_id) for user_id in os.getenv("ADMIN_IDS", "").split(",") if user_id.strip()}
+        
+        # Exchange request scheduler: requests per second, request weight per minute
+        self.EXCHANGE_RATE_LIMIT = float(os.getenv("EXCHANGE_RATE_LIMIT", "100"))
+        self.EXCHANGE_WEIGHT_LIMIT = float(os.getenv("EXCHANGE_WEIGHT_LIMIT", "6000"))
+        self.EXCHANGE_RETRY_ATTEMPTS = int(os.getenv("EXCHANGE_RETRY_ATTEMPTS", "3"))
+        self.EXCHANGE_TIMEOUT = float(os.getenv("EXCHANGE_TIMEOUT", "30"))
+        
+        # Shared ticker cache of /price and payment quotes, in seconds
+        self.PRICE_CACHE_TTL = float(os.getenv("PRICE_CACHE_TTL", "5"))
+        # How long past the TTL a ticker is still served while it is being refreshed
+        self.PRICE_CACHE_STALE_TTL = float(os.getenv("PRICE_CACHE_STALE_TTL", "30"))
+        
+        # Signal generation
+        self.SIGNAL_TICK_SECONDS = int(os.getenv("SIGNAL_TICK_SECONDS", "60"))
+        # 'sequential', 'concurrent' or vectorized 'batch' analysis of the (timeframe, coin) grid
+        self.SIGNAL_EXECUTION_MODE = os.getenv("SIGNAL_EXECUTION_MODE", "concurrent")
+        self.SIGNAL_CONCURRENCY = int(os.getenv("SIGNAL_CONCURRENCY", "32"))
+        self.SIGNAL_TASK_TIMEOUT = float(os.getenv("SIGNAL_TASK_TIMEOUT", "5"))
+        
+        # Market data: 'exchange', seeded 'synthetic' or 'replay' of a recorded tape
+        self.MARKET_DATA_SOURCE = os.getenv("MARKET_DATA_SOURCE", "synthetic")
+        self.MARKET_DATA_SEED = int(os.getenv("MARKET_DATA_SEED")) if os.getenv("MARKET_DATA_SEED") else None
+        self.MARKET_REPLAY_PATH = os.getenv("MARKET_REPLAY_PATH")
+        # Multiple of real time, empty replays as fast as possible
+        self.MARKET_REPLAY_SPEED = float(os.getenv("MARKET_REPLAY_SPEED")) if os.getenv("MARKET_REPLAY_SPEED") else None
+        # WebSocket trade/kline/ticker streams (e.g. wss://stream.binance.com:9443/ws), polling when empty
+        self.MARKET_STREAM_URL = os.getenv("MARKET_STREAM_URL")
+        self.MARKET_STREAM_QUEUE_SIZE = int(os.getenv("MARKET_STREAM_QUEUE_SIZE", "10000"))
+        # Reached alerts waiting for their notification
+        self.ALERT_QUEUE_SIZE = int(os.getenv("ALERT_QUEUE_SIZE", "1000"))
+        # Seconds between mark-to-market sweeps of all open positions
+        self.PORTFOLIO_SWEEP_SECONDS = int(os.getenv("PORTFOLIO_SWEEP_SECONDS", "5"))
+        
+        # Cross-check the streaming indicators against batch TA-Lib (slow, for debugging)
+        self.VERIFY_INCREMENTAL_INDICATORS = os.getenv("VERIFY_INCREMENTAL_INDICATORS", "false").lower() == "true"
+        self.INDICATOR_VERIFY_TOLERANCE = float(os.getenv("INDICATOR_VERIFY_TOLERANCE", "1e-6"))
+        
+        # Local OHLCV candle store
+        self.CANDLE_STORE_PATH = os.getenv("CANDLE_STORE_PATH", "data/candles")
+        self.CANDLE_RING_SIZE = int(os.getenv("CANDLE_RING_SIZE", "1000"))
+        self.CANDLE_HISTORY_LIMIT = int(os.getenv("CANDLE_HISTORY_LIMIT", "1000"))
+        # Fetch only 1m candles and resample every other timeframe from them
+        self.CANDLE_RESAMPLING = os.getenv("CANDLE_RESAMPLING", "true").lower() == "true"
+        
+        # Background training of missing signal models
+        self.MODEL_TRAINING_WORKERS = int(os.getenv("MODEL_TRAINING_WORKERS", "2"))
+        # Seconds before a failed training is retried, doubling with every further failure
+        self.MODEL_RETRY_DELAY = float(os.getenv("MODEL_RETRY_DELAY", "60"))
+        
+        # Periodic retraining runs in a process pool, one job per symbol
+        self.MODEL_TRAINING_PROCESSES = int(os.getenv("MODEL_TRAINING_PROCESSES", "2"))
+        self.MODEL_VALIDATION_HOLDOUT = int(os.getenv("MODEL_VALIDATION_HOLDOUT", "50"))
+        # Minimum directional accuracy on the holdout for a retrained model to go live,
+        # by default it has to beat a coin flip; 0 disables the gate
+        self.MODEL_MIN_ACCURACY = float(os.getenv("MODEL_MIN_ACCURACY", "0.5"))
+        
+        # Feature rows memoized per (symbol, timeframe, last candle)
+        self.FEATURE_CACHE_SIZE = int(os.getenv("FEATURE_CACHE_SIZE", "512"))
+        
+        # Backtests replay the candle store, one worker process per symbol
+        self.BACKTEST_PROCESSES = int(os.getenv("BACKTEST_PROCESSES", str(os.cpu_count() or 1)))
+        # Candles a trade may stay open before it is closed at market
+        self.BACKTEST_HORIZON = int(os.getenv("BACKTEST_HORIZON", "24"))
+        self.BACKTEST_FEE = float(os.getenv("BACKTEST_FEE", "0.001"))
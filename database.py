@@ -1,8 +1,26 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, Float, DateTime
+from typing import AsyncIterator, Callable, Dict, Optional
+from collections import deque
+from contextlib import asynccontextmanager
+import logging
+import time
+from sqlalchemy import create_engine, event, Column, Integer, String, Boolean, Float, DateTime, JSON
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
+# Local database when DATABASE_URL isn't set
+DEFAULT_DB_URL = 'sqlite+aiosqlite:///trading_bot.db'
+ASYNC_DRIVERS = {'postgresql': 'asyncpg', 'postgres': 'asyncpg', 'sqlite': 'aiosqlite'}
+# INSERT ... ON CONFLICT of the databases Database supports
+UPSERTS = {'postgresql': postgresql_insert, 'sqlite': sqlite_insert}
+
 Base = declarative_base()
 
 class User(Base):
@@ -12,7 +30,8 @@ class User(Base):
     telegram_id = Column(Integer, unique=True)
     username = Column(String)
     is_premium = Column(Boolean, default=False)
-    subscription_end = Column(DateTime, nullable=True)
+    # Expiry sweeps look users up by it
+    subscription_end = Column(DateTime, nullable=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 class Alert(Base):
@@ -26,7 +45,232 @@ class Alert(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 def init_db(db_url):
+    """Blocking session, for scripts and migrations; the bot uses Database"""
     engine = create_engine(db_url)
     Base.metadata.create_all(engine)
     Session = sessionmaker(bind=engine)
-    return Session()
\ No newline at end of file
+    return Session()
+
+class Portfolio(Base):
+    __tablename__ = 'portfolios'
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, unique=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    # Running totals of the closed trades, kept up to date as positions close
+    realized_pnl = Column(Float, default=0.0, nullable=False)
+    trade_count = Column(Integer, default=0, nullable=False)
+    win_count = Column(Integer, default=0, nullable=False)
+    loss_count = Column(Integer, default=0, nullable=False)
+    gross_profit = Column(Float, default=0.0, nullable=False)
+    gross_loss = Column(Float, default=0.0, nullable=False)
+
+class PortfolioExposure(Base):
+    """Open positions of a portfolio summed up per symbol"""
+    __tablename__ = 'portfolio_exposures'
+    
+    portfolio_id = Column(Integer, primary_key=True)
+    symbol = Column(String, primary_key=True)
+    position_count = Column(Integer, default=0, nullable=False)
+    long_quantity = Column(Float, default=0.0, nullable=False)
+    long_cost = Column(Float, default=0.0, nullable=False)
+    short_quantity = Column(Float, default=0.0, nullable=False)
+    short_cost = Column(Float, default=0.0, nullable=False)
+
+class Position(Base):
+    __tablename__ = 'positions'
+    
+    id = Column(Integer, primary_key=True)
+    portfolio_id = Column(Integer, index=True)
+    symbol = Column(String)
+    entry_price = Column(Float)
+    quantity = Column(Float)
+    side = Column(String)
+    entry_time = Column(DateTime, default=datetime.utcnow)
+
+class Trade(Base):
+    __tablename__ = 'trades'
+    
+    id = Column(Integer, primary_key=True)
+    portfolio_id = Column(Integer, index=True)
+    symbol = Column(String)
+    entry_price = Column(Float)
+    exit_price = Column(Float)
+    quantity = Column(Float)
+    side = Column(String)
+    entry_time = Column(DateTime)
+    exit_time = Column(DateTime)
+    pnl = Column(Float)
+
+class UserPreference(Base):
+    """Display and notification settings, one row per Telegram user"""
+    __tablename__ = 'user_preferences'
+    
+    user_id = Column(Integer, primary_key=True)
+    values = Column(JSON, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+def upsert(session, model):
+    """INSERT ... ON CONFLICT statement of `model` for the session's database"""
+    return UPSERTS[session.bind.dialect.name](model)
+
+def follow_commits(target, model, snapshot: Callable, apply: Callable):
+    """Call `apply(id, values)` for every `model` row committed through `target`.
+
+    `target` is a session or a Session class (like Database.session_class).
+    `values` is `snapshot(row)` for inserted or updated rows, None for
+    deleted ones. Changes are collected at flush and handed over once the
+    transaction commits; those flushed in a transaction or savepoint that
+    rolls back are dropped with it.
+    """
+    key = object()
+
+    def collect(session, flush_context):
+        changes = session.info.setdefault(key, [])
+        transaction = session.get_nested_transaction() or session.get_transaction()
+        for row in session.new | session.dirty:
+            if isinstance(row, model):
+                changes.append((transaction, row.id, snapshot(row)))
+        for row in session.deleted:
+            if isinstance(row, model):
+                changes.append((transaction, row.id, None))
+
+    def committed(session):
+        for _, row_id, values in session.info.pop(key, []):
+            apply(row_id, values)
+
+    def rolled_back(session, previous_transaction):
+        changes = session.info.get(key)
+        if changes:
+            session.info[key] = [change for change in changes if not _within(change[0], previous_transaction)]
+
+    event.listen(target, 'after_flush', collect)
+    event.listen(target, 'after_commit', committed)
+    event.listen(target, 'after_soft_rollback', rolled_back)
+
+def _within(transaction, ancestor) -> bool:
+    while transaction is not None:
+        if transaction is ancestor:
+            return True
+        transaction = transaction.parent
+    return False
+
+def _create_all(connection):
+    Base.metadata.create_all(connection)
+    # create_all skips tables that exist, add the indexes they were created without
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+def _sqlite_autocommit(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+def _sqlite_begin(connection):
+    connection.exec_driver_sql('BEGIN')
+
+def async_url(db_url: Optional[str]) -> str:
+    """'postgresql://...' -> 'postgresql+asyncpg://...', 'sqlite://...' -> 'sqlite+aiosqlite://...'"""
+    url = make_url(db_url or DEFAULT_DB_URL)
+    if url.drivername == 'postgres':
+        url = url.set(drivername='postgresql')
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is not None and url.get_driver_name() != driver:
+        url = url.set(drivername=f"{url.get_backend_name()}+{driver}")
+    return url.render_as_string(hide_password=False)
+
+class Database:
+    """Async engine with a connection pool, handing out one session per task.
+
+    Use `async with db.session() as session:` for every request or
+    background job rather than sharing a session; sessions don't commit
+    by themselves and roll back on errors. The pool holds `pool_size`
+    connections plus up to `max_overflow` extra ones, and waits
+    `pool_timeout` seconds for a free one before failing. How long
+    sessions waited for their connection is tracked, see `stats`.
+
+    SQLite (through aiosqlite), for local runs and tests, gets a single
+    connection the sessions queue for; the pool size settings apply to
+    server databases only.
+    """
+
+    def __init__(self, db_url: str = None, pool_size: int = 10, max_overflow: int = 10,
+                 pool_timeout: float = 30, pool_recycle: int = 1800, echo: bool = False):
+        self.url = async_url(db_url)
+        options = {'echo': echo, 'pool_pre_ping': True, 'pool_timeout': pool_timeout}
+        if make_url(self.url).get_backend_name() == 'sqlite':
+            # SQLite has a single writer: one connection, sessions take turns instead of hitting 'database is locked'
+            options.update(poolclass=AsyncAdaptedQueuePool, pool_size=1, max_overflow=0)
+        else:
+            options.update(pool_size=pool_size, max_overflow=max_overflow, pool_recycle=pool_recycle)
+        self.engine = create_async_engine(self.url, **options)
+        if make_url(self.url).get_backend_name() == 'sqlite':
+            # Let SQLAlchemy, not the sqlite3 module, begin transactions, or SAVEPOINTs don't nest
+            event.listen(self.engine.sync_engine, 'connect', _sqlite_autocommit)
+            event.listen(self.engine.sync_engine, 'begin', _sqlite_begin)
+        # Own Session class, so session events can be listened to for this database only
+        self.session_class = type('DatabaseSession', (Session,), {})
+        self.sessionmaker = async_sessionmaker(self.engine, expire_on_commit=False,
+                                               sync_session_class=self.session_class)
+
+        self.metrics = {'sessions': 0, 'checkouts': 0, 'connects': 0, 'invalidated': 0, 'errors': 0}
+        self._waits = deque(maxlen=1000)
+        pool = self.engine.sync_engine.pool
+        event.listen(pool, 'checkout', self._on_checkout)
+        event.listen(pool, 'connect', self._on_connect)
+        event.listen(pool, 'invalidate', self._on_invalidate)
+
+    @classmethod
+    def from_config(cls, config) -> 'Database':
+        return cls(
+            config.DATABASE_URL,
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+            pool_recycle=config.DB_POOL_RECYCLE
+        )
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.metrics['checkouts'] += 1
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self.metrics['connects'] += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        self.metrics['invalidated'] += 1
+
+    async def create_all(self):
+        async with self.engine.begin() as connection:
+            await connection.run_sync(_create_all)
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[AsyncSession]:
+        """A session of its own, with its connection already checked out"""
+        self.metrics['sessions'] += 1
+        async with self.sessionmaker() as session:
+            started = time.monotonic()
+            await session.connection()
+            self._waits.append(time.monotonic() - started)
+            try:
+                yield session
+            except Exception:
+                self.metrics['errors'] += 1
+                await session.rollback()
+                raise
+
+    def stats(self) -> Dict:
+        pool = self.engine.sync_engine.pool
+        waits = sorted(self._waits)
+        return {
+            **self.metrics,
+            'pool': pool.status(),
+            'checked_out': pool.checkedout() if hasattr(pool, 'checkedout') else None,
+            'wait': {
+                'count': len(waits),
+                'avg_ms': sum(waits) / len(waits) * 1000 if waits else 0.0,
+                'p95_ms': waits[int(len(waits) * 0.95)] * 1000 if waits else 0.0,
+                'max_ms': waits[-1] * 1000 if waits else 0.0
+            }
+        }
+
+    async def close(self):
+        await self.engine.dispose()
\ No newline at end of file
@@ -98,4 +98,67 @@ class EnhancedStatsManager:
 ║ ├─👥 Total Users: {stats['total_users']:,}
 ║ ├─💎 Premium: {stats['premium_users']:,} ({stats['premium_percentage']:.1f}%)
 ║ ├─🌍 Active Now: {stats['active_users']:,}
-║ └─🗣️ Languages: {self._format_language_stats(stats[' ▋
\ No newline at end of file
+║ └─🗣️ Languages: {self._format_language_stats(stats['languages'])}
+╠══════════════════════════════════════════════╣
+║ 📈 TRADING PERFORMANCE
+║ ├─📊 Success Rate: {self._format_progress_bar(stats['accuracy_rate'])}
+║ ├─💰 Total Profit: {self._format_currency(stats['total_profit'], user_prefs.currency)}
+║ ├─📋 Signals Today: {stats['daily_signals']:,}
+║ └─🎯 Avg ROI: {stats['average_roi']}%
+╠══════════════════════════════════════════════╣
+║ 🏆 TOP PERFORMERS (24H)
+{self._format_top_performers(stats['top_performers'], user_prefs.currency)}
+╠══════════════════════════════════════════════╣
+║ 📱 SYSTEM STATUS
+║ ├─⚡ API Health: {self._format_health(stats['api_health'])}
+║ ├─🔄 Signal Gen: {self._format_health(stats['signal_health'])}
+║ ├─📡 Latency: {stats['latency']}ms
+║ └─⏱️ Uptime: {self._format_uptime(stats['uptime'])}
+╠══════════════════════════════════════════════╣
+║ 🔥 TRENDING FEATURES
+║ ├─📊 Most Used: {stats['popular_features'][0]}
+║ ├─⭐ Highest ROI: {stats['popular_features'][1]}
+║ └─🆕 New: {stats['popular_features'][2]}
+╚══════════════════════════════════════════════╝
+"""
+
+    def _format_progress_bar(self, value: float) -> str:
+        """Create a colored progress bar"""
+        filled = int(value / 10)
+        return f"{'█' * filled}{'░' * (10 - filled)} {value:.1f}%"
+
+    def _format_currency(self, amount: Decimal, currency: str) -> str:
+        """Format currency based on user preference"""
+        currencies = {
+            'USD': '$', 'EUR': '€', 'GBP': '£', 'JPY': '¥',
+            'CNY': '¥', 'KRW': '₩', 'RUB': '₽'
+        }
+        symbol = currencies.get(currency, '$')
+        return f"{symbol}{amount:,.2f}"
+
+    def _get_market_status(self, current_time: datetime) -> str:
+        """Get current market status with emoji"""
+        hour = current_time.hour
+        if 0 <= hour < 4:
+            return "🌙 Asian Session"
+        elif 4 <= hour < 8:
+            return "🌅 Asian-European Crossover"
+        elif 8 <= hour < 12:
+            return "🌇 European Session"
+        elif 12 <= hour < 16:
+            return "🌆 European-American Crossover"
+        elif 16 <= hour < 20:
+            return "🌃 American Session"
+        else:
+            return "🌠 Late American Session"
+
+    async def start_live_updates(self):
+        """Start all update tasks"""
+        while True:
+            await asyncio.gather(
+                self._update_market_data(),
+                self._update_user_stats(),
+                self._update_performance_metrics(),
+                self._check_system_health()
+            )
+            await asyncio.sleep(60)  # Update every minute
\ No newline at end of file
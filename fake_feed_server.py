@@ -0,0 +1,164 @@
+from typing import Dict, Iterator, List
+import argparse
+import asyncio
+import json
+import logging
+import time
+from aiohttp import web
+from market_data import SyntheticMarketDataSource, TIMEFRAME_MS, now_ms
+from candle_store import frame_to_columns
+from market_stream import stream_symbol
+
+logger = logging.getLogger(__name__)
+
+class FakeFeedServer:
+    """Local stand-in for the Binance WebSocket streams, for offline testing.
+
+    After a SUBSCRIBE it replays the 1m candles of a seeded
+    SyntheticMarketDataSource from `start_ms` on: for every candle
+    `trades_per_candle` trades, a 24hr ticker and the closed kline, symbols
+    taking turns. Past candles go out at up to `rate` messages a second (as
+    fast as possible when None), then it keeps pace with real time. With
+    `disconnect_every` the connection is dropped after that many messages
+    and `skip_on_reconnect` candles are left out, like an outage would.
+    """
+
+    def __init__(self, symbols: List[str], seed: int = 42, start_ms: int = None, rate: float = None,
+                 trades_per_candle: int = 10, disconnect_every: int = None, skip_on_reconnect: int = 0,
+                 host: str = '127.0.0.1', port: int = 8765):
+        self.symbols = {stream_symbol(symbol): symbol for symbol in symbols}
+        self.source = SyntheticMarketDataSource(seed)
+        self.rate = rate
+        self.trades_per_candle = trades_per_candle
+        self.disconnect_every = disconnect_every
+        self.skip_on_reconnect = skip_on_reconnect
+        self.host = host
+        self.port = port
+
+        step = TIMEFRAME_MS['1m']
+        start = start_ms if start_ms is not None else now_ms() - 60 * step
+        self.cursors = {symbol: start // step * step for symbol in symbols}
+        self._buffers: Dict[str, List[Dict]] = {}
+        self.sent = 0
+        self.connections = 0
+        self._runner = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/ws"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/ws', self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Fake feed serving {len(self.symbols)} symbols on {self.url}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def candle_messages(self, symbol: str, candle: Dict) -> Iterator[Dict]:
+        """The trade, ticker and kline messages of one closed 1m candle"""
+        name = stream_symbol(symbol)
+        ts = candle['ts']
+        step = TIMEFRAME_MS['1m']
+        n = self.trades_per_candle
+        for i in range(n):
+            # Walk from open to close, touching the high and low on the way
+            path = (candle['open'], candle['high'], candle['low'], candle['close'])
+            price = path[min(3, i * 4 // n)] if i < n - 1 else candle['close']
+            trade_ts = ts + (i + 1) * step // (n + 1)
+            yield {'e': 'trade', 'E': trade_ts, 's': name, 't': ts // 1000 + i, 'p': str(price),
+                   'q': str(candle['volume'] / n), 'T': trade_ts}
+        yield {'e': '24hrTicker', 'E': ts + step - 1, 's': name, 'c': str(candle['close']),
+               'P': str(round((candle['close'] / candle['open'] - 1) * 100, 4)),
+               'q': str(candle['close'] * candle['volume'])}
+        yield {'e': 'kline', 'E': ts + step, 's': name, 'k': {
+            't': ts, 'T': ts + step - 1, 's': name, 'i': '1m',
+            'o': str(candle['open']), 'c': str(candle['close']), 'h': str(candle['high']),
+            'l': str(candle['low']), 'v': str(candle['volume']), 'x': True
+        }}
+
+    async def _next_candle(self, symbol: str) -> Dict:
+        step = TIMEFRAME_MS['1m']
+        ts = self.cursors[symbol]
+        buffer = self._buffers.setdefault(symbol, [])
+        while buffer and buffer[0]['ts'] < ts:
+            buffer.pop(0)
+
+        if not buffer:
+            wait = (ts + step - now_ms()) / 1000
+            if wait > 0:
+                await asyncio.sleep(wait)
+            columns = frame_to_columns(await self.source.fetch_ohlcv_async(symbol, '1m', since=ts, limit=1000))
+            closed = columns['ts'] + step <= now_ms()
+            buffer.extend(
+                {name: values[i].item() for name, values in columns.items()} for i in range(int(closed.sum()))
+            )
+
+        self.cursors[symbol] = ts + step
+        return buffer.pop(0)
+
+    async def _handle(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+
+        subscription = await ws.receive_json()
+        wanted = {param.split('@')[0].upper() for param in subscription.get('params', [])}
+        symbols = [symbol for name, symbol in self.symbols.items() if name in wanted]
+        await ws.send_json({'result': None, 'id': subscription.get('id')})
+
+        started = time.monotonic()
+        sent = 0
+        try:
+            while not ws.closed:
+                for symbol in symbols:
+                    for message in self.candle_messages(symbol, await self._next_candle(symbol)):
+                        await ws.send_str(json.dumps(message))
+                        sent += 1
+                        self.sent += 1
+                        if self.rate and sent % 100 == 0:
+                            ahead = sent / self.rate - (time.monotonic() - started)
+                            if ahead > 0:
+                                await asyncio.sleep(ahead)
+
+                    if self.disconnect_every and sent >= self.disconnect_every:
+                        for skipped in self.cursors:
+                            self.cursors[skipped] += self.skip_on_reconnect * TIMEFRAME_MS['1m']
+                        await ws.close()
+                        return ws
+                # Let the client's messages (and a close) through
+                await asyncio.sleep(0)
+        except ConnectionResetError:
+            pass
+        return ws
+
+async def _serve(server: FakeFeedServer):
+    await server.start()
+    try:
+        while True:
+            await asyncio.sleep(10)
+            logger.info(f"Sent {server.sent} messages")
+    finally:
+        await server.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve fake Binance market streams")
+    parser.add_argument('symbols', nargs='*', default=['BTC/USDT', 'ETH/USDT', 'BNB/USDT', 'SOL/USDT'])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--rate', type=float, default=None, help="messages per second, unlimited by default")
+    parser.add_argument('--history', type=int, default=1440, help="minutes of past candles to replay")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_serve(FakeFeedServer(
+        args.symbols,
+        seed=args.seed,
+        start_ms=now_ms() - args.history * TIMEFRAME_MS['1m'],
+        rate=args.rate,
+        port=args.port
+    )))
@@ -0,0 +1,54 @@
+from typing import Callable, Dict, Hashable, Optional
+from collections import OrderedDict
+import pandas as pd
+
+class FeatureFrame:
+    """Everything premium signal sub-computations need about one closed candle"""
+
+    def __init__(self, row: pd.Series):
+        self.row = row
+        self.price = float(row['close'])
+        self.atr = float(row['atr'])
+
+class FeatureCache:
+    """LRU cache of FeatureFrames keyed by (symbol, timeframe, last candle timestamp)"""
+
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self._entries: 'OrderedDict[Hashable, FeatureFrame]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[FeatureFrame]:
+        frame = self._entries.get(key)
+        if frame is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return frame
+
+    def put(self, key: Hashable, frame: FeatureFrame):
+        self._entries[key] = frame
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], FeatureFrame]) -> FeatureFrame:
+        frame = self.get(key)
+        if frame is None:
+            frame = compute()
+            self.put(key, frame)
+        return frame
+
+    def stats(self) -> Dict:
+        requests = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / requests if requests else 0.0
+        }
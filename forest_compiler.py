@@ -0,0 +1,165 @@
+from typing import Dict, List
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import joblib
+from sklearn.ensemble import RandomForestRegressor
+
+class CompiledForest:
+    """A fitted RandomForestRegressor flattened into contiguous NumPy arrays.
+
+    The nodes of all trees live in the same arrays, children are global node
+    indices and leaves point back at themselves, so every tree can be walked
+    at once with `max_depth` vectorized steps. Predictions are bit-for-bit
+    the same as sklearn's: inputs are rounded to float32 like sklearn does
+    before traversal and the per-tree outputs are summed in tree order.
+    """
+
+    ARRAYS = ('feature', 'threshold', 'left', 'right', 'missing_left', 'value', 'roots')
+
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, left: np.ndarray, right: np.ndarray,
+                 missing_left: np.ndarray, value: np.ndarray, roots: np.ndarray, max_depth: int,
+                 feature_names: List[str] = None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.missing_left = missing_left
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.feature_names = feature_names
+
+    @classmethod
+    def from_sklearn(cls, model: RandomForestRegressor) -> 'CompiledForest':
+        """Export the trees of a fitted forest"""
+        parts = {name: [] for name in cls.ARRAYS}
+        offset = 0
+        max_depth = 0
+
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            leaf = tree.children_left == -1
+
+            parts['roots'].append(offset)
+            parts['feature'].append(np.where(leaf, 0, tree.feature))
+            parts['threshold'].append(np.where(leaf, np.inf, tree.threshold))
+            parts['left'].append(np.where(leaf, nodes, tree.children_left) + offset)
+            parts['right'].append(np.where(leaf, nodes, tree.children_right) + offset)
+            missing_left = getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count, dtype=np.uint8))
+            parts['missing_left'].append(np.asarray(missing_left, dtype=bool))
+            parts['value'].append(tree.value[:, 0, 0])
+
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        feature_names = getattr(model, 'feature_names_in_', None)
+        return cls(
+            feature=np.concatenate(parts['feature']).astype(np.int32),
+            threshold=np.concatenate(parts['threshold']).astype(np.float64),
+            left=np.concatenate(parts['left']).astype(np.int32),
+            right=np.concatenate(parts['right']).astype(np.int32),
+            missing_left=np.concatenate(parts['missing_left']),
+            value=np.concatenate(parts['value']).astype(np.float64),
+            roots=np.array(parts['roots'], dtype=np.int32),
+            max_depth=max_depth,
+            feature_names=list(feature_names) if feature_names is not None else None
+        )
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def predict(self, X) -> np.ndarray:
+        """Average prediction of all trees for every row of X"""
+        if isinstance(X, pd.DataFrame) and self.feature_names is not None:
+            X = X[self.feature_names]
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        rows = np.arange(len(X))[:, None]
+
+        nodes = np.broadcast_to(self.roots, (len(X), self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[nodes]]
+            go_left = (x <= self.threshold[nodes]) | (np.isnan(x) & self.missing_left[nodes])
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        leaves = self.value[nodes]
+        prediction = np.zeros(len(X))
+        for tree in range(self.n_trees):
+            prediction += leaves[:, tree]
+        return prediction / self.n_trees
+
+    def save(self, path: str):
+        """Write the forest as a single uncompressed .npz file"""
+        arrays = {name: getattr(self, name) for name in self.ARRAYS}
+        arrays['max_depth'] = np.array(self.max_depth)
+        if self.feature_names is not None:
+            arrays['feature_names'] = np.array(self.feature_names)
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> 'CompiledForest':
+        with np.load(path) as data:
+            return cls(
+                **{name: data[name] for name in cls.ARRAYS},
+                max_depth=int(data['max_depth']),
+                feature_names=list(data['feature_names']) if 'feature_names' in data else None
+            )
+
+def benchmark(model: RandomForestRegressor, X: pd.DataFrame, repeats: int = 200) -> Dict:
+    """Compare sklearn and the compiled forest on load time and single-row prediction"""
+    compiled = CompiledForest.from_sklearn(model)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pickle_path = os.path.join(tmp, 'model.joblib')
+        compiled_path = os.path.join(tmp, 'model.npz')
+        joblib.dump(model, pickle_path)
+        compiled.save(compiled_path)
+
+        started = time.perf_counter()
+        joblib.load(pickle_path)
+        joblib_load = time.perf_counter() - started
+
+        started = time.perf_counter()
+        CompiledForest.load(compiled_path)
+        compiled_load = time.perf_counter() - started
+
+        sizes = {'joblib_bytes': os.path.getsize(pickle_path), 'compiled_bytes': os.path.getsize(compiled_path)}
+
+    row = X.iloc[-1:]
+    started = time.perf_counter()
+    for _ in range(repeats):
+        model.predict(row)
+    sklearn_predict = (time.perf_counter() - started) / repeats
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        compiled.predict(row)
+    compiled_predict = (time.perf_counter() - started) / repeats
+
+    return {
+        'identical': bool(np.array_equal(model.predict(X), compiled.predict(X))),
+        'joblib_load_ms': joblib_load * 1000,
+        'compiled_load_ms': compiled_load * 1000,
+        'sklearn_predict_ms': sklearn_predict * 1000,
+        'compiled_predict_ms': compiled_predict * 1000,
+        **sizes
+    }
+
+if __name__ == "__main__":
+    from market_data import SyntheticMarketDataSource
+    from incremental_indicators import IncrementalIndicatorEngine
+
+    data = SyntheticMarketDataSource(seed=42).fetch_ohlcv('BTC/USDT', '1h', limit=1000)
+    features = IncrementalIndicatorEngine.replay(data)
+    target = data['close'].pct_change().shift(-1).fillna(0)
+
+    model = RandomForestRegressor(n_estimators=100, random_state=42)
+    model.fit(features, target)
+
+    for name, value in benchmark(model, features).items():
+        print(f"{name}: {value}")
@@ -0,0 +1,558 @@
+from typing import Dict, List, Tuple
+from collections import deque
+import math
+import numpy as np
+import pandas as pd
+
+NAN = float('nan')
+
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+# Same columns, in the same order, as AdvancedSignalGenerator._calculate_features
+FEATURE_COLUMNS = OHLCV_COLUMNS + [
+    'rsi', 'macd', 'macd_signal', 'ema_9', 'ema_21', 'ema_50', 'ema_200',
+    'obv', 'adx', 'bbands_upper', 'bbands_middle', 'bbands_lower', 'atr',
+    'mfi', 'cci', 'roc', 'price_position', 'volume_trend', 'trend_strength'
+]
+
+# The streaming indicators below follow TA-Lib's seeding rules (default,
+# non-Metastock compatibility) so their output matches the batch functions.
+
+class StreamingIndicator:
+    """Base of the streaming indicators, whose last update can be undone.
+
+    `checkpoint` saves the scalar fields and the ends of the windows, and
+    `rewind` puts them back after exactly one `update`, both in O(1). An
+    update appends at most one value to each window and drops at most its
+    oldest one; seed lists only ever grow.
+    """
+
+    def checkpoint(self) -> Dict:
+        saved = {}
+        for name, value in vars(self).items():
+            if isinstance(value, StreamingIndicator):
+                saved[name] = value.checkpoint()
+            elif isinstance(value, (deque, list)):
+                saved[name] = (len(value), value[0] if value else None)
+            else:
+                saved[name] = value
+        return saved
+
+    def rewind(self, saved: Dict):
+        for name, value in saved.items():
+            current = getattr(self, name)
+            if isinstance(current, StreamingIndicator):
+                current.rewind(value)
+            elif isinstance(current, list):
+                del current[value[0]:]
+            elif isinstance(current, deque):
+                length, oldest = value
+                if current:
+                    current.pop()
+                    if len(current) < length:
+                        current.appendleft(oldest)
+            else:
+                setattr(self, name, value)
+
+class StreamingEMA(StreamingIndicator):
+    """EMA seeded with the SMA of the first `period` values"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.k = 2.0 / (period + 1)
+        self.seed: List[float] = []
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        if len(self.seed) < self.period:
+            self.seed.append(x)
+            if len(self.seed) == self.period:
+                self.value = sum(self.seed) / self.period
+            return self.value
+        self.value = (x - self.value) * self.k + self.value
+        return self.value
+
+class WindowedEMA(StreamingIndicator):
+    """EMA of the last `window` values, seeded with the SMA of the oldest `period` of them.
+
+    This is what a batch EMA over a sliding `window` of candles returns;
+    a running EMA seeded once on the first candle drifts away from it for
+    long periods. The window is split into the seed and the tail after
+    it, whose EMA weights are kept as a running sum, so a slide is O(1).
+    """
+
+    def __init__(self, period: int, window: int):
+        self.period = period
+        self.window = window
+        self.k = 2.0 / (period + 1)
+        self.values = deque()
+        self.seed_total = 0.0
+        # Sum of k * (1 - k)^i * values[-1 - i] over the tail, and the weight (1 - k)^len(tail) left to the seed
+        self.weighted = 0.0
+        self.decay = 1.0
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        self.values.append(x)
+        if len(self.values) <= self.period:
+            self.seed_total += x
+            if len(self.values) < self.period:
+                return NAN
+        else:
+            self.weighted = self.weighted * (1 - self.k) + self.k * x
+            if len(self.values) > self.window:
+                dropped = self.values.popleft()
+                # The oldest value of the tail is now the newest of the seed
+                moved = self.values[self.period - 1]
+                self.weighted -= self.k * self.decay * moved
+                self.seed_total += moved - dropped
+            else:
+                self.decay *= 1 - self.k
+
+        self.value = self.decay * self.seed_total / self.period + self.weighted
+        return self.value
+
+class StreamingSMA(StreamingIndicator):
+    """Rolling mean with a running sum"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.window = deque()
+        self.total = 0.0
+
+    def update(self, x: float) -> float:
+        self.window.append(x)
+        self.total += x
+        if len(self.window) > self.period:
+            self.total -= self.window.popleft()
+        return self.total / self.period if len(self.window) == self.period else NAN
+
+class StreamingRSI(StreamingIndicator):
+    """Wilder's RSI"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev_close = None
+        self.count = 0
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+
+    def update(self, close: float) -> float:
+        if self.prev_close is None:
+            self.prev_close = close
+            return NAN
+
+        diff = close - self.prev_close
+        self.prev_close = close
+        gain, loss = max(diff, 0.0), max(-diff, 0.0)
+        self.count += 1
+
+        if self.count < self.period:
+            self.avg_gain += gain
+            self.avg_loss += loss
+            return NAN
+        if self.count == self.period:
+            self.avg_gain = (self.avg_gain + gain) / self.period
+            self.avg_loss = (self.avg_loss + loss) / self.period
+        else:
+            self.avg_gain = (self.avg_gain * (self.period - 1) + gain) / self.period
+            self.avg_loss = (self.avg_loss * (self.period - 1) + loss) / self.period
+
+        total = self.avg_gain + self.avg_loss
+        return 100.0 * self.avg_gain / total if total != 0 else 0.0
+
+class StreamingMACD(StreamingIndicator):
+    """MACD whose fast EMA is seeded on the last `fast` bars of the slow seed, like TA-Lib"""
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self.fast = fast
+        self.slow = slow
+        self.fast_k = 2.0 / (fast + 1)
+        self.slow_k = 2.0 / (slow + 1)
+        self.seed: List[float] = []
+        self.fast_ema = NAN
+        self.slow_ema = NAN
+        self.signal = StreamingEMA(signal)
+
+    def update(self, close: float) -> Tuple[float, float]:
+        if len(self.seed) < self.slow:
+            self.seed.append(close)
+            if len(self.seed) < self.slow:
+                return NAN, NAN
+            self.fast_ema = sum(self.seed[-self.fast:]) / self.fast
+            self.slow_ema = sum(self.seed) / self.slow
+        else:
+            self.fast_ema = (close - self.fast_ema) * self.fast_k + self.fast_ema
+            self.slow_ema = (close - self.slow_ema) * self.slow_k + self.slow_ema
+
+        macd = self.fast_ema - self.slow_ema
+        signal = self.signal.update(macd)
+        # TA-Lib reports nothing until the signal line exists
+        return (macd, signal) if not math.isnan(signal) else (NAN, NAN)
+
+class StreamingOBV(StreamingIndicator):
+    """On Balance Volume"""
+
+    def __init__(self):
+        self.prev_close = None
+        self.value = NAN
+
+    def update(self, close: float, volume: float) -> float:
+        if self.prev_close is None:
+            self.value = volume
+        elif close > self.prev_close:
+            self.value += volume
+        elif close < self.prev_close:
+            self.value -= volume
+        self.prev_close = close
+        return self.value
+
+class WindowedOBV(StreamingIndicator):
+    """On Balance Volume of the last `window` candles, starting from the volume of the oldest one"""
+
+    def __init__(self, window: int):
+        self.window = window
+        self.prev_close = None
+        # (volume, signed volume) per candle, and the sum of the signed ones
+        self.candles = deque()
+        self.total = 0.0
+        self.value = NAN
+
+    def update(self, close: float, volume: float) -> float:
+        if self.prev_close is None or close == self.prev_close:
+            signed = 0.0
+        else:
+            signed = volume if close > self.prev_close else -volume
+        self.prev_close = close
+        self.candles.append((volume, signed))
+        self.total += signed
+        if len(self.candles) > self.window:
+            self.total -= self.candles.popleft()[1]
+
+        first_volume, first_signed = self.candles[0]
+        self.value = first_volume + self.total - first_signed
+        return self.value
+
+class StreamingATR(StreamingIndicator):
+    """Wilder's Average True Range"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev_close = None
+        self.count = 0
+        self.value = 0.0
+
+    def update(self, high: float, low: float, close: float) -> float:
+        if self.prev_close is None:
+            self.prev_close = close
+            return NAN
+
+        tr = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.prev_close = close
+        self.count += 1
+
+        if self.count < self.period:
+            self.value += tr
+            return NAN
+        if self.count == self.period:
+            self.value = (self.value + tr) / self.period
+        else:
+            self.value = (self.value * (self.period - 1) + tr) / self.period
+        return self.value
+
+class StreamingADX(StreamingIndicator):
+    """Average Directional Index"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev = None
+        self.count = 0
+        self.plus_dm = 0.0
+        self.minus_dm = 0.0
+        self.tr = 0.0
+        self.sum_dx = 0.0
+        self.value = NAN
+
+    def update(self, high: float, low: float, close: float) -> float:
+        if self.prev is None:
+            self.prev = (high, low, close)
+            return NAN
+
+        prev_high, prev_low, prev_close = self.prev
+        self.prev = (high, low, close)
+        self.count += 1
+
+        diff_plus = high - prev_high
+        diff_minus = prev_low - low
+        plus_dm = diff_plus if diff_plus > 0 and diff_plus > diff_minus else 0.0
+        minus_dm = diff_minus if diff_minus > 0 and diff_plus < diff_minus else 0.0
+        tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
+
+        if self.count < self.period:
+            self.plus_dm += plus_dm
+            self.minus_dm += minus_dm
+            self.tr += tr
+            return NAN
+
+        p = self.period
+        self.plus_dm = self.plus_dm - self.plus_dm / p + plus_dm
+        self.minus_dm = self.minus_dm - self.minus_dm / p + minus_dm
+        self.tr = self.tr - self.tr / p + tr
+
+        dx = None
+        if self.tr != 0:
+            plus_di = 100.0 * self.plus_dm / self.tr
+            minus_di = 100.0 * self.minus_dm / self.tr
+            if plus_di + minus_di != 0:
+                dx = 100.0 * abs(minus_di - plus_di) / (plus_di + minus_di)
+
+        if self.count < 2 * p:
+            if dx is not None:
+                self.sum_dx += dx
+            if self.count == 2 * p - 1:
+                self.value = self.sum_dx / p
+            return self.value
+
+        if dx is not None:
+            self.value = (self.value * (p - 1) + dx) / p
+        return self.value
+
+class StreamingBBands(StreamingIndicator):
+    """Bollinger Bands on an SMA with population standard deviation"""
+
+    def __init__(self, period: int = 20, dev_up: float = 2.0, dev_down: float = 2.0):
+        self.period = period
+        self.dev_up = dev_up
+        self.dev_down = dev_down
+        self.window = deque()
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def update(self, close: float) -> Tuple[float, float, float]:
+        self.window.append(close)
+        self.total += close
+        self.total_sq += close * close
+        if len(self.window) > self.period:
+            old = self.window.popleft()
+            self.total -= old
+            self.total_sq -= old * old
+        if len(self.window) < self.period:
+            return NAN, NAN, NAN
+
+        mean = self.total / self.period
+        variance = self.total_sq / self.period - mean * mean
+        std = math.sqrt(variance) if variance > 0 else 0.0
+        return mean + self.dev_up * std, mean, mean - self.dev_down * std
+
+class StreamingMFI(StreamingIndicator):
+    """Money Flow Index"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev_tp = None
+        self.flows = deque()
+        self.pos = 0.0
+        self.neg = 0.0
+
+    def update(self, high: float, low: float, close: float, volume: float) -> float:
+        tp = (high + low + close) / 3
+        if self.prev_tp is None:
+            self.prev_tp = tp
+            return NAN
+
+        flow = tp * volume
+        pos, neg = (flow, 0.0) if tp > self.prev_tp else (0.0, flow) if tp < self.prev_tp else (0.0, 0.0)
+        self.prev_tp = tp
+        self.flows.append((pos, neg))
+        self.pos += pos
+        self.neg += neg
+        if len(self.flows) > self.period:
+            old_pos, old_neg = self.flows.popleft()
+            self.pos -= old_pos
+            self.neg -= old_neg
+        if len(self.flows) < self.period:
+            return NAN
+
+        total = self.pos + self.neg
+        return 100.0 * self.pos / total if total >= 1.0 else 0.0
+
+class StreamingCCI(StreamingIndicator):
+    """Commodity Channel Index"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.window = deque(maxlen=period)
+
+    def update(self, high: float, low: float, close: float) -> float:
+        tp = (high + low + close) / 3
+        self.window.append(tp)
+        if len(self.window) < self.period:
+            return NAN
+
+        mean = sum(self.window) / self.period
+        deviation = sum(abs(x - mean) for x in self.window)
+        if tp - mean == 0 or deviation == 0:
+            return 0.0
+        return (tp - mean) / (0.015 * (deviation / self.period))
+
+class StreamingROC(StreamingIndicator):
+    """Rate of change in percent"""
+
+    def __init__(self, period: int = 10):
+        self.period = period
+        self.window = deque(maxlen=period + 1)
+
+    def update(self, close: float) -> float:
+        self.window.append(close)
+        if len(self.window) <= self.period:
+            return NAN
+        prev = self.window[0]
+        return (close / prev - 1) * 100 if prev != 0 else close
+
+class IndicatorState:
+    """All the features of one (symbol, timeframe) series, updated one candle at a time.
+
+    With a `window` the EMAs and OBV only look at that many latest candles,
+    like the batch features computed over a window of candles do; the
+    other indicators forget old candles fast enough to agree with those
+    anyway. Without one they run over the whole history.
+    """
+
+    def __init__(self, window: int = None):
+        self.rsi = StreamingRSI(14)
+        self.macd = StreamingMACD(12, 26, 9)
+        self.emas = {
+            period: WindowedEMA(period, window) if window else StreamingEMA(period)
+            for period in (9, 21, 50, 200)
+        }
+        self.obv = WindowedOBV(window) if window else StreamingOBV()
+        self.adx = StreamingADX(14)
+        self.bbands = StreamingBBands(20, 2, 2)
+        self.atr = StreamingATR(14)
+        self.mfi = StreamingMFI(14)
+        self.cci = StreamingCCI(14)
+        self.roc = StreamingROC(10)
+        self.volume_mean = StreamingSMA(20)
+        self.last_timestamp = None
+        self.row: Dict[str, float] = {}
+
+    def update(self, open_: float, high: float, low: float, close: float, volume: float) -> Dict[str, float]:
+        """Feed the next closed candle and return its raw feature row"""
+        row = {'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume}
+        row['rsi'] = self.rsi.update(close)
+        row['macd'], row['macd_signal'] = self.macd.update(close)
+        for period, ema in self.emas.items():
+            row[f'ema_{period}'] = ema.update(close)
+        row['obv'] = self.obv.update(close, volume)
+        row['adx'] = self.adx.update(high, low, close)
+        row['bbands_upper'], row['bbands_middle'], row['bbands_lower'] = self.bbands.update(close)
+        row['atr'] = self.atr.update(high, low, close)
+        row['mfi'] = self.mfi.update(high, low, close, volume)
+        row['cci'] = self.cci.update(high, low, close)
+        row['roc'] = self.roc.update(close)
+
+        # Same float semantics as the pandas columns: x/0 is inf, 0/0 is nan
+        with np.errstate(divide='ignore', invalid='ignore'):
+            f = np.float64
+            row['price_position'] = float(
+                (f(close) - f(row['bbands_lower'])) / (f(row['bbands_upper']) - f(row['bbands_lower']))
+            )
+            row['volume_trend'] = float(f(volume) / f(self.volume_mean.update(volume)))
+            row['trend_strength'] = float(abs(f(row['ema_9']) - f(row['ema_50'])) / f(row['atr']))
+
+        self.row = row
+        return row
+
+    def _indicators(self) -> List[StreamingIndicator]:
+        return [self.rsi, self.macd, *self.emas.values(), self.obv, self.adx, self.bbands, self.atr, self.mfi,
+                self.cci, self.roc, self.volume_mean]
+
+    def checkpoint(self) -> Tuple:
+        """State to `rewind` to after the next update"""
+        return [indicator.checkpoint() for indicator in self._indicators()], self.row, self.last_timestamp
+
+    def rewind(self, saved: Tuple):
+        checkpoints, self.row, self.last_timestamp = saved
+        for indicator, checkpoint in zip(self._indicators(), checkpoints):
+            indicator.rewind(checkpoint)
+
+    def features(self) -> pd.Series:
+        """Latest feature row with warm-up gaps filled, like _calculate_features"""
+        return pd.Series(self.row, index=FEATURE_COLUMNS, name=self.last_timestamp).fillna(0)
+
+class IncrementalIndicatorEngine:
+    """Keeps per (symbol, timeframe) indicator state and only processes new candles.
+
+    The last candle passed in may still be forming; when it comes back with the
+    same timestamp its previous version is rewound and it is applied again.
+    `window` is the number of latest candles the batch features are computed
+    over, the live features then match them.
+    """
+
+    def __init__(self, window: int = None):
+        self.window = window
+        self.states: Dict[Tuple[str, str], IndicatorState] = {}
+        self._before_last: Dict[Tuple[str, str], Tuple] = {}
+
+    def update(self, symbol: str, timeframe: str, data: pd.DataFrame) -> pd.Series:
+        """Bring the state up to date with `data` and return the latest feature row"""
+        key = (symbol, timeframe)
+        state = self.states.get(key)
+
+        if state is not None and state.last_timestamp is not None:
+            if data.index[-1] == state.last_timestamp:
+                state.rewind(self._before_last[key])
+                new = data.iloc[-1:]
+            else:
+                new = data[data.index > state.last_timestamp]
+        else:
+            state = IndicatorState(self.window)
+            new = data
+
+        if new.empty:
+            return state.features()
+
+        candles = new[OHLCV_COLUMNS].to_numpy(dtype=np.float64)
+        for candle in candles[:-1]:
+            state.update(*candle)
+        self._before_last[key] = state.checkpoint()
+        state.update(*candles[-1])
+        state.last_timestamp = new.index[-1]
+
+        self.states[key] = state
+        return state.features()
+
+    def reset(self, symbol: str = None, timeframe: str = None):
+        """Drop state so it is rebuilt from the next full history"""
+        for key in list(self.states):
+            if (symbol is None or key[0] == symbol) and (timeframe is None or key[1] == timeframe):
+                del self.states[key]
+                self._before_last.pop(key, None)
+
+    @staticmethod
+    def replay(data: pd.DataFrame) -> pd.DataFrame:
+        """Stream a whole history through a fresh state, one row per candle"""
+        state = IndicatorState()
+        rows = [dict(state.update(*candle)) for candle in data[OHLCV_COLUMNS].to_numpy(dtype=np.float64)]
+        return pd.DataFrame(rows, index=data.index, columns=FEATURE_COLUMNS).fillna(0)
+
+    def verify(self, symbol: str, timeframe: str, batch_features: pd.DataFrame,
+               rtol: float = 1e-6, atol: float = 1e-8) -> Dict[str, float]:
+        """Compare the live features of a series against batch TA-Lib ones ending at the same candle.
+
+        Returns the absolute difference of every column that is out of
+        tolerance; an empty dict means the two agree. `batch_features`
+        should cover the engine's `window` of candles.
+        """
+        state = self.states[(symbol, timeframe)]
+        if batch_features.index[-1] != state.last_timestamp:
+            raise ValueError(
+                f"Batch features end at {batch_features.index[-1]}, the {symbol} {timeframe} state at {state.last_timestamp}"
+            )
+
+        expected = batch_features.iloc[-1][FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+        actual = state.features().to_numpy(dtype=np.float64)
+        close = np.isclose(actual, expected, rtol=rtol, atol=atol, equal_nan=True)
+        with np.errstate(invalid='ignore'):
+            differences = np.abs(actual - expected)
+        return {column: float(differences[i]) for i, column in enumerate(FEATURE_COLUMNS) if not close[i]}
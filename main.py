@@ -1,5 +1,6 @@
 import os
 import asyncio
+import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, CallbackContext
 from config import BotConfig
@@ -7,13 +8,18 @@ from dynamic_stats_manager import EnhancedStatsManager
 from language_manager import LanguageManager
 from user_preferences import UserPreferencesManager
 from news_manager import NewsManager
+from database import Database
+from trade_export import FORMATS, send_trade_export
+
+logger = logging.getLogger(__name__)
 
 class CryptoSignalBot:
     def __init__(self):
         self.config = BotConfig()
         self.stats_manager = EnhancedStatsManager()
         self.language_manager = LanguageManager()
-        self.user_prefs_manager = UserPreferencesManager()
+        self.db = Database.from_config(self.config)
+        self.user_prefs_manager = UserPreferencesManager.from_config(self.db, self.config)
         self.news_manager = NewsManager(self.config.NEWS_API_KEY)
         
         # Create Telegram bot application
@@ -25,6 +31,7 @@ class CryptoSignalBot:
         self.application.add_handler(CommandHandler("settings", self.settings_command))
         self.application.add_handler(CommandHandler("language", self.language_command))
         self.application.add_handler(CommandHandler("news", self.news_command))
+        self.application.add_handler(CommandHandler("export", self.export_command))
         
     async def start_command(self, update: Update, context: CallbackContext):
         """Handle /start command"""
@@ -132,10 +139,40 @@ Current Users Online: {random.randint(1500, 2500)} 🟢
         )
         await update.message.reply_text(news_message, parse_mode='Markdown')
     
+    async def export_command(self, update: Update, context: CallbackContext):
+        """Send the trade history as a CSV or Parquet file: /export [csv|parquet] [all]"""
+        user_id = update.effective_user.id
+        args = [arg.lower() for arg in context.args]
+        fmt = next((arg for arg in args if arg in FORMATS), 'csv')
+        everyone = 'all' in args
+        if everyone and user_id not in self.config.ADMIN_IDS:
+            await update.message.reply_text("Only admins can export everyone's trades")
+            return
+        
+        await update.message.reply_text("📤 Preparing your export...")
+        try:
+            await send_trade_export(
+                context.bot,
+                update.effective_chat.id,
+                self.db,
+                fmt,
+                telegram_id=None if everyone else user_id,
+                chunk_size=self.config.EXPORT_CHUNK_SIZE
+            )
+        except Exception as e:
+            logger.error(f"Error exporting trades for {user_id}: {str(e)}")
+            await update.message.reply_text("❌ Export failed, please try again later.")
+    
     async def run(self):
         """Start the bot"""
+        await self.db.create_all()
         await self.application.start()
-        await self.application.idle()
+        try:
+            await self.application.idle()
+        finally:
+            # Write back preference changes still pending, then let go of the connections
+            await self.user_prefs_manager.close()
+            await self.db.close()
 
 if __name__ == "__main__":
     bot = CryptoSignalBot()
@@ -0,0 +1,356 @@
+from typing import AsyncIterator, Dict, List, Optional
+import pandas as pd
+import numpy as np
+import asyncio
+import logging
+import random
+import time
+import zlib
+import ccxt
+from request_scheduler import RequestScheduler, BACKGROUND, shared_scheduler
+
+logger = logging.getLogger(__name__)
+
+TIMEFRAME_MS = {
+    '1m': 60_000,
+    '3m': 3 * 60_000,
+    '5m': 5 * 60_000,
+    '15m': 15 * 60_000,
+    '30m': 30 * 60_000,
+    '1h': 3_600_000,
+    '2h': 2 * 3_600_000,
+    '4h': 4 * 3_600_000,
+    '6h': 6 * 3_600_000,
+    '12h': 12 * 3_600_000,
+    '1d': 86_400_000,
+    '1w': 7 * 86_400_000
+}
+
+# Weekly candles open on Monday 00:00 UTC like on the exchanges, the epoch was a Thursday
+TIMEFRAME_OFFSET_MS = {'1w': 4 * 86_400_000}
+
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+def ohlcv_to_frame(rows: List[List[float]]) -> pd.DataFrame:
+    """Turn ccxt style [ts, open, high, low, close, volume] rows into a DataFrame"""
+    df = pd.DataFrame(rows, columns=['timestamp'] + OHLCV_COLUMNS)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    return df.set_index('timestamp').astype(float)
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+class MarketDataSource:
+    """Interface shared by every market data feed.
+
+    Tickers use the ccxt layout ('symbol', 'timestamp', 'last', 'percentage',
+    'quoteVolume'), candles come back from `ohlcv_to_frame`. Coroutines
+    use the `*_async` variants, which never block the event loop.
+    """
+
+    def now_ms(self) -> int:
+        """Current time as seen by this source"""
+        return now_ms()
+
+    def fetch_ticker(self, symbol: str) -> Dict:
+        raise NotImplementedError
+
+    def fetch_tickers(self, symbols: List[str]) -> Dict[str, Dict]:
+        """Fetch several tickers, sources with a bulk endpoint override this"""
+        return {symbol: self.fetch_ticker(symbol) for symbol in symbols}
+
+    def fetch_ohlcv(self, symbol: str, timeframe: str = '1h', since: int = None,
+                    limit: int = 500) -> pd.DataFrame:
+        raise NotImplementedError
+
+    async def fetch_ticker_async(self, symbol: str) -> Dict:
+        return await asyncio.to_thread(self.fetch_ticker, symbol)
+
+    async def fetch_tickers_async(self, symbols: List[str]) -> Dict[str, Dict]:
+        return await asyncio.to_thread(self.fetch_tickers, symbols)
+
+    async def fetch_ohlcv_async(self, symbol: str, timeframe: str = '1h', since: int = None,
+                                limit: int = 500) -> pd.DataFrame:
+        return await asyncio.to_thread(self.fetch_ohlcv, symbol, timeframe, since=since, limit=limit)
+
+    async def stream(self, symbols: List[str] = None) -> AsyncIterator[Dict]:
+        """Yield ticks as they happen"""
+        raise NotImplementedError
+        yield
+
+class ExchangeMarketDataSource(MarketDataSource):
+    """Live market data from a ccxt exchange.
+
+    With a RequestScheduler every call waits for its share of the rate
+    limit, queued at `priority`. The blocking methods are for worker
+    threads, the `*_async` ones queue on the scheduler without a thread.
+    """
+
+    def __init__(self, exchange, poll_interval: float = 1.0, scheduler: RequestScheduler = None,
+                 priority: int = BACKGROUND):
+        self.exchange = exchange
+        self.poll_interval = poll_interval
+        self.scheduler = scheduler
+        self.priority = priority
+
+    @classmethod
+    def from_config(cls, config, scheduler: RequestScheduler = None,
+                    priority: int = BACKGROUND) -> 'ExchangeMarketDataSource':
+        return cls(ccxt.binance({
+            'apiKey': config.BINANCE_API_KEY,
+            'secret': config.BINANCE_API_SECRET,
+            # The scheduler does the throttling
+            'enableRateLimit': scheduler is None
+        }), scheduler=scheduler, priority=priority)
+
+    def with_priority(self, priority: int) -> 'ExchangeMarketDataSource':
+        """The same exchange and scheduler, queued at another priority"""
+        return ExchangeMarketDataSource(self.exchange, self.poll_interval, self.scheduler, priority)
+
+    def _call(self, endpoint: str, *args, **kwargs):
+        if self.scheduler is None:
+            return getattr(self.exchange, endpoint)(*args, **kwargs)
+        result = self.scheduler.call(
+            getattr(self.exchange, endpoint), *args, endpoint=endpoint, priority=self.priority, **kwargs
+        )
+        self._sync_used_weight()
+        return result
+
+    async def _submit(self, endpoint: str, *args, **kwargs):
+        if self.scheduler is None:
+            return await asyncio.to_thread(getattr(self.exchange, endpoint), *args, **kwargs)
+        result = await self.scheduler.submit(
+            getattr(self.exchange, endpoint), *args, endpoint=endpoint, priority=self.priority, **kwargs
+        )
+        self._sync_used_weight()
+        return result
+
+    def _sync_used_weight(self):
+        used = (getattr(self.exchange, 'last_response_headers', None) or {}).get('x-mbx-used-weight-1m')
+        if used is not None:
+            self.scheduler.sync_used_weight(float(used))
+
+    def fetch_ticker(self, symbol: str) -> Dict:
+        return self._call('fetch_ticker', symbol)
+
+    def fetch_tickers(self, symbols: List[str]) -> Dict[str, Dict]:
+        return self._call('fetch_tickers', symbols)
+
+    def fetch_ohlcv(self, symbol: str, timeframe: str = '1h', since: int = None,
+                    limit: int = 500) -> pd.DataFrame:
+        return ohlcv_to_frame(self._call('fetch_ohlcv', symbol, timeframe, since=since, limit=limit))
+
+    async def fetch_ticker_async(self, symbol: str) -> Dict:
+        return await self._submit('fetch_ticker', symbol)
+
+    async def fetch_tickers_async(self, symbols: List[str]) -> Dict[str, Dict]:
+        return await self._submit('fetch_tickers', symbols)
+
+    async def fetch_ohlcv_async(self, symbol: str, timeframe: str = '1h', since: int = None,
+                                limit: int = 500) -> pd.DataFrame:
+        return ohlcv_to_frame(await self._submit('fetch_ohlcv', symbol, timeframe, since=since, limit=limit))
+
+    async def stream(self, symbols: List[str] = None) -> AsyncIterator[Dict]:
+        """Poll the exchange for tickers"""
+        while True:
+            tickers = await self.fetch_tickers_async(symbols)
+            for ticker in tickers.values():
+                yield ticker
+            await asyncio.sleep(self.poll_interval)
+
+class SyntheticMarketDataSource(MarketDataSource):
+    """Seeded, reproducible fake market data.
+
+    Candle i of a (symbol, timeframe) series only depends on the seed and i,
+    so overlapping requests always agree with each other.
+    """
+
+    def __init__(self, seed: int = None, base_prices: Dict[str, float] = None):
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.base_prices = base_prices or {}
+        self.random = random.Random(self.seed)
+
+    def _base_price(self, symbol: str) -> float:
+        return self.base_prices.get(symbol, 100)
+
+    def fetch_ticker(self, symbol: str) -> Dict:
+        base = self._base_price(symbol)
+        variation = self.random.uniform(-0.02, 0.02)  # 2% variation
+        return {
+            'symbol': symbol,
+            'timestamp': now_ms(),
+            'last': round(base * (1 + variation), 8),
+            'percentage': self.random.uniform(-5, 5),
+            'quoteVolume': self.random.uniform(1000000, 100000000)
+        }
+
+    def _noise(self, key: int, index: np.ndarray) -> np.ndarray:
+        """Deterministic uniform noise in [-1, 1] for each candle index"""
+        h = (index.astype(np.uint64) * np.uint64(2654435761) + np.uint64(key)) % np.uint64(2 ** 32)
+        h = (h ^ (h >> np.uint64(15))) * np.uint64(2246822519) % np.uint64(2 ** 32)
+        return h.astype(np.float64) / 2 ** 31 - 1
+
+    def _close(self, key: int, base: float, index: np.ndarray) -> np.ndarray:
+        phase = (key % 1000) / 1000 * 2 * np.pi
+        wave = (
+            0.08 * np.sin(2 * np.pi * index / 480 + phase) +
+            0.03 * np.sin(2 * np.pi * index / 60 + 2 * phase)
+        )
+        return base * np.exp(wave + 0.004 * self._noise(key, index))
+
+    def fetch_ohlcv(self, symbol: str, timeframe: str = '1h', since: int = None,
+                    limit: int = 500) -> pd.DataFrame:
+        step = TIMEFRAME_MS[timeframe]
+        last = now_ms() // step
+        first = -(-since // step) if since is not None else last - limit + 1
+        index = np.arange(first, min(first + limit, last + 1))
+
+        key = zlib.crc32(f"{self.seed}:{symbol}:{timeframe}".encode())
+        base = self._base_price(symbol)
+        close = self._close(key, base, index)
+        open_ = self._close(key, base, index - 1)
+        wick = 1 + 0.003 * np.abs(self._noise(key + 1, index))
+        high = np.maximum(open_, close) * wick
+        low = np.minimum(open_, close) / wick
+        volume = 1000 * (1.5 + self._noise(key + 2, index))
+
+        rows = np.column_stack([index * step, open_, high, low, close, volume])
+        return ohlcv_to_frame(rows)
+
+    # Computed in place, there is no I/O to move off the event loop
+    async def fetch_ticker_async(self, symbol: str) -> Dict:
+        return self.fetch_ticker(symbol)
+
+    async def fetch_tickers_async(self, symbols: List[str]) -> Dict[str, Dict]:
+        return self.fetch_tickers(symbols)
+
+    async def fetch_ohlcv_async(self, symbol: str, timeframe: str = '1h', since: int = None,
+                                limit: int = 500) -> pd.DataFrame:
+        return self.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
+
+    async def stream(self, symbols: List[str] = None) -> AsyncIterator[Dict]:
+        """Endless stream of synthetic tickers, as fast as they are consumed"""
+        symbols = symbols or list(self.base_prices)
+        while True:
+            for symbol in symbols:
+                yield self.fetch_ticker(symbol)
+            await asyncio.sleep(0)
+
+class ReplayMarketDataSource(MarketDataSource):
+    """Replays a recorded OHLCV or tick tape from disk.
+
+    The tape is a CSV (optionally gzipped) with columns timestamp (ms), symbol,
+    open, high, low, close, volume; a tick tape simply repeats the price in
+    every column. `speed` is a multiple of real time (1, 100, ...), None
+    replays as fast as possible.
+    """
+
+    def __init__(self, path: str, speed: Optional[float] = None):
+        self.path = path
+        self.speed = speed
+        self.tape = pd.read_csv(path).sort_values('timestamp', kind='stable').reset_index(drop=True)
+        # Each symbol's rows and their timestamps, split once so lookups only slice
+        self._by_symbol = {
+            symbol: (rows.reset_index(drop=True), rows['timestamp'].to_numpy())
+            for symbol, rows in self.tape.groupby('symbol', sort=False)
+        }
+        # Nothing past the replay clock is visible, before replaying that's the whole tape
+        self.clock = int(self.tape['timestamp'].iloc[-1])
+
+    def now_ms(self) -> int:
+        return self.clock
+
+    def _visible(self, symbol: str) -> pd.DataFrame:
+        if symbol not in self._by_symbol:
+            return self.tape.iloc[:0]
+        rows, timestamps = self._by_symbol[symbol]
+        return rows.iloc[:np.searchsorted(timestamps, self.clock, side='right')]
+
+    def fetch_ticker(self, symbol: str) -> Dict:
+        rows = self._visible(symbol)
+        if rows.empty:
+            raise ValueError(f"No data for {symbol} on the tape")
+
+        last = rows.iloc[-1]
+        day_ago = rows[rows['timestamp'] <= last['timestamp'] - TIMEFRAME_MS['1d']]
+        reference = day_ago.iloc[-1]['close'] if not day_ago.empty else rows.iloc[0]['open']
+        day = rows[rows['timestamp'] > last['timestamp'] - TIMEFRAME_MS['1d']]
+        return {
+            'symbol': symbol,
+            'timestamp': int(last['timestamp']),
+            'last': float(last['close']),
+            'percentage': float((last['close'] / reference - 1) * 100),
+            'quoteVolume': float((day['close'] * day['volume']).sum())
+        }
+
+    def fetch_ohlcv(self, symbol: str, timeframe: str = '1h', since: int = None,
+                    limit: int = 500) -> pd.DataFrame:
+        rows = self._visible(symbol)
+        if since is not None:
+            rows = rows[rows['timestamp'] >= since]
+
+        df = rows.set_index(pd.to_datetime(rows['timestamp'], unit='ms'))[OHLCV_COLUMNS]
+        df.index.name = 'timestamp'
+        df = df.resample(
+            pd.Timedelta(milliseconds=TIMEFRAME_MS[timeframe]),
+            origin='epoch',
+            offset=pd.Timedelta(milliseconds=TIMEFRAME_OFFSET_MS.get(timeframe, 0))
+        ).agg({
+            'open': 'first',
+            'high': 'max',
+            'low': 'min',
+            'close': 'last',
+            'volume': 'sum'
+        }).dropna()
+        return df.iloc[:limit] if since is not None else df.iloc[-limit:]
+
+    async def stream(self, symbols: List[str] = None) -> AsyncIterator[Dict]:
+        """Replay the tape, pacing it according to `speed`"""
+        tape = self.tape if not symbols else self.tape[self.tape['symbol'].isin(symbols)]
+        started = time.monotonic()
+        tape_start = None
+
+        for row in tape.itertuples(index=False):
+            if tape_start is None:
+                tape_start = row.timestamp
+            if self.speed:
+                delay = (row.timestamp - tape_start) / 1000 / self.speed - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                await asyncio.sleep(0)
+
+            self.clock = int(row.timestamp)
+            yield {
+                'symbol': row.symbol,
+                'timestamp': int(row.timestamp),
+                'open': row.open,
+                'high': row.high,
+                'low': row.low,
+                'last': row.close,
+                'volume': row.volume
+            }
+
+def record_tape(source: MarketDataSource, symbols: List[str], path: str,
+                timeframe: str = '1m', since: int = None, limit: int = 1000):
+    """Record candles from any source into a tape ReplayMarketDataSource can play"""
+    frames = []
+    for symbol in symbols:
+        df = source.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
+        df = df.reset_index()
+        df['timestamp'] = (df['timestamp'] - pd.Timestamp(0)) // pd.Timedelta(milliseconds=1)
+        df.insert(1, 'symbol', symbol)
+        frames.append(df)
+
+    tape = pd.concat(frames).sort_values(['timestamp', 'symbol'])
+    tape.to_csv(path, index=False)
+    logger.info(f"Recorded {len(tape)} candles for {len(symbols)} symbols to {path}")
+
+def create_market_data_source(config, base_prices: Dict[str, float] = None,
+                              priority: int = BACKGROUND) -> MarketDataSource:
+    """Build the market data source selected by MARKET_DATA_SOURCE"""
+    if config.MARKET_DATA_SOURCE == 'exchange':
+        return ExchangeMarketDataSource.from_config(config, shared_scheduler(config), priority)
+    if config.MARKET_DATA_SOURCE == 'replay':
+        return ReplayMarketDataSource(config.MARKET_REPLAY_PATH, config.MARKET_REPLAY_SPEED)
+    return SyntheticMarketDataSource(config.MARKET_DATA_SEED, base_prices)
@@ -0,0 +1,288 @@
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import random
+import time
+import aiohttp
+from market_data import MarketDataSource, TIMEFRAME_MS, now_ms
+from candle_store import frame_to_columns
+
+logger = logging.getLogger(__name__)
+
+def stream_symbol(symbol: str) -> str:
+    """'BTC/USDT' -> 'BTCUSDT', the way Binance streams name markets"""
+    return symbol.replace('/', '').upper()
+
+def parse_message(message: Dict, symbols: Dict[str, str]) -> Optional[Dict]:
+    """Turn a Binance trade, kline or 24hr ticker payload into a stream event.
+
+    `symbols` maps stream names back to our symbols, anything else (like the
+    replies to SUBSCRIBE) gives None.
+    """
+    data = message.get('data', message)
+    kind = data.get('e')
+    symbol = symbols.get(data.get('s'))
+    if symbol is None:
+        return None
+
+    if kind == 'trade':
+        return {
+            'type': 'trade',
+            'symbol': symbol,
+            'timestamp': int(data['T']),
+            'id': int(data['t']),
+            'last': float(data['p']),
+            'amount': float(data['q'])
+        }
+    if kind == 'kline':
+        k = data['k']
+        return {
+            'type': 'kline',
+            'symbol': symbol,
+            'timeframe': k['i'],
+            'timestamp': int(k['t']),
+            'open': float(k['o']),
+            'high': float(k['h']),
+            'low': float(k['l']),
+            'close': float(k['c']),
+            'volume': float(k['v']),
+            'closed': bool(k['x'])
+        }
+    if kind == '24hrTicker':
+        return {
+            'type': 'ticker',
+            'symbol': symbol,
+            'timestamp': int(data['E']),
+            'last': float(data['c']),
+            'percentage': float(data['P']),
+            'quoteVolume': float(data['q'])
+        }
+    return None
+
+class MarketStream:
+    """Trade, kline and ticker streams of many symbols over one WebSocket.
+
+    Events are fanned out to subscriber queues. Queues are bounded: when a
+    slow subscriber's queue is full its oldest event is dropped (and
+    counted), the stream never waits for a subscriber. The connection is
+    re-established with jittered exponential backoff; closed klines missed
+    while disconnected, or skipped by the feed, are fetched from
+    `gap_source` and published (flagged 'backfill') before the live ones.
+    """
+
+    def __init__(self, url: str, symbols: Iterable[str], gap_source: MarketDataSource = None,
+                 timeframe: str = '1m', queue_size: int = 10000, backoff_base: float = 0.5,
+                 backoff_max: float = 30, heartbeat: float = 30):
+        self.url = url
+        self.symbols = {stream_symbol(symbol): symbol for symbol in symbols}
+        self.gap_source = gap_source
+        self.timeframe = timeframe
+        self.queue_size = queue_size
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.heartbeat = heartbeat
+        self._subscribers: Dict[str, Tuple[asyncio.Queue, Optional[set]]] = {}
+        self._last_kline: Dict[str, int] = {}
+        self._stopped = False
+        self.connected = False
+        self.stats = {'messages': 0, 'malformed': 0, 'events': 0, 'connects': 0, 'reconnects': 0, 'backfilled': 0, 'dropped': {}}
+
+    def streams(self) -> List[str]:
+        names = []
+        for name in self.symbols:
+            name = name.lower()
+            names += [f"{name}@trade", f"{name}@kline_{self.timeframe}", f"{name}@ticker"]
+        return names
+
+    def subscribe(self, name: str, types: Iterable[str] = None, maxsize: int = None) -> asyncio.Queue:
+        """Queue receiving every event (or only events of the given types)"""
+        queue = asyncio.Queue(maxsize=maxsize or self.queue_size)
+        self._subscribers[name] = (queue, set(types) if types else None)
+        self.stats['dropped'][name] = 0
+        return queue
+
+    def unsubscribe(self, name: str):
+        self._subscribers.pop(name, None)
+
+    def publish(self, event: Dict):
+        self.stats['events'] += 1
+        for name, (queue, types) in self._subscribers.items():
+            if types is not None and event['type'] not in types:
+                continue
+            if queue.full():
+                queue.get_nowait()
+                self.stats['dropped'][name] += 1
+            queue.put_nowait(event)
+
+    def stop(self):
+        self._stopped = True
+
+    async def run(self):
+        """Stay connected until stopped"""
+        attempt = 0
+        async with aiohttp.ClientSession() as session:
+            while not self._stopped:
+                try:
+                    async with session.ws_connect(self.url, heartbeat=self.heartbeat) as ws:
+                        self.connected = True
+                        self.stats['connects'] += 1
+                        await ws.send_json({'method': 'SUBSCRIBE', 'params': self.streams(), 'id': 1})
+                        logger.info(f"Market stream connected to {self.url}")
+
+                        async for message in ws:
+                            if message.type != aiohttp.WSMsgType.TEXT:
+                                break
+                            attempt = 0
+                            await self._receive(message.data)
+                            if self._stopped:
+                                break
+                except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                    logger.warning(f"Market stream error: {str(e)}")
+                finally:
+                    self.connected = False
+
+                if self._stopped:
+                    break
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1)
+                attempt += 1
+                self.stats['reconnects'] += 1
+                logger.info(f"Market stream reconnecting in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def _receive(self, data: str):
+        """Handle one frame, one that can't be parsed is logged and skipped"""
+        self.stats['messages'] += 1
+        try:
+            event = parse_message(json.loads(data), self.symbols)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self.stats['malformed'] += 1
+            logger.warning(f"Skipping malformed market stream message ({type(e).__name__}: {str(e)}): {data[:200]}")
+            return
+        if event is not None:
+            await self._handle(event)
+
+    async def _handle(self, event: Dict):
+        # Local receive time, for latencies further down
+        event['received'] = time.monotonic()
+
+        if event['type'] == 'kline' and event['closed']:
+            last = self._last_kline.get(event['symbol'])
+            if last is not None and event['timestamp'] <= last:
+                # Replayed after a reconnect
+                return
+            step = TIMEFRAME_MS[event['timeframe']]
+            if last is not None and event['timestamp'] > last + step:
+                await self._backfill(event['symbol'], event['timeframe'], last + step, event['timestamp'])
+            self._last_kline[event['symbol']] = event['timestamp']
+
+        self.publish(event)
+
+    async def _backfill(self, symbol: str, timeframe: str, since: int, until: int):
+        """Publish the closed klines in [since, until) the stream didn't deliver"""
+        if self.gap_source is None:
+            logger.warning(f"Missed {symbol} {timeframe} klines from {since} to {until}")
+            return
+        step = TIMEFRAME_MS[timeframe]
+        try:
+            candles = await self.gap_source.fetch_ohlcv_async(
+                symbol, timeframe, since=since, limit=(until - since) // step
+            )
+        except Exception as e:
+            logger.error(f"Error filling {symbol} {timeframe} gap: {str(e)}")
+            return
+
+        columns = frame_to_columns(candles)
+        for i in range(len(columns['ts'])):
+            if not since <= columns['ts'][i] < until:
+                continue
+            self.stats['backfilled'] += 1
+            self.publish({
+                'type': 'kline',
+                'symbol': symbol,
+                'timeframe': timeframe,
+                'timestamp': int(columns['ts'][i]),
+                **{name: float(columns[name][i]) for name in ('open', 'high', 'low', 'close', 'volume')},
+                'closed': True,
+                'backfill': True,
+                'received': time.monotonic()
+            })
+
+class StreamingMarketDataSource(MarketDataSource):
+    """Tickers from a MarketStream, everything else from `fallback`.
+
+    `consume` keeps the latest ticker of every symbol up to date. Symbols
+    without a ticker younger than `max_age_ms` are fetched from the
+    fallback, as are candles.
+    """
+
+    def __init__(self, fallback: MarketDataSource, max_age_ms: int = 10_000):
+        self.fallback = fallback
+        self.max_age_ms = max_age_ms
+        self.tickers: Dict[str, Dict] = {}
+
+    async def consume(self, queue: asyncio.Queue):
+        while True:
+            self.apply(await queue.get())
+
+    def apply(self, event: Dict):
+        """Update the ticker board with a ticker or trade event"""
+        ticker = self.tickers.get(event['symbol'])
+        if event['type'] == 'ticker':
+            self.tickers[event['symbol']] = {
+                'symbol': event['symbol'],
+                'timestamp': event['timestamp'],
+                'last': event['last'],
+                'percentage': event['percentage'],
+                'quoteVolume': event['quoteVolume']
+            }
+        elif event['type'] == 'trade' and ticker is not None and event['timestamp'] >= ticker['timestamp']:
+            # Trades are more frequent than tickers, keep the last price current
+            self.tickers[event['symbol']] = {**ticker, 'timestamp': event['timestamp'], 'last': event['last']}
+
+    def now_ms(self) -> int:
+        return self.fallback.now_ms()
+
+    def _fresh(self, symbol: str) -> Optional[Dict]:
+        ticker = self.tickers.get(symbol)
+        if ticker is not None and now_ms() - ticker['timestamp'] <= self.max_age_ms:
+            return ticker
+        return None
+
+    def fetch_ticker(self, symbol: str) -> Dict:
+        return self._fresh(symbol) or self.fallback.fetch_ticker(symbol)
+
+    def fetch_tickers(self, symbols: List[str]) -> Dict[str, Dict]:
+        tickers = {symbol: self._fresh(symbol) for symbol in symbols}
+        missing = [symbol for symbol, ticker in tickers.items() if ticker is None]
+        if missing:
+            tickers.update(self.fallback.fetch_tickers(missing))
+        return tickers
+
+    def fetch_ohlcv(self, symbol: str, timeframe: str = '1h', since: int = None,
+                    limit: int = 500):
+        return self.fallback.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
+
+    async def fetch_ticker_async(self, symbol: str) -> Dict:
+        return self._fresh(symbol) or await self.fallback.fetch_ticker_async(symbol)
+
+    async def fetch_tickers_async(self, symbols: List[str]) -> Dict[str, Dict]:
+        tickers = {symbol: self._fresh(symbol) for symbol in symbols}
+        missing = [symbol for symbol, ticker in tickers.items() if ticker is None]
+        if missing:
+            tickers.update(await self.fallback.fetch_tickers_async(missing))
+        return tickers
+
+    async def fetch_ohlcv_async(self, symbol: str, timeframe: str = '1h', since: int = None,
+                                limit: int = 500):
+        return await self.fallback.fetch_ohlcv_async(symbol, timeframe, since=since, limit=limit)
+
+    async def stream(self, symbols: List[str] = None) -> AsyncIterator[Dict]:
+        """Yield tickers as they arrive"""
+        seen = dict(self.tickers)
+        while True:
+            for symbol, ticker in list(self.tickers.items()):
+                if (symbols is None or symbol in symbols) and seen.get(symbol) is not ticker:
+                    seen[symbol] = ticker
+                    yield ticker
+            await asyncio.sleep(0.05)
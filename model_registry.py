@@ -0,0 +1,136 @@
+from typing import Callable, Dict, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class ModelRegistry:
+    """Loads signal models on first use and trains missing ones in the background.
+
+    `get` never blocks: the first call for a symbol queues the load of its
+    model on a loader thread and returns None, as do the calls made while
+    it is loading or, when there is no usable model, being trained.
+    Callers fall back to rule-based signals meanwhile. After a failed
+    training `get` waits `retry_delay` seconds before trying again,
+    doubling with every further failure up to `max_retry_delay`. No I/O
+    happens while holding the registry's lock.
+    """
+
+    READY = 'ready'
+    LOADING = 'loading'
+    TRAINING = 'training'
+    FAILED = 'failed'
+    UNLOADED = 'unloaded'
+
+    def __init__(self, load_model: Callable[[str], object], train_model: Callable[[str], object],
+                 max_workers: int = 2, retry_delay: float = 60, max_retry_delay: float = 3600):
+        self.load_model = load_model
+        self.train_model = train_model
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.models: Dict[str, object] = {}
+        self.status: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        # Loads are quick, they don't queue behind trainings
+        self._loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-load')
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='model-train')
+        # The load or training under way, per symbol
+        self._training: Dict[str, Future] = {}
+        # Consecutive failures and when to try again, per symbol
+        self._failures: Dict[str, Tuple[int, float]] = {}
+
+    def get(self, symbol: str) -> Optional[object]:
+        """Return the symbol's model, or None while it isn't there yet"""
+        model = self.models.get(symbol)
+        if model is not None:
+            return model
+
+        with self._lock:
+            if symbol in self._training:
+                return None
+            failure = self._failures.get(symbol)
+            if failure is not None and time.monotonic() < failure[1]:
+                return None
+            self.status[symbol] = self.LOADING
+            future = self._training[symbol] = self._loader.submit(self.load_model, symbol)
+        self._watch(symbol, future, self._on_loaded)
+        return None
+
+    def train(self, symbol: str) -> Future:
+        """Schedule a (re)training of the symbol's model"""
+        with self._lock:
+            if symbol in self._training:
+                return self._training[symbol]
+            future = self._submit(symbol)
+        self._watch(symbol, future, self._on_trained)
+        return future
+
+    def _submit(self, symbol: str) -> Future:
+        self.status[symbol] = self.TRAINING
+        future = self._executor.submit(self.train_model, symbol)
+        self._training[symbol] = future
+        return future
+
+    def _watch(self, symbol: str, future: Future, done: Callable[[str, Future], None]):
+        # Outside the lock: a future that is already done runs the callback right here
+        future.add_done_callback(lambda f: done(symbol, f))
+
+    def _on_loaded(self, symbol: str, future: Future):
+        try:
+            model = future.result()
+        except Exception as e:
+            logger.info(f"No usable model for {symbol} ({str(e)}), training one in the background")
+            with self._lock:
+                training = self._submit(symbol)
+            self._watch(symbol, training, self._on_trained)
+            return
+
+        with self._lock:
+            self._training.pop(symbol, None)
+            self.models[symbol] = model
+            self.status[symbol] = self.READY
+            self._failures.pop(symbol, None)
+
+    def _on_trained(self, symbol: str, future: Future):
+        try:
+            model = future.result()
+        except Exception as e:
+            model, error = None, e
+
+        with self._lock:
+            self._training.pop(symbol, None)
+            if model is not None:
+                self.models[symbol] = model
+                self.status[symbol] = self.READY
+                self._failures.pop(symbol, None)
+            else:
+                self.status[symbol] = self.FAILED
+                failures = self._failures.get(symbol, (0, 0.0))[0] + 1
+                delay = min(self.max_retry_delay, self.retry_delay * 2 ** (failures - 1))
+                self._failures[symbol] = (failures, time.monotonic() + delay)
+
+        if model is not None:
+            logger.info(f"Model for {symbol} is ready")
+        else:
+            logger.error(f"Error training model for {symbol}, retrying in {delay:.0f}s: {str(error)}")
+
+    def swap(self, symbol: str, model: object):
+        """Replace a symbol's model, requests pick up the new one immediately"""
+        with self._lock:
+            self.models[symbol] = model
+            self.status[symbol] = self.READY
+            self._failures.pop(symbol, None)
+
+    def is_ready(self, symbol: str) -> bool:
+        return symbol in self.models
+
+    def readiness(self, symbols=None) -> Dict[str, str]:
+        """Status of every known (or every requested) symbol"""
+        symbols = symbols if symbols is not None else list(self.status)
+        return {symbol: self.status.get(symbol, self.UNLOADED) for symbol in symbols}
+
+    def shutdown(self, wait: bool = True):
+        self._loader.shutdown(wait=wait)
+        self._executor.shutdown(wait=wait)
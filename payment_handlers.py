@@ -5,18 +5,23 @@ from datetime import datetime
 import asyncio
 import logging
 from typing import Dict, Optional
+from price_cache import PriceCache, shared_price_cache
+from request_scheduler import RequestScheduler, USER, shared_scheduler
 
 logger = logging.getLogger(__name__)
 
 class PaymentProcessor:
-    def __init__(self, config):
+    def __init__(self, config, price_cache: PriceCache = None, scheduler: RequestScheduler = None):
         self.config = config
+        self.scheduler = scheduler or shared_scheduler(config)
         # Initialize Web3 for Ethereum/MetaMask
         self.web3 = Web3(Web3.HTTPProvider(config.ETH_RPC_URL))
         # Initialize Solana client for Phantom
         self.solana_client = Client(config.SOLANA_RPC_URL)
         # Initialize Binance client
         self.binance_client = BinanceClient(config.BINANCE_API_KEY, config.BINANCE_API_SECRET)
+        # Quotes of every plan click share the cached prices of /price
+        self.price_cache = price_cache or shared_price_cache(config)
         
         # Smart contract ABI and addresses
         self.payment_contract = self.web3.eth.contract(
@@ -28,9 +33,10 @@ class PaymentProcessor:
         """Generate payment addresses and amounts for different methods"""
         try:
             # Get current prices
-            eth_price = float(self.binance_client.get_symbol_ticker(symbol="ETHUSDT")['price'])
-            sol_price = float(self.binance_client.get_symbol_ticker(symbol="SOLUSDT")['price'])
-            bnb_price = float(self.binance_client.get_symbol_ticker(symbol="BNBUSDT")['price'])
+            tickers = await self.price_cache.get_many(['ETH/USDT', 'SOL/USDT', 'BNB/USDT'])
+            eth_price = float(tickers['ETH/USDT']['last'])
+            sol_price = float(tickers['SOL/USDT']['last'])
+            bnb_price = float(tickers['BNB/USDT']['last'])
             
             # Calculate amounts in different cryptocurrencies
             eth_amount = amount_usd / eth_price
@@ -1,92 +1,279 @@
 from typing import Dict, List
+import asyncio
+import logging
 import pandas as pd
 from datetime import datetime, timedelta
 import numpy as np
 from decimal import Decimal
+from sqlalchemy import and_, case, select, update
+from database import Portfolio, PortfolioExposure, Position, Trade, upsert
+from market_data import create_market_data_source
+from price_cache import PriceCache
+from request_scheduler import USER
+from write_batcher import WriteBatcher
+
+logger = logging.getLogger(__name__)
 
 class PortfolioManager:
-    def __init__(self, db_session, config):
-        self.db_session = db_session
+    def __init__(self, db, config, price_cache: PriceCache = None):
+        self.db = db
         self.config = config
         self.risk_manager = RiskManager()
+        self.price_cache = price_cache or PriceCache.from_source(
+            create_market_data_source(config, priority=USER),
+            config.PRICE_CACHE_TTL,
+            config.PRICE_CACHE_STALE_TTL
+        )
+        # Position and trade writes of all users go out in shared commits
+        self.writer = WriteBatcher(db, config.WRITE_BATCH_SIZE, config.WRITE_BATCH_DELAY)
     
     async def get_portfolio_summary(self, user_id: int) -> Dict:
-        """Get user's portfolio summary"""
-        portfolio = self.db_session.query(Portfolio).filter_by(user_id=user_id).first()
+        """Get user's portfolio summary.
         
-        if not portfolio:
-            return self._generate_empty_portfolio()
+        Closed trades are only read back as the portfolio's running totals
+        and open positions as their per-symbol sums, so one indexed query
+        does however long the history is.
+        """
+        async with self.db.session() as session:
+            rows = (await session.execute(
+                select(Portfolio, PortfolioExposure)
+                .outerjoin(PortfolioExposure, and_(
+                    PortfolioExposure.portfolio_id == Portfolio.id,
+                    PortfolioExposure.position_count > 0
+                ))
+                .where(Portfolio.user_id == user_id)
+            )).all()
         
-        positions = self.db_session.query(Position).filter_by(portfolio_id=portfolio.id).all()
-        trades = self.db_session.query(Trade).filter_by(portfolio_id=portfolio.id).all()
+        if not rows:
+            return self._generate_empty_portfolio()
+        portfolio = rows[0][0]
+        exposures = [exposure for _, exposure in rows if exposure is not None]
+        prices = await self._current_prices(exposures)
         
         return {
-            'total_value': self._calculate_total_value(positions),
-            'pnl': self._calculate_total_pnl(positions),
-            'performance': self._calculate_performance_metrics(trades),
-            'positions': self._format_positions(positions),
-            'risk_metrics': self.risk_manager.calculate_risk_metrics(positions),
-            'suggestions': await self._generate_portfolio_suggestions(positions)
+            'total_value': self._calculate_total_value(exposures, prices),
+            'pnl': self._calculate_total_pnl(portfolio, exposures, prices),
+            'performance': self._calculate_performance_metrics(portfolio),
+            'positions': self._format_positions(exposures, prices),
+            'risk_metrics': self.risk_manager.calculate_risk_metrics(exposures),
+            'suggestions': await self._generate_portfolio_suggestions(exposures)
         }
     
     async def add_position(self, user_id: int, position_data: Dict) -> Dict:
         """Add new position to portfolio"""
-        try:
-            portfolio = self._get_or_create_portfolio(user_id)
-            
-            # Validate position against risk management rules
-            if not self.risk_manager.validate_new_position(portfolio, position_data):
-                raise ValueError("Position exceeds risk management limits")
-            
-            position = Position(
-                portfolio_id=portfolio.id,
-                symbol=position_data['symbol'],
-                entry_price=position_data['entry_price'],
-                quantity=position_data['quantity'],
-                side=position_data['side'],
-                entry_time=datetime.utcnow()
-            )
-            
-            self.db_session.add(position)
-            self.db_session.commit()
-            
-            return {'status': 'success', 'position_id': position.id}
-            
-        except Exception as e:
-            self.db_session.rollback()
-            raise e
+        return await self.writer.submit(self._add_position, user_id, position_data)
     
     async def close_position(self, position_id: int, exit_data: Dict) -> Dict:
         """Close an existing position"""
-        try:
-            position = self.db_session.query(Position).get(position_id)
-            if not position:
-                raise ValueError("Position not found")
-            
-            trade = Trade(
+        return await self.writer.submit(self._close_position, position_id, exit_data)
+    
+    async def _add_position(self, session, user_id: int, position_data: Dict) -> Dict:
+        # Runs in a savepoint of a group commit, an error undoes this write only
+        portfolio = await self._get_or_create_portfolio(session, user_id)
+        
+        # Validate position against risk management rules
+        if not self.risk_manager.validate_new_position(portfolio, position_data):
+            raise ValueError("Position exceeds risk management limits")
+        
+        position = Position(
+            portfolio_id=portfolio.id,
+            symbol=position_data['symbol'],
+            entry_price=position_data['entry_price'],
+            quantity=position_data['quantity'],
+            side=position_data['side'],
+            entry_time=datetime.utcnow()
+        )
+        
+        session.add(position)
+        await session.flush()
+        await self._open_exposure(session, position)
+        
+        return {'status': 'success', 'position_id': position.id}
+    
+    async def _close_position(self, session, position_id: int, exit_data: Dict) -> Dict:
+        position = await session.get(Position, position_id)
+        if not position:
+            raise ValueError("Position not found")
+        
+        trade = Trade(
+            portfolio_id=position.portfolio_id,
+            symbol=position.symbol,
+            entry_price=position.entry_price,
+            exit_price=exit_data['exit_price'],
+            quantity=position.quantity,
+            side=position.side,
+            entry_time=position.entry_time,
+            exit_time=datetime.utcnow(),
+            pnl=self._calculate_trade_pnl(position, exit_data['exit_price'])
+        )
+        
+        session.add(trade)
+        await session.delete(position)
+        await self._close_exposure(session, position)
+        await self._record_trade(session, trade)
+        
+        return {
+            'status': 'success',
+            'trade_summary': self._format_trade(trade)
+        }
+    
+    async def _get_or_create_portfolio(self, session, user_id: int) -> Portfolio:
+        await session.execute(upsert(session, Portfolio).values(user_id=user_id).on_conflict_do_nothing(index_elements=['user_id']))
+        return (await session.scalars(select(Portfolio).where(Portfolio.user_id == user_id))).one()
+    
+    async def _open_exposure(self, session, position: Position):
+        """Add a new position to its symbol's sums"""
+        cost = position.quantity * position.entry_price
+        long = position.side == 'BUY'
+        # Increments happen in the statement, concurrent updates of the same row can't get lost
+        await session.execute(
+            upsert(session, PortfolioExposure)
+            .values(
                 portfolio_id=position.portfolio_id,
                 symbol=position.symbol,
-                entry_price=position.entry_price,
-                exit_price=exit_data['exit_price'],
-                quantity=position.quantity,
-                side=position.side,
-                entry_time=position.entry_time,
-                exit_time=datetime.utcnow(),
-                pnl=self._calculate_trade_pnl(position, exit_data['exit_price'])
+                position_count=1,
+                long_quantity=position.quantity if long else 0.0,
+                long_cost=cost if long else 0.0,
+                short_quantity=0.0 if long else position.quantity,
+                short_cost=0.0 if long else cost
+            )
+            .on_conflict_do_update(
+                index_elements=['portfolio_id', 'symbol'],
+                set_={
+                    'position_count': PortfolioExposure.position_count + 1,
+                    'long_quantity': PortfolioExposure.long_quantity + (position.quantity if long else 0.0),
+                    'long_cost': PortfolioExposure.long_cost + (cost if long else 0.0),
+                    'short_quantity': PortfolioExposure.short_quantity + (0.0 if long else position.quantity),
+                    'short_cost': PortfolioExposure.short_cost + (0.0 if long else cost)
+                }
             )
-            
-            self.db_session.add(trade)
-            self.db_session.delete(position)
-            self.db_session.commit()
-            
-            return {
-                'status': 'success',
-                'trade_summary': self._format_trade(trade)
+        )
+    
+    async def _close_exposure(self, session, position: Position):
+        """Take a closed position out of its symbol's sums"""
+        cost = position.quantity * position.entry_price
+        long = position.side == 'BUY'
+        last = PortfolioExposure.position_count <= 1
+        
+        def minus(column, amount):
+            # Exactly zero once the last position is gone, no float residue left behind
+            return case((last, 0.0), else_=column - amount)
+        
+        await session.execute(
+            update(PortfolioExposure)
+            .where(PortfolioExposure.portfolio_id == position.portfolio_id,
+                   PortfolioExposure.symbol == position.symbol)
+            .values(
+                position_count=PortfolioExposure.position_count - 1,
+                long_quantity=minus(PortfolioExposure.long_quantity, position.quantity if long else 0.0),
+                long_cost=minus(PortfolioExposure.long_cost, cost if long else 0.0),
+                short_quantity=minus(PortfolioExposure.short_quantity, 0.0 if long else position.quantity),
+                short_cost=minus(PortfolioExposure.short_cost, 0.0 if long else cost)
+            )
+            .execution_options(synchronize_session=False)
+        )
+    
+    async def _record_trade(self, session, trade: Trade):
+        """Roll a closed trade into the portfolio's running totals"""
+        await session.execute(
+            update(Portfolio)
+            .where(Portfolio.id == trade.portfolio_id)
+            .values(
+                realized_pnl=Portfolio.realized_pnl + trade.pnl,
+                trade_count=Portfolio.trade_count + 1,
+                win_count=Portfolio.win_count + int(trade.pnl > 0),
+                loss_count=Portfolio.loss_count + int(trade.pnl < 0),
+                gross_profit=Portfolio.gross_profit + max(trade.pnl, 0.0),
+                gross_loss=Portfolio.gross_loss + max(-trade.pnl, 0.0)
+            )
+            .execution_options(synchronize_session=False)
+        )
+    
+    async def _current_prices(self, exposures: List[PortfolioExposure]) -> Dict[str, float]:
+        if not exposures:
+            return {}
+        symbols = list(dict.fromkeys(exposure.symbol for exposure in exposures))
+        # Looked up in the same loop iteration, they still share one bulk fetch
+        tickers = await asyncio.gather(*(self.price_cache.get(symbol) for symbol in symbols), return_exceptions=True)
+        prices = {}
+        missing = []
+        for symbol, ticker in zip(symbols, tickers):
+            if isinstance(ticker, Exception) or ticker.get('last') is None:
+                # Valued NaN, like the position book does
+                missing.append(symbol)
+                prices[symbol] = float('nan')
+            else:
+                prices[symbol] = float(ticker['last'])
+        if missing:
+            logger.warning(f"No ticker for held symbols {', '.join(missing)}")
+        return prices
+    
+    def _calculate_total_value(self, exposures: List[PortfolioExposure], prices: Dict[str, float]) -> float:
+        """Market value of the open positions, longs and shorts alike"""
+        return sum((exposure.long_quantity + exposure.short_quantity) * prices[exposure.symbol]
+                   for exposure in exposures)
+    
+    def _calculate_total_pnl(self, portfolio: Portfolio, exposures: List[PortfolioExposure],
+                             prices: Dict[str, float]) -> Dict:
+        unrealized = sum(self._unrealized_pnl(exposure, prices[exposure.symbol]) for exposure in exposures)
+        return {
+            'realized': portfolio.realized_pnl,
+            'unrealized': unrealized,
+            'total': portfolio.realized_pnl + unrealized
+        }
+    
+    def _unrealized_pnl(self, exposure: PortfolioExposure, price: float) -> float:
+        return (exposure.long_quantity * price - exposure.long_cost) + (exposure.short_cost - exposure.short_quantity * price)
+    
+    def _calculate_performance_metrics(self, portfolio: Portfolio) -> Dict:
+        """Closed trade statistics, from the running totals"""
+        trades = portfolio.trade_count
+        return {
+            'total_trades': trades,
+            'win_rate': portfolio.win_count / trades * 100 if trades else 0.0,
+            'avg_win': portfolio.gross_profit / portfolio.win_count if portfolio.win_count else 0.0,
+            'avg_loss': portfolio.gross_loss / portfolio.loss_count if portfolio.loss_count else 0.0,
+            'profit_factor': portfolio.gross_profit / portfolio.gross_loss if portfolio.gross_loss else None,
+            'realized_pnl': portfolio.realized_pnl
+        }
+    
+    def _format_positions(self, exposures: List[PortfolioExposure], prices: Dict[str, float]) -> List[Dict]:
+        return [
+            {
+                'symbol': exposure.symbol,
+                'positions': exposure.position_count,
+                'long_quantity': exposure.long_quantity,
+                'long_entry': exposure.long_cost / exposure.long_quantity if exposure.long_quantity else None,
+                'short_quantity': exposure.short_quantity,
+                'short_entry': exposure.short_cost / exposure.short_quantity if exposure.short_quantity else None,
+                'price': prices[exposure.symbol],
+                'value': (exposure.long_quantity + exposure.short_quantity) * prices[exposure.symbol],
+                'unrealized_pnl': self._unrealized_pnl(exposure, prices[exposure.symbol])
             }
-            
-        except Exception as e:
-            self.db_session.rollback()
-            raise e
+            for exposure in exposures
+        ]
+    
+    def _generate_empty_portfolio(self) -> Dict:
+        return {
+            'total_value': 0.0,
+            'pnl': {'realized': 0.0, 'unrealized': 0.0, 'total': 0.0},
+            'performance': {'total_trades': 0, 'win_rate': 0.0, 'avg_win': 0.0, 'avg_loss': 0.0,
+                            'profit_factor': None, 'realized_pnl': 0.0},
+            'positions': [],
+            'risk_metrics': {},
+            'suggestions': {}
+        }
+    
+    def _format_trade(self, trade: Trade) -> Dict:
+        return {
+            'symbol': trade.symbol,
+            'side': trade.side,
+            'quantity': trade.quantity,
+            'entry_price': trade.entry_price,
+            'exit_price': trade.exit_price,
+            'pnl': trade.pnl,
+            'duration': trade.exit_time - trade.entry_time
+        }
     
     def _calculate_trade_pnl(self, position: Position, exit_price: float) -> float:
         """Calculate PnL for a trade"""
@@ -95,10 +282,10 @@ class PortfolioManager:
         else:
             return (position.entry_price - exit_price) * position.quantity
     
-    async def _generate_portfolio_suggestions(self, positions: List[Position]) -> Dict:
+    async def _generate_portfolio_suggestions(self, positions: List[PortfolioExposure]) -> Dict:
         """Generate portfolio optimization suggestions"""
         return {
             'rebalancing': self._get_rebalancing_suggestions(positions),
             'risk_management': self.risk_manager.get_risk_suggestions(positions),
             'diversification': self._get_diversification_suggestions(positions)
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,145 @@
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+import asyncio
+import logging
+import time
+from market_data import ExchangeMarketDataSource
+from request_scheduler import USER, shared_scheduler
+
+logger = logging.getLogger(__name__)
+
+class PriceCache:
+    """Shared ticker cache for price lookups and payment quotes.
+
+    `fetch_tickers(symbols) -> {symbol: ticker}` is a bulk call, a blocking
+    one runs in a thread. Tickers younger than `ttl` seconds are served as is.
+    Until `ttl + stale_ttl` they are still served but refreshed in the
+    background, older ones are waited for. Symbols missed in the same
+    event loop iteration share a single bulk fetch, and a symbol that is
+    already being fetched is never fetched twice. A ticker without a last
+    price counts as missing.
+    """
+
+    def __init__(self, fetch_tickers: Callable[[List[str]], Union[Dict[str, Dict], Awaitable[Dict[str, Dict]]]], ttl: float = 5,
+                 stale_ttl: float = 30):
+        self.fetch_tickers = fetch_tickers
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._tickers: Dict[str, Tuple[Dict, float]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._pending: List[str] = []
+        self._tasks = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.fetches = 0
+
+    @classmethod
+    def from_source(cls, data_source, ttl: float = 5, stale_ttl: float = 30) -> 'PriceCache':
+        """Cache in front of a MarketDataSource"""
+        return cls(data_source.fetch_tickers_async, ttl, stale_ttl)
+
+    async def get(self, symbol: str) -> Dict:
+        """Ticker of a symbol"""
+        return (await self.get_many([symbol]))[symbol]
+
+    async def get_price(self, symbol: str) -> float:
+        return float((await self.get(symbol))['last'])
+
+    async def get_many(self, symbols: Iterable[str]) -> Dict[str, Dict]:
+        """Tickers of several symbols, everything missing comes from one bulk fetch"""
+        now = time.monotonic()
+        tickers = {}
+        waiting = {}
+        for symbol in dict.fromkeys(symbols):
+            cached = self._tickers.get(symbol)
+            age = now - cached[1] if cached else None
+            if age is not None and age < self.ttl:
+                self.hits += 1
+                tickers[symbol] = cached[0]
+            elif age is not None and age < self.ttl + self.stale_ttl:
+                # Stale while revalidate
+                self.stale_hits += 1
+                tickers[symbol] = cached[0]
+                self._request(symbol)
+            else:
+                if symbol in self._inflight:
+                    self.coalesced += 1
+                else:
+                    self.misses += 1
+                waiting[symbol] = self._request(symbol)
+
+        for symbol, future in waiting.items():
+            tickers[symbol] = await asyncio.shield(future)
+        return tickers
+
+    async def refresh(self, symbols: Iterable[str]) -> Dict[str, Dict]:
+        """Fetch fresh tickers of all the symbols in one call"""
+        futures = {symbol: self._request(symbol) for symbol in dict.fromkeys(symbols)}
+        return {symbol: await asyncio.shield(future) for symbol, future in futures.items()}
+
+    def _request(self, symbol: str) -> asyncio.Future:
+        """Future of the symbol's next ticker, joining a fetch that is already under way"""
+        future = self._inflight.get(symbol)
+        if future is not None:
+            return future
+
+        loop = asyncio.get_running_loop()
+        future = self._inflight[symbol] = loop.create_future()
+        # Swallow the error of a background refresh nobody awaits
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        if not self._pending:
+            loop.call_soon(self._start_fetch)
+        self._pending.append(symbol)
+        return future
+
+    def _start_fetch(self):
+        task = asyncio.ensure_future(self._fetch())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self):
+        symbols, self._pending = self._pending, []
+        self.fetches += 1
+        try:
+            if asyncio.iscoroutinefunction(self.fetch_tickers):
+                tickers = await self.fetch_tickers(symbols)
+            else:
+                tickers = await asyncio.to_thread(self.fetch_tickers, symbols)
+        except Exception as e:
+            logger.error(f"Error fetching tickers for {symbols}: {str(e)}")
+            tickers, error = {}, e
+        else:
+            error = None
+
+        fetched_at = time.monotonic()
+        for symbol in symbols:
+            future = self._inflight.pop(symbol)
+            ticker = tickers.get(symbol)
+            if ticker is not None and ticker.get('last') is not None:
+                self._tickers[symbol] = (ticker, fetched_at)
+                future.set_result(ticker)
+            else:
+                future.set_exception(error or KeyError(f"No ticker for {symbol}"))
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.stale_hits + self.misses + self.coalesced
+        return {
+            'size': len(self._tickers),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'fetches': self.fetches,
+            'hit_rate': (self.hits + self.stale_hits) / lookups if lookups else 0.0
+        }
+
+_shared: Optional[PriceCache] = None
+
+def shared_price_cache(config) -> PriceCache:
+    """The process-wide exchange ticker cache of /price and payment quotes"""
+    global _shared
+    if _shared is None:
+        source = ExchangeMarketDataSource.from_config(config, shared_scheduler(config), USER)
+        _shared = PriceCache.from_source(source, config.PRICE_CACHE_TTL, config.PRICE_CACHE_STALE_TTL)
+    return _shared
@@ -0,0 +1,310 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from collections import deque
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+import ccxt
+
+logger = logging.getLogger(__name__)
+
+# Lower goes first
+USER = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {USER: 'user', BACKGROUND: 'background'}
+
+def _tickers_weight(symbols=None, *args, **kwargs) -> int:
+    count = len(symbols) if symbols else None
+    if count is None or count > 100:
+        return 80
+    return 2 if count <= 20 else 40
+
+# Binance spot request weights of the calls we make
+ENDPOINT_WEIGHTS = {
+    'fetch_ticker': 2,
+    'fetch_tickers': _tickers_weight,
+    'fetch_ohlcv': 2,
+    'create_order': 1,
+    'ticker_price_all': 4
+}
+
+def endpoint_weight(endpoint: str, *args, **kwargs) -> int:
+    weight = ENDPOINT_WEIGHTS.get(endpoint, 1)
+    return weight(*args, **kwargs) if callable(weight) else weight
+
+def is_rate_limited(error: Exception) -> bool:
+    """Whether an exchange error is a 429 (or a 418 IP ban)"""
+    if isinstance(error, (ccxt.RateLimitExceeded, ccxt.DDoSProtection)):
+        return True
+    return getattr(error, 'status_code', None) in (418, 429) or getattr(error, 'status', None) in (418, 429)
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """Up to `capacity` tokens, refilled continuously at `rate` tokens a second"""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, tokens: float, now: float) -> float:
+        """Seconds until `tokens` are available"""
+        self._refill(now)
+        return max(0.0, (min(tokens, self.capacity) - self.tokens) / self.rate)
+
+    def take(self, tokens: float):
+        self.tokens -= tokens
+
+    def limit(self, available: float, now: float):
+        """Never hold more than `available` tokens right now"""
+        self._refill(now)
+        self.tokens = min(self.tokens, available)
+
+class RequestScheduler:
+    """Central gate of every exchange request.
+
+    A request costs one token of the per-second request bucket and its
+    endpoint weight from the weight bucket. The exchange counts weight per
+    fixed minute, so the weight bucket holds only a `burst` share of the
+    limit and refills the rest over the minute: burst and refill together
+    never exceed `weight_limit` in any minute. Waiting requests are
+    served in priority order (USER before BACKGROUND), FIFO within a
+    priority. A 429 pauses everything for a jittered, growing backoff (or
+    the Retry-After the exchange sent) and the request is retried up to
+    `retry_attempts` times.
+
+    `submit` is the async entry point. `call` is for blocking code: from a
+    worker thread it queues on the event loop the scheduler is attached
+    to, so `attach` it at startup. Without any running loop it waits for
+    tokens in place, outside of the priority queue. Calling it from a
+    thread running an event loop is an error, waiting there would freeze
+    the loop.
+    """
+
+    def __init__(self, rate_limit: float = 100, weight_limit: float = 6000, retry_attempts: int = 3,
+                 timeout: float = 30, backoff_base: float = 1, backoff_max: float = 60, burst: float = 0.1):
+        self.requests = TokenBucket(rate_limit, rate_limit)
+        self.weight_limit = weight_limit
+        self.weight = TokenBucket(burst * weight_limit, (1 - burst) * weight_limit / 60)
+        self.retry_attempts = retry_attempts
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._lock = threading.Lock()
+        self._queue: List[Tuple[int, int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._cooldown_until = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        self.metrics = {
+            'requests': 0,
+            'weight': 0,
+            'retries': 0,
+            'rate_limited': 0,
+            'timeouts': 0,
+            'errors': 0,
+            'max_queue_depth': 0
+        }
+        self._waits = {priority: deque(maxlen=1000) for priority in PRIORITY_NAMES}
+
+    @classmethod
+    def from_config(cls, config) -> 'RequestScheduler':
+        return cls(
+            rate_limit=config.EXCHANGE_RATE_LIMIT,
+            weight_limit=config.EXCHANGE_WEIGHT_LIMIT,
+            retry_attempts=config.EXCHANGE_RETRY_ATTEMPTS,
+            timeout=config.EXCHANGE_TIMEOUT
+        )
+
+    def _reserve(self, weight: int) -> float:
+        """Take the tokens of a request if they are there, otherwise how long to wait"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self._cooldown_until - now, self.requests.wait_time(1, now), self.weight.wait_time(weight, now))
+            if wait <= 0:
+                self.requests.take(1)
+                self.weight.take(weight)
+            return wait
+
+    def attach(self, loop: asyncio.AbstractEventLoop = None):
+        """Queue the `call`s of worker threads on `loop`, the running one by default"""
+        loop = loop or asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._dispatcher = None
+
+    def _ensure_dispatcher(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._dispatcher is None or self._dispatcher.done():
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._dispatcher = loop.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        """Let the head of the queue through as soon as its tokens are there"""
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            priority, _, weight, ready = self._queue[0]
+            if ready.done():
+                # Its caller went away
+                heapq.heappop(self._queue)
+                continue
+            wait = self._reserve(weight)
+            if wait > 0:
+                # A more urgent request arriving meanwhile is looked at right away
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._queue)
+            ready.set_result(None)
+
+    async def _acquire(self, weight: int, priority: int):
+        self._ensure_dispatcher()
+        ready = self._loop.create_future()
+        heapq.heappush(self._queue, (priority, next(self._sequence), weight, ready))
+        self.metrics['max_queue_depth'] = max(self.metrics['max_queue_depth'], len(self._queue))
+        self._wakeup.set()
+
+        started = time.monotonic()
+        await ready
+        self._waits[priority].append(time.monotonic() - started)
+
+    async def submit(self, fn: Callable, *args, endpoint: str = None, weight: int = None,
+                     priority: int = BACKGROUND, **kwargs):
+        """Run `fn(*args, **kwargs)` once the quota allows, blocking functions run in a thread"""
+        weight = weight if weight is not None else endpoint_weight(endpoint or fn.__name__, *args, **kwargs)
+
+        for attempt in range(self.retry_attempts + 1):
+            await self._acquire(weight, priority)
+            self.metrics['requests'] += 1
+            self.metrics['weight'] += weight
+            try:
+                if asyncio.iscoroutinefunction(fn):
+                    return await asyncio.wait_for(fn(*args, **kwargs), self.timeout)
+                return await asyncio.wait_for(asyncio.to_thread(fn, *args, **kwargs), self.timeout)
+            except asyncio.TimeoutError:
+                self.metrics['timeouts'] += 1
+                raise
+            except Exception as e:
+                if not is_rate_limited(e) or attempt == self.retry_attempts:
+                    self.metrics['errors'] += 1
+                    raise
+                self._back_off(e, attempt)
+                self.metrics['retries'] += 1
+
+    def call(self, fn: Callable, *args, endpoint: str = None, weight: int = None,
+             priority: int = BACKGROUND, **kwargs):
+        """Blocking version of `submit`, for worker threads and code without an event loop"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError(
+                f"RequestScheduler.call({endpoint or fn.__name__}) on an event loop thread would block it, "
+                f"await submit() instead"
+            )
+
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            return asyncio.run_coroutine_threadsafe(
+                self.submit(fn, *args, endpoint=endpoint, weight=weight, priority=priority, **kwargs),
+                loop
+            ).result()
+
+        weight = weight if weight is not None else endpoint_weight(endpoint or fn.__name__, *args, **kwargs)
+        for attempt in range(self.retry_attempts + 1):
+            started = time.monotonic()
+            while True:
+                wait = self._reserve(weight)
+                if wait <= 0:
+                    break
+                time.sleep(wait)
+            self._waits[priority].append(time.monotonic() - started)
+            self.metrics['requests'] += 1
+            self.metrics['weight'] += weight
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if not is_rate_limited(e) or attempt == self.retry_attempts:
+                    self.metrics['errors'] += 1
+                    raise
+                self._back_off(e, attempt)
+                self.metrics['retries'] += 1
+
+    def _back_off(self, error: Exception, attempt: int):
+        """Pause every request after a 429"""
+        self.metrics['rate_limited'] += 1
+        delay = _retry_after(error)
+        if delay is None:
+            delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1)
+        with self._lock:
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+        logger.warning(f"Rate limited by the exchange, pausing requests for {delay:.1f}s")
+
+    def sync_used_weight(self, used: float):
+        """Feed back the used weight the exchange reports (X-MBX-USED-WEIGHT-1M)"""
+        with self._lock:
+            self.weight.limit(self.weight_limit - used, time.monotonic())
+
+    def stats(self) -> Dict:
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, _, ready in self._queue:
+            if not ready.done():
+                depth[PRIORITY_NAMES[priority]] += 1
+
+        waits = {}
+        for priority, samples in self._waits.items():
+            ordered = sorted(samples)
+            waits[PRIORITY_NAMES[priority]] = {
+                'count': len(ordered),
+                'avg_ms': sum(ordered) / len(ordered) * 1000 if ordered else 0.0,
+                'p95_ms': ordered[int(len(ordered) * 0.95)] * 1000 if ordered else 0.0,
+                'max_ms': ordered[-1] * 1000 if ordered else 0.0
+            }
+
+        with self._lock:
+            now = time.monotonic()
+            self.weight._refill(now)
+            available = self.weight.tokens
+        return {
+            **self.metrics,
+            'queue_depth': depth,
+            'wait': waits,
+            'weight_available': available,
+            'cooling_down': max(0.0, self._cooldown_until - now)
+        }
+
+_shared: Optional[RequestScheduler] = None
+
+def shared_scheduler(config) -> RequestScheduler:
+    """The process-wide scheduler every exchange client should go through"""
+    global _shared
+    if _shared is None:
+        _shared = RequestScheduler.from_config(config)
+    return _shared
@@ -0,0 +1,99 @@
+from typing import Dict, List
+import numpy as np
+from datetime import datetime
+
+class SignalBatch:
+    """Signal analysis of a pairs x timeframes grid held as NumPy arrays.
+
+    Every array has shape (len(timeframes), len(pairs)). Dicts are only built
+    by `materialize`, for the cells that actually get displayed.
+    """
+
+    def __init__(self, pairs: List[str], timeframes: List[str], logos: List[str],
+                 signal_names: np.ndarray, arrays: Dict[str, np.ndarray]):
+        self.pairs = pairs
+        self.timeframes = timeframes
+        self.logos = logos
+        self.signal_names = signal_names
+        self.arrays = arrays
+        self.timestamp = datetime.utcnow()
+        self._pair_index = {pair: i for i, pair in enumerate(pairs)}
+        self._timeframe_index = {timeframe: i for i, timeframe in enumerate(timeframes)}
+
+    def __contains__(self, cell) -> bool:
+        pair, timeframe = cell
+        return pair in self._pair_index and timeframe in self._timeframe_index
+
+    def materialize(self, pair: str, timeframe: str) -> Dict:
+        """Build the analysis dict SignalDisplay expects for one cell"""
+        t = self._timeframe_index[timeframe]
+        n = self._pair_index[pair]
+        a = {name: float(values[t, n]) for name, values in self.arrays.items() if name != 'signal'}
+
+        return {
+            'pair': pair,
+            'logo': self.logos[n],
+            'price': a['price'],
+            'signal': str(self.signal_names[self.arrays['signal'][t, n]]),
+            'change': a['change'],
+            'volume': a['volume'],
+            'timestamp': self.timestamp,
+            'indicators': {
+                'rsi': a['rsi'],
+                'macd': a['macd'],
+                'ema_9': a['ema_9'],
+                'ema_21': a['ema_21']
+            },
+            'entry_points': {
+                'conservative': a['conservative'],
+                'aggressive': a['aggressive']
+            },
+            'targets': {
+                'tp1': a['tp1'],
+                'tp2': a['tp2'],
+                'sl': a['sl']
+            },
+            'confidence': a['confidence']
+        }
+
+class BatchSignalEngine:
+    """Computes the whole pairs x timeframes signal grid in one vectorized pass"""
+
+    def __init__(self, generator, seed: int = None):
+        self.generator = generator
+        self.rng = np.random.default_rng(seed)
+
+    async def compute(self, pairs: List[str], timeframes: List[str]) -> SignalBatch:
+        """Analyze every pair on every timeframe at once"""
+        shape = (len(timeframes), len(pairs))
+        rng = self.rng
+
+        # One bulk ticker call, the price is the same on every timeframe
+        tickers = await self.generator.data_source.fetch_tickers_async(pairs)
+        last = np.array([tickers[pair]['last'] for pair in pairs], dtype=np.float64)
+        change = np.array([tickers[pair]['percentage'] for pair in pairs], dtype=np.float64)
+        volume = np.array([tickers[pair]['quoteVolume'] for pair in pairs], dtype=np.float64)
+        price = np.broadcast_to(last, shape)
+
+        signal_names = np.array([name for name, _ in self.generator.signal_types])
+        weights = np.array([weight for _, weight in self.generator.signal_types])
+
+        arrays = {
+            'price': price,
+            'signal': rng.choice(len(signal_names), size=shape, p=weights / weights.sum()),
+            'change': np.broadcast_to(np.round(change, 2), shape),
+            'volume': np.broadcast_to(np.round(volume, 2), shape),
+            'rsi': np.round(rng.uniform(0, 100, shape), 2),
+            'macd': np.round(rng.uniform(-2, 2, shape), 3),
+            'ema_9': np.round(rng.uniform(90, 110, shape), 2),
+            'ema_21': np.round(rng.uniform(90, 110, shape), 2),
+            'conservative': np.round(price * 0.99, 2),
+            'aggressive': np.round(price * 1.01, 2),
+            'tp1': np.round(price * 1.05, 2),
+            'tp2': np.round(price * 1.10, 2),
+            'sl': np.round(price * 0.95, 2),
+            'confidence': np.round(rng.uniform(50, 100, shape), 2)
+        }
+
+        logos = [self.generator.crypto_logos.get(pair.split('/')[0], '') for pair in pairs]
+        return SignalBatch(list(pairs), list(timeframes), logos, signal_names, arrays)
@@ -1,11 +1,19 @@
-from typing import Dict, List
+from typing import Dict, List, Tuple
 import pandas as pd
 import numpy as np
 from datetime import datetime
 import random
+import asyncio
+import logging
+from signal_snapshot import SignalSnapshotStore
+from signal_batch import BatchSignalEngine
+from market_data import MarketDataSource, create_market_data_source
+from request_scheduler import USER
+
+logger = logging.getLogger(__name__)
 
 class EnhancedSignalGenerator:
-    def __init__(self, config):
+    def __init__(self, config, data_source: MarketDataSource = None):
         self.config = config
         self.timeframes = {
             '1m': '1 minute',
@@ -34,6 +42,36 @@ class EnhancedSignalGenerator:
             'MATIC': 'MATIC',
             'DOT': 'DOT'
         }
+        
+        self.base_prices = {
+            'BTC/USDT': 88000,
+            'ETH/USDT': 4900,
+            'BNB/USDT': 430,
+            'SOL/USDT': 190,
+            'DOGE/USDT': 0.12,
+            'SHIB/USDT': 0.00005,
+            'XRP/USDT': 1.2,
+            'ADA/USDT': 2.1,
+            'MATIC/USDT': 3.4,
+            'DOT/USDT': 45
+        }
+        
+        # Signal types with their probabilities
+        self.signal_types = [
+            ('STRONG BUY', 0.15),
+            ('BUY', 0.25),
+            ('NEUTRAL', 0.20),
+            ('SELL', 0.25),
+            ('STRONG SELL', 0.15)
+        ]
+        
+        # Signals are served to users, their exchange calls go ahead of background jobs
+        self.data_source = data_source or create_market_data_source(config, self.base_prices, USER)
+        self.random = random.Random(config.MARKET_DATA_SEED)
+        self.batch_engine = BatchSignalEngine(self, config.MARKET_DATA_SEED)
+        
+        # Signals are computed once per market tick and shared by all users
+        self.snapshot_store = SignalSnapshotStore(self, config.SIGNAL_TICK_SECONDS)
     
     async def generate_signals(self, user_is_premium: bool, requested_timeframe: str = None) -> Dict:
         """Generate signals based on user subscription status"""
@@ -43,104 +81,126 @@ class EnhancedSignalGenerator:
             timeframes = [requested_timeframe] if requested_timeframe else list(self.timeframes.keys())
         else:
             # Free users get 3 random timeframes
-            timeframes = random.sample(list(self.timeframes.keys()), 3)
+            timeframes = self.random.sample(list(self.timeframes.keys()), 3)
+        
+        snapshot = await self.snapshot_store.get_snapshot()
         
         signals = {
             'timestamp': datetime.utcnow(),
             'timeframes': {},
-            'user_type': 'Premium' if user_is_premium else 'Free'
+            'user_type': 'Premium' if user_is_premium else 'Free',
+            'snapshot_version': snapshot.version
         }
         
         for timeframe in timeframes:
-            signals['timeframes'][timeframe] = await self._generate_timeframe_signals(
+            signals['timeframes'][timeframe] = self._generate_timeframe_signals(
+                snapshot,
                 timeframe,
                 user_is_premium
             )
         
         return signals
     
-    async def _generate_timeframe_signals(self, timeframe: str, is_premium: bool) -> Dict:
-        """Generate signals for a specific timeframe"""
-        signals = {
+    def _generate_timeframe_signals(self, snapshot, timeframe: str, is_premium: bool) -> Dict:
+        """Project the snapshot signals for a specific timeframe"""
+        # Number of coins to show (all for premium, 5 for free)
+        coins = self.config.SUPPORTED_COINS if is_premium else self.config.SUPPORTED_COINS[:5]
+        missing = snapshot.timed_out | snapshot.failed
+        
+        return {
             'interval': self.timeframes[timeframe],
-            'signals': []
+            'signals': snapshot.project(coins, timeframe, is_premium),
+            'incomplete': [coin for coin in coins if (coin, timeframe) in missing]
         }
+    
+    async def _analyze_grid(self, timeframes: List[str], coins: List[str]) -> Tuple[Dict, List, List]:
+        """Analyze every (coin, timeframe) cell of the grid.
         
-        # Number of coins to analyze (all for premium, 5 for free)
-        coins = self.config.SUPPORTED_COINS if is_premium else self.config.SUPPORTED_COINS[:5]
+        Returns the analyses keyed by (coin, timeframe), the cells that
+        timed out in concurrent mode and the cells whose analysis failed.
+        Both are left out of the results, the other cells still make it.
+        """
+        cells = [(coin, timeframe) for timeframe in timeframes for coin in coins]
         
-        for coin in coins:
-            symbol = coin.split('/')[0]  # Extract symbol from pair
-            signal = await self._analyze_coin(coin, timeframe, is_premium)
-            signal['logo'] = self.crypto_logos.get(symbol, '')  # Add crypto logo
-            signals['signals'].append(signal)
+        if self.config.SIGNAL_EXECUTION_MODE != 'concurrent':
+            analyses = []
+            for coin, timeframe in cells:
+                try:
+                    analyses.append(await self._analyze_coin(coin, timeframe))
+                except Exception as e:
+                    analyses.append(e)
+        else:
+            semaphore = asyncio.Semaphore(self.config.SIGNAL_CONCURRENCY)
+            
+            async def analyze_cell(coin: str, timeframe: str):
+                async with semaphore:
+                    try:
+                        return await asyncio.wait_for(
+                            self._analyze_coin(coin, timeframe),
+                            timeout=self.config.SIGNAL_TASK_TIMEOUT
+                        )
+                    except asyncio.TimeoutError:
+                        return None
+            
+            analyses = await asyncio.gather(
+                *(analyze_cell(coin, timeframe) for coin, timeframe in cells),
+                return_exceptions=True
+            )
         
-        return signals
+        results = {}
+        timed_out = []
+        failed = []
+        for cell, analysis in zip(cells, analyses):
+            if analysis is None:
+                timed_out.append(cell)
+            elif isinstance(analysis, Exception):
+                failed.append(cell)
+                logger.error(f"Error analyzing {cell[0]} {cell[1]}: {str(analysis)}")
+            else:
+                results[cell] = analysis
+        return results, timed_out, failed
 
-    async def _analyze_coin(self, coin: str, timeframe: str, is_premium: bool) -> Dict:
-        """Analyze a specific coin"""
+    async def _analyze_coin(self, coin: str, timeframe: str) -> Dict:
+        """Analyze a specific coin, including the premium block"""
+        symbol = coin.split('/')[0]  # Extract symbol from pair
+        
+        ticker = await self.data_source.fetch_ticker_async(coin)
+        
         # Simulate different analysis based on timeframe
         analysis = {
             'pair': coin,
-            'price': self._generate_mock_price(coin),
+            'logo': self.crypto_logos.get(symbol, ''),
+            'price': ticker['last'],
             'signal': self._generate_signal_type(),
-            'change': round(random.uniform(-5, 5), 2),
-            'volume': round(random.uniform(1000000, 100000000), 2),
+            'change': round(ticker['percentage'], 2),
+            'volume': round(ticker['quoteVolume'], 2),
             'timestamp': datetime.utcnow()
         }
         
-        if is_premium:
-            analysis.update({
-                'indicators': {
-                    'rsi': round(random.uniform(0, 100), 2),
-                    'macd': round(random.uniform(-2, 2), 3),
-                    'ema_9': round(random.uniform(90, 110), 2),
-                    'ema_21': round(random.uniform(90, 110), 2)
-                },
-                'entry_points': {
-                    'conservative': round(analysis['price'] * 0.99, 2),
-                    'aggressive': round(analysis['price'] * 1.01, 2)
-                },
-                'targets': {
-                    'tp1': round(analysis['price'] * 1.05, 2),
-                    'tp2': round(analysis['price'] * 1.10, 2),
-                    'sl': round(analysis['price'] * 0.95, 2)
-                },
-                'confidence': round(random.uniform(50, 100), 2)
-            })
+        analysis.update({
+            'indicators': {
+                'rsi': round(self.random.uniform(0, 100), 2),
+                'macd': round(self.random.uniform(-2, 2), 3),
+                'ema_9': round(self.random.uniform(90, 110), 2),
+                'ema_21': round(self.random.uniform(90, 110), 2)
+            },
+            'entry_points': {
+                'conservative': round(analysis['price'] * 0.99, 2),
+                'aggressive': round(analysis['price'] * 1.01, 2)
+            },
+            'targets': {
+                'tp1': round(analysis['price'] * 1.05, 2),
+                'tp2': round(analysis['price'] * 1.10, 2),
+                'sl': round(analysis['price'] * 0.95, 2)
+            },
+            'confidence': round(self.random.uniform(50, 100), 2)
+        })
         
         return analysis
 
-    def _generate_mock_price(self, coin: str) -> float:
-        """Generate realistic mock prices based on the coin"""
-        base_prices = {
-            'BTC/USDT': 88000,
-            'ETH/USDT': 4900,
-            'BNB/USDT': 430,
-            'SOL/USDT': 190,
-            'DOGE/USDT': 0.12,
-            'SHIB/USDT': 0.00005,
-            'XRP/USDT': 1.2,
-            'ADA/USDT': 2.1,
-            'MATIC/USDT': 3.4,
-            'DOT/USDT': 45
-        }
-        
-        base = base_prices.get(coin, 100)
-        variation = random.uniform(-0.02, 0.02)  # 2% variation
-        return round(base * (1 + variation), 8)
-
     def _generate_signal_type(self) -> str:
         """Generate signal type with probabilities"""
-        signals = [
-            ('STRONG BUY', 0.15),
-            ('BUY', 0.25),
-            ('NEUTRAL', 0.20),
-            ('SELL', 0.25),
-            ('STRONG SELL', 0.15)
-        ]
-        
-        return random.choices(
-            population=[s[0] for s in signals],
-            weights=[s[1] for s in signals]
+        return self.random.choices(
+            population=[s[0] for s in self.signal_types],
+            weights=[s[1] for s in self.signal_types]
         )[0]
\ No newline at end of file
@@ -0,0 +1,91 @@
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+import asyncio
+import time
+
+# Fields only premium users get to see
+PREMIUM_FIELDS = ('indicators', 'entry_points', 'targets', 'confidence')
+
+class SignalSnapshot:
+    """Analysis of every (pair, timeframe) taken at a single market tick"""
+
+    def __init__(self, version: int, tick: int, entries: Dict[Tuple[str, str], Dict] = None,
+                 timed_out: List[Tuple[str, str]] = None, failed: List[Tuple[str, str]] = None, batch=None):
+        self.version = version
+        self.tick = tick
+        self.entries = entries if entries is not None else {}
+        self.batch = batch
+        self.timed_out = set(timed_out or [])
+        self.failed = set(failed or [])
+        self.created_at = datetime.utcnow()
+
+    def get(self, pair: str, timeframe: str) -> Optional[Dict]:
+        """Get the full (premium) analysis for a pair on a timeframe"""
+        entry = self.entries.get((pair, timeframe))
+        if entry is None and self.batch is not None and (pair, timeframe) in self.batch:
+            # Batch snapshots only build the dicts somebody asks for
+            entry = self.entries[(pair, timeframe)] = self.batch.materialize(pair, timeframe)
+        return entry
+
+    def project(self, pairs: List[str], timeframe: str, is_premium: bool) -> List[Dict]:
+        """Read-only view of the snapshot for one timeframe.
+
+        Premium users share the stored analysis dicts, free users get copies
+        stripped of the premium block. Callers must not mutate the result.
+        """
+        signals = []
+        for pair in pairs:
+            entry = self.get(pair, timeframe)
+            if entry is None:
+                continue
+            if is_premium:
+                signals.append(entry)
+            else:
+                signals.append({k: v for k, v in entry.items() if k not in PREMIUM_FIELDS})
+        return signals
+
+class SignalSnapshotStore:
+    """Versioned signal snapshots, recomputed at most once per market tick"""
+
+    def __init__(self, generator, tick_seconds: float = 60):
+        self.generator = generator
+        self.tick_seconds = tick_seconds
+        self.version = 0
+        self._snapshot: Optional[SignalSnapshot] = None
+        self._lock = asyncio.Lock()
+
+    def current_tick(self) -> int:
+        """Index of the market tick we are currently in"""
+        return int(time.time() // self.tick_seconds)
+
+    def is_stale(self, tick: int) -> bool:
+        return self._snapshot is None or self._snapshot.tick != tick
+
+    async def get_snapshot(self) -> SignalSnapshot:
+        """Return the snapshot for the current tick, refreshing it if needed"""
+        tick = self.current_tick()
+        if self.is_stale(tick):
+            async with self._lock:
+                # Another request may have refreshed while we were waiting
+                if self.is_stale(tick):
+                    await self.refresh(tick)
+        return self._snapshot
+
+    async def refresh(self, tick: int = None) -> SignalSnapshot:
+        """Recompute the analysis of every supported pair on every timeframe"""
+        if tick is None:
+            tick = self.current_tick()
+
+        timeframes = list(self.generator.timeframes)
+        coins = self.generator.config.SUPPORTED_COINS
+
+        if self.generator.config.SIGNAL_EXECUTION_MODE == 'batch':
+            batch = await self.generator.batch_engine.compute(coins, timeframes)
+            snapshot = SignalSnapshot(self.version + 1, tick, batch=batch)
+        else:
+            entries, timed_out, failed = await self.generator._analyze_grid(timeframes, coins)
+            snapshot = SignalSnapshot(self.version + 1, tick, entries, timed_out, failed)
+        # Only a snapshot that was actually built takes a version number
+        self.version = snapshot.version
+        self._snapshot = snapshot
+        return snapshot
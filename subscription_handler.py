@@ -4,14 +4,16 @@ from datetime import datetime, timedelta
 import json
 import logging
 from payment_handlers import PaymentProcessor
+from price_cache import PriceCache
+from database import User, upsert
 
 logger = logging.getLogger(__name__)
 
 class SubscriptionHandler:
-    def __init__(self, config, db_session):
+    def __init__(self, config, db, price_cache: PriceCache = None):
         self.config = config
-        self.db_session = db_session
-        self.payment_processor = PaymentProcessor(config)
+        self.db = db
+        self.payment_processor = PaymentProcessor(config, price_cache)
     
     async def handle_subscribe_command(self, update: Update, context: CallbackContext):
         """Handle the /subscribe command"""
@@ -179,24 +181,42 @@ class SubscriptionHandler:
         })
         
         if payment_verified:
-            # Update user subscription
-            user = self.db_session.query(User).filter_by(
-                telegram_id=update.effective_user.id
-            ).first()
-            
             duration_days = {
                 'monthly': 30,
                 'quarterly': 90,
                 'annual': 365
             }[plan]
             
-            user.is_premium = True
-            user.subscription_end = datetime.utcnow() + timedelta(days=duration_days)
-            self.db_session.commit()
+            subscription_end = datetime.utcnow() + timedelta(days=duration_days)
+            
+            # Activate in one statement, creating the user if they never got a row
+            try:
+                async with self.db.session() as session:
+                    await session.execute(
+                        upsert(session, User)
+                        .values(
+                            telegram_id=update.effective_user.id,
+                            username=update.effective_user.username,
+                            is_premium=True,
+                            subscription_end=subscription_end
+                        )
+                        .on_conflict_do_update(
+                            index_elements=['telegram_id'],
+                            set_={'is_premium': True, 'subscription_end': subscription_end}
+                        )
+                    )
+                    await session.commit()
+            except Exception as e:
+                logger.error(f"Error activating the {plan} subscription of {update.effective_user.id}: {str(e)}")
+                await query.edit_message_text(
+                    "⚠️ Your payment was verified, but activating your subscription failed. "
+                    "Please contact support with your transaction details, we'll activate it manually."
+                )
+                return
             
             await query.edit_message_text(
                 "✅ Payment verified! Your premium subscription is now active.\n\n"
-                f"Subscription end date: {user.subscription_end.strftime('%Y-%m-%d')}\n\n"
+                f"Subscription end date: {subscription_end.strftime('%Y-%m-%d')}\n\n"
                 "Enjoy your premium features! Use /help to see all available commands."
             )
         else:
@@ -1,28 +1,352 @@
 import asyncio
 import logging
-from datetime import datetime, timedelta
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List
 import aioschedule
-from signal_generator import AdvancedSignalGenerator
-from database import User, Alert, Position
+from advanced_signals import AdvancedSignalGenerator, fit_signal_model, publish_model_files
+from market_stream import MarketStream, StreamingMarketDataSource
+from signal_generator import EnhancedSignalGenerator
+from alert_index import AlertIndex
+from alert_monitor import AlertMonitor
+from timing_wheel import TimingWheel
+from valuation import PositionBook
+from request_scheduler import shared_scheduler
+from sqlalchemy import select, update
+from database import Database, User, Alert
+
+# Subscriptions ending this far ahead are put on the timing wheel, the hourly sweep refills it
+EXPIRY_HORIZON = timedelta(hours=2)
+
+def _epoch(moment: datetime) -> float:
+    """Naive UTC datetime (as stored) -> epoch seconds"""
+    return moment.replace(tzinfo=timezone.utc).timestamp()
 
 class TaskManager:
-    def __init__(self, bot, config, db_session):
+    def __init__(self, bot, config, db: Database):
         self.bot = bot
         self.config = config
-        self.db_session = db_session
+        self.db = db
         self.signal_generator = AdvancedSignalGenerator(config)
+        # Grid signals shown to every user, one snapshot per market tick
+        self.signals = EnhancedSignalGenerator(config)
+        self.signal_refresh = None
         self.logger = logging.getLogger(__name__)
+        # Model fitting is CPU-bound, keep it off the event loop
+        self.training_pool = ProcessPoolExecutor(max_workers=config.MODEL_TRAINING_PROCESSES)
+        self.training_metrics = {}
+        self.data_source = self.signal_generator.data_source
+        # Thresholds of the pending alerts, kept in step with what the database's sessions commit
+        self.alert_index = AlertIndex()
+        self.alert_monitor = AlertMonitor(self.alert_index, queue_size=config.ALERT_QUEUE_SIZE)
+        # Premium users to downgrade the second their subscription ends
+        self.expiry_wheel = TimingWheel()
+        # Every open position in columns, marked to market in one go
+        self.position_book = PositionBook()
+        self.portfolio_valuation = None
+        # Pushed trades, klines and tickers instead of polling, when a stream is configured
+        self.market_stream = MarketStream(
+            config.MARKET_STREAM_URL,
+            config.SUPPORTED_COINS,
+            gap_source=self.signal_generator.data_source,
+            queue_size=config.MARKET_STREAM_QUEUE_SIZE
+        ) if config.MARKET_STREAM_URL else None
     
     async def start_background_tasks(self):
         """Start all background tasks"""
-        aioschedule.every(1).minutes.do(self.check_alerts)
+        # Exchange calls of worker threads queue on this loop from the start
+        shared_scheduler(self.config).attach()
+        self.alert_index.bind(self.db.session_class)
+        self.position_book.bind(self.db.session_class)
+        async with self.db.session() as session:
+            await self.alert_index.load(session)
+            await self.position_book.load(session)
+        self.alert_task = asyncio.create_task(self.alert_monitor.dispatch(self._deliver_alerts))
+        await self.check_subscriptions()
+        self.expiry_task = asyncio.create_task(self.run_expiry_wheel())
+        
+        # With a stream alerts are evaluated on every tick instead
+        if self.market_stream is None:
+            aioschedule.every(1).minutes.do(self.check_alerts)
         aioschedule.every(5).minutes.do(self.update_signals)
+        aioschedule.every(self.config.PORTFOLIO_SWEEP_SECONDS).seconds.do(self.value_portfolios)
+        aioschedule.every(5).minutes.do(self.log_alert_latency)
+        aioschedule.every(5).minutes.do(self.log_database_pool)
         aioschedule.every(1).hours.do(self.check_subscriptions)
         aioschedule.every(4).hours.do(self.update_models)
         
+        if self.market_stream is not None:
+            self.start_market_stream()
+        
         while True:
             await aioschedule.run_pending()
             await asyncio.sleep(1)
     
-    async def check_alerts(
\ No newline at end of file
+    def start_market_stream(self):
+        """Fan the stream out to the ticker boards, the alert monitor, the signal snapshot and the candle store"""
+        self.data_source = StreamingMarketDataSource(self.signal_generator.data_source)
+        self.signals.data_source = StreamingMarketDataSource(self.signals.data_source)
+        tickers = self.market_stream.subscribe('tickers', types=('ticker', 'trade'))
+        alerts = self.market_stream.subscribe('alerts', types=('ticker', 'trade', 'kline'))
+        signals = self.market_stream.subscribe('signals', types=('ticker', 'trade', 'kline'))
+        candles = self.market_stream.subscribe('candles', types=('kline',))
+        self.stream_tasks = [
+            asyncio.create_task(self.data_source.consume(tickers)),
+            asyncio.create_task(self.alert_monitor.consume(alerts)),
+            asyncio.create_task(self._consume_signals(signals)),
+            asyncio.create_task(self._consume_candles(candles)),
+            asyncio.create_task(self.market_stream.run())
+        ]
+    
+    async def _consume_signals(self, queue: asyncio.Queue):
+        """Keep the signal tickers current and take the next snapshot as soon as a candle closes a new tick"""
+        source = self.signals.data_source
+        store = self.signals.snapshot_store
+        while True:
+            event = await queue.get()
+            if event['type'] != 'kline':
+                source.apply(event)
+            elif event['closed'] and store.is_stale(store.current_tick()):
+                if self.signal_refresh is None or self.signal_refresh.done():
+                    # In the background, tickers keep flowing in meanwhile
+                    self.signal_refresh = asyncio.create_task(self._refresh_signals())
+    
+    async def _refresh_signals(self):
+        try:
+            await self.signals.snapshot_store.get_snapshot()
+        except Exception as e:
+            self.logger.error(f"Error refreshing the signal snapshot: {str(e)}")
+    
+    async def _consume_candles(self, queue: asyncio.Queue):
+        feed = self.signal_generator.candle_feed
+        while True:
+            event = await queue.get()
+            if not event['closed'] or feed is None:
+                continue
+            candle = {name: event[name] for name in ('open', 'high', 'low', 'close', 'volume')}
+            candle['ts'] = event['timestamp']
+            try:
+                await asyncio.to_thread(self.signal_generator.ingest_candle, event['symbol'], candle)
+            except Exception as e:
+                self.logger.error(f"Error storing streamed candle of {event['symbol']}: {str(e)}")
+    
+    async def check_alerts(self):
+        """Poll the prices of the alerted pairs, when there is no stream to push them"""
+        pairs = self.alert_index.pairs()
+        if not pairs:
+            return
+        
+        received = time.monotonic()
+        tickers = await self.data_source.fetch_tickers_async(pairs)
+        missing = []
+        for pair in pairs:
+            ticker = tickers.get(pair)
+            if ticker is None or ticker.get('last') is None:
+                missing.append(pair)
+                continue
+            price = ticker['last']
+            await self.alert_monitor.evaluate(pair, price, price, received)
+        if missing:
+            # Delisted or mistyped pairs, their alerts wait until there is a price
+            self.logger.warning(f"No ticker for alerted pairs {', '.join(missing)}")
+    
+    async def _deliver_alerts(self, prices: Dict[int, float]) -> set:
+        """Notify the users of reached alerts and delete them, returns the ids done with.
+        
+        No session is held while the messages go out, the pool has a single
+        SQLite connection everybody else would wait on.
+        """
+        async with self.db.session() as session:
+            alerts = (await session.execute(
+                select(Alert.id, Alert.coin_pair, Alert.is_above, Alert.price_threshold, User.telegram_id)
+                .outerjoin(User, User.id == Alert.user_id)
+                .where(Alert.id.in_(list(prices)))
+            )).all()
+        
+        delivered = set()
+        for alert in alerts:
+            try:
+                await self._send_alert(alert, prices[alert.id])
+            except Exception as e:
+                self.logger.error(f"Error sending alert {alert.id}: {str(e)}")
+                continue
+            delivered.add(alert.id)
+        
+        if delivered:
+            async with self.db.session() as session:
+                for alert in (await session.scalars(select(Alert).where(Alert.id.in_(delivered)))).all():
+                    await session.delete(alert)
+                # Committing takes them out of the index too
+                await session.commit()
+        return delivered
+    
+    async def log_alert_latency(self):
+        metrics = self.alert_monitor.metrics()
+        notified = metrics['latency']['notified']
+        self.logger.info(
+            f"Alerts: {metrics['notified']} notified, {metrics['failed']} failed, {metrics['duplicates']} duplicates; "
+            f"tick to notification p50 {notified['p50_ms']:.0f}ms p95 {notified['p95_ms']:.0f}ms "
+            f"p99 {notified['p99_ms']:.0f}ms max {notified['max_ms']:.0f}ms"
+        )
+    
+    async def log_database_pool(self):
+        stats = self.db.stats()
+        self.logger.info(
+            f"Database: {stats['checkouts']} checkouts, {stats['checked_out']} checked out, "
+            f"wait avg {stats['wait']['avg_ms']:.1f}ms p95 {stats['wait']['p95_ms']:.1f}ms "
+            f"max {stats['wait']['max_ms']:.1f}ms; {stats['pool']}"
+        )
+    
+    async def _send_alert(self, alert, price: float):
+        if alert.telegram_id is None:
+            # Its user is gone, nobody to tell
+            return
+        direction = 'above' if alert.is_above else 'below'
+        await self.bot.send_message(
+            chat_id=alert.telegram_id,
+            text=f"🔔 {alert.coin_pair} is {direction} {alert.price_threshold:,.8g}: now ${price:,.8g}"
+        )
+    
+    async def update_signals(self):
+        """Refresh the premium signals of every supported coin"""
+        result = await self.signal_generator.generate_premium_signals(self.config.SUPPORTED_COINS)
+        self.logger.info(f"Updated signals for {len(result['signals'])} coins")
+    
+    async def check_subscriptions(self):
+        """Downgrade every lapsed user in one statement, put the ones ending soon on the wheel"""
+        now = datetime.utcnow()
+        async with self.db.session() as session:
+            result = await session.execute(
+                update(User)
+                .where(User.is_premium.is_(True), User.subscription_end <= now)
+                .values(is_premium=False)
+                .execution_options(synchronize_session=False)
+            )
+            ending = (await session.execute(
+                select(User.id, User.subscription_end).where(
+                    User.is_premium.is_(True),
+                    User.subscription_end > now,
+                    User.subscription_end <= now + EXPIRY_HORIZON
+                )
+            )).all()
+            await session.commit()
+        
+        for user_id, subscription_end in ending:
+            self.expiry_wheel.schedule(user_id, _epoch(subscription_end))
+        if result.rowcount:
+            self.logger.info(f"Downgraded {result.rowcount} expired subscriptions")
+    
+    async def run_expiry_wheel(self):
+        """Downgrade users as their subscription ends, from the timing wheel"""
+        while True:
+            await asyncio.sleep(self.expiry_wheel.tick)
+            expired = self.expiry_wheel.advance()
+            if not expired:
+                continue
+            try:
+                async with self.db.session() as session:
+                    # A renewal since the timer was set moved subscription_end, leave those alone
+                    await session.execute(
+                        update(User)
+                        .where(
+                            User.id.in_(expired),
+                            User.is_premium.is_(True),
+                            User.subscription_end <= datetime.utcnow()
+                        )
+                        .values(is_premium=False)
+                        .execution_options(synchronize_session=False)
+                    )
+                    await session.commit()
+            except Exception as e:
+                # The hourly sweep catches them
+                self.logger.error(f"Error expiring subscriptions: {str(e)}")
+    
+    async def value_portfolios(self):
+        """Mark every open position of every user to market against one price snapshot"""
+        book = self.position_book
+        if not len(book):
+            return
+        started = time.perf_counter()
+        tickers = await self.data_source.fetch_tickers_async(list(book.symbols))
+        last = {}
+        missing = []
+        for symbol in book.symbols:
+            ticker = tickers.get(symbol)
+            if ticker is None or ticker.get('last') is None:
+                missing.append(symbol)
+                continue
+            last[symbol] = ticker['last']
+        if missing:
+            # Their positions, and the totals of the portfolios holding them, come out NaN
+            self.logger.warning(f"No ticker for held symbols {', '.join(missing)}")
+        prices = book.price_vector(last)
+        self.portfolio_valuation = book.mark(prices)
+        self.logger.debug(
+            f"Valued {len(book)} positions of {len(self.portfolio_valuation['portfolios']['portfolio_id'])} "
+            f"portfolios in {time.perf_counter() - started:.3f}s"
+        )
+    
+    async def update_models(self):
+        """Retrain every model in the process pool, one job per symbol.
+        
+        A new model is swapped in only once it has validated, until then
+        requests keep using the current one.
+        """
+        symbols = self.config.SUPPORTED_COINS
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        metrics = self.training_metrics = {
+            'started_at': datetime.utcnow(),
+            'finished_at': None,
+            'duration': None,
+            'total': len(symbols),
+            'done': 0,
+            'accepted': 0,
+            'rejected': 0,
+            'failed': 0,
+            'symbols': {}
+        }
+        
+        async def retrain(symbol: str):
+            try:
+                data = await asyncio.to_thread(self.signal_generator._get_historical_data, symbol)
+                result = await loop.run_in_executor(
+                    self.training_pool,
+                    fit_signal_model,
+                    symbol,
+                    data,
+                    self.config.MODEL_VALIDATION_HOLDOUT
+                )
+                return symbol, result, None
+            except Exception as e:
+                return symbol, None, e
+        
+        for next_done in asyncio.as_completed([retrain(symbol) for symbol in symbols]):
+            symbol, result, error = await next_done
+            metrics['done'] += 1
+            
+            if error is not None:
+                status = 'failed'
+                self.logger.error(f"Error retraining model for {symbol}: {str(error)}")
+            elif self.signal_generator.validate_model(result):
+                status = 'accepted'
+                self.signal_generator.publish_model(result)
+            else:
+                status = 'rejected'
+                publish_model_files(result, accept=False)
+            
+            metrics[status] += 1
+            metrics['symbols'][symbol] = {
+                'status': status,
+                'duration': result['duration'] if result else None,
+                'accuracy': result['accuracy'] if result else None
+            }
+            self.logger.info(f"Model retraining {metrics['done']}/{metrics['total']}: {symbol} {status}")
+        
+        metrics['finished_at'] = datetime.utcnow()
+        metrics['duration'] = time.perf_counter() - started
+        self.logger.info(
+            f"Retrained {metrics['accepted']}/{metrics['total']} models in {metrics['duration']:.1f}s "
+            f"({metrics['rejected']} rejected, {metrics['failed']} failed)"
+        )
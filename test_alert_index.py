@@ -0,0 +1,67 @@
+import asyncio
+from alert_index import AlertIndex
+from database import Alert, Database
+
+def sample_index():
+    index = AlertIndex()
+    index.add(1, 'BTC/USDT', 90000.0, True)
+    index.add(2, 'BTC/USDT', 95000.0, True)
+    index.add(3, 'BTC/USDT', 80000.0, False)
+    index.add(4, 'BTC/USDT', 85000.0, False)
+    index.add(5, 'ETH/USDT', 5000.0, True)
+    return index
+
+def test_prices_trigger_the_thresholds_they_reach():
+    index = sample_index()
+
+    assert index.triggered('BTC/USDT', 87000.0) == []
+    # Thresholds are inclusive on both sides
+    assert index.reached_above('BTC/USDT', 90000.0) == [1]
+    assert index.reached_above('BTC/USDT', 99000.0) == [1, 2]
+    assert index.reached_below('BTC/USDT', 85000.0) == [4]
+    assert index.reached_below('BTC/USDT', 70000.0) == [3, 4]
+    assert index.triggered('ETH/USDT', 5000.0) == [5]
+    assert index.triggered('SOL/USDT', 1.0) == []
+
+def test_removed_and_moved_alerts():
+    index = sample_index()
+
+    assert index.remove(1) and not index.remove(1)
+    assert 1 not in index and len(index) == 4
+    assert index.reached_above('BTC/USDT', 92000.0) == []
+    # Adding a known id moves it
+    index.add(5, 'BTC/USDT', 91000.0, True)
+    assert index.reached_above('BTC/USDT', 92000.0) == [5]
+    assert sorted(index.pairs()) == ['BTC/USDT']
+
+def test_bound_index_follows_committed_alerts(tmp_path):
+    async def scenario():
+        db = Database(f"sqlite:///{tmp_path / 'alerts.db'}")
+        await db.create_all()
+        try:
+            async with db.session() as session:
+                session.add(Alert(id=1, user_id=1, coin_pair='BTC/USDT', price_threshold=90000.0, is_above=True))
+                await session.commit()
+
+            index = AlertIndex()
+            async with db.session() as session:
+                await index.load(session)
+            index.bind(db.session_class)
+            assert index.triggered('BTC/USDT', 90000.0) == [1]
+
+            async with db.session() as session:
+                session.add(Alert(id=2, user_id=1, coin_pair='BTC/USDT', price_threshold=80000.0, is_above=False))
+                await session.flush()
+                # Not applied before the commit
+                assert 2 not in index
+                await session.commit()
+            assert index.triggered('BTC/USDT', 75000.0) == [2]
+
+            async with db.session() as session:
+                await session.delete(await session.get(Alert, 1))
+                await session.commit()
+            assert 1 not in index and len(index) == 1
+        finally:
+            await db.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,75 @@
+import asyncio
+import time
+from alert_index import AlertIndex
+from alert_monitor import AlertMonitor
+
+def sample_index():
+    index = AlertIndex()
+    index.add(1, 'BTC/USDT', 100.0, True)
+    index.add(2, 'BTC/USDT', 90.0, False)
+    index.add(3, 'ETH/USDT', 10.0, True)
+    return index
+
+async def drain(queue):
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+def test_spike_within_a_batch_still_triggers():
+    async def scenario():
+        monitor = AlertMonitor(sample_index())
+        events = asyncio.Queue()
+        now = time.monotonic()
+        # Up through 100 and back down inside one batch, the last price alone would miss it
+        for price in (95.0, 101.0, 96.0):
+            events.put_nowait({'type': 'trade', 'symbol': 'BTC/USDT', 'last': price, 'received': now})
+        events.put_nowait({'type': 'kline', 'symbol': 'ETH/USDT', 'high': 9.5, 'low': 9.0, 'received': now})
+        consumer = asyncio.ensure_future(monitor.consume(events))
+        await asyncio.sleep(0.01)
+        consumer.cancel()
+        return monitor, await drain(monitor.queue)
+
+    monitor, queued = asyncio.run(scenario())
+    assert [(alert_id, price) for alert_id, price, _ in queued] == [(1, 101.0)]
+    assert monitor.stats['ticks'] == 4 and monitor.stats['batches'] == 1
+
+def test_pending_alerts_are_queued_once():
+    async def scenario():
+        monitor = AlertMonitor(sample_index())
+        await monitor.evaluate('BTC/USDT', 120.0, 80.0, time.monotonic())
+        await monitor.evaluate('BTC/USDT', 120.0, 80.0, time.monotonic())
+        return monitor, await drain(monitor.queue)
+
+    monitor, queued = asyncio.run(scenario())
+    assert sorted(alert_id for alert_id, _, _ in queued) == [1, 2]
+    assert monitor.stats['triggered'] == 2 and monitor.stats['duplicates'] == 2
+
+def test_failed_deliveries_are_retried_after_the_delay():
+    async def scenario():
+        index = sample_index()
+        monitor = AlertMonitor(index, retry_delay=0.05)
+        delivered = []
+
+        async def deliver(prices):
+            delivered.append(dict(prices))
+            # Alert 1 goes out and is deleted, alert 2 fails this time
+            index.remove(1)
+            return {1}
+
+        dispatcher = asyncio.ensure_future(monitor.dispatch(deliver))
+        await monitor.evaluate('BTC/USDT', 120.0, 80.0, time.monotonic())
+        await asyncio.sleep(0.01)
+        # Still backing off
+        await monitor.evaluate('BTC/USDT', 120.0, 80.0, time.monotonic())
+        await asyncio.sleep(0.1)
+        await monitor.evaluate('BTC/USDT', 120.0, 80.0, time.monotonic())
+        await asyncio.sleep(0.01)
+        dispatcher.cancel()
+        return monitor, delivered
+
+    monitor, delivered = asyncio.run(scenario())
+    assert delivered == [{1: 120.0, 2: 80.0}, {2: 80.0}]
+    metrics = monitor.metrics()
+    assert metrics['notified'] == 1 and metrics['failed'] == 2
+    assert metrics['latency']['notified']['count'] == 1
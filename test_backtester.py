@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+from advanced_signals import TAKE_PROFIT_ATR, STOP_LOSS_ATR
+from backtester import backtest_frame, simulate_exits
+
+def test_exit_bars():
+    horizon = 4
+    close = np.full(10, 100.0)
+    high = close + 0.5
+    low = close - 0.5
+    atr = np.ones(10)
+    side = np.ones(10)
+    # Bar 0's long reaches TP1 on candle 2 and TP2 on candle 3
+    high[2] = 100 + TAKE_PROFIT_ATR[0]
+    high[3] = 100 + TAKE_PROFIT_ATR[1]
+    # Bar 4's short is stopped on candle 6
+    side[4] = -1.0
+    high[6] = 100 + STOP_LOSS_ATR
+
+    exits = simulate_exits(side, close, high, low, atr, horizon)
+
+    assert exits['tp1_exit_bar'][0] == 2 and exits['tp1_hit'][0]
+    assert exits['tp2_exit_bar'][0] == 3 and exits['tp2_hit'][0]
+    assert exits['tp1_exit_bar'][4] == 6 and exits['tp1_stopped'][4]
+    assert exits['tp2_exit_bar'][4] == 6 and exits['tp2_stopped'][4]
+    # Bar 5's long never gets anywhere and times out on the close of candle 5 + horizon
+    assert not exits['tp1_hit'][5] and not exits['tp1_stopped'][5]
+    assert exits['tp1_exit_bar'][5] == 5 + horizon
+    assert exits['tp2_exit_bar'][5] == 5 + horizon
+    assert exits['tp1_exit_bar'].max() < len(close)
+
+def candles(n: int, flat: slice = None) -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    high = close * (1 + rng.uniform(0, 0.01, n))
+    low = close * (1 - rng.uniform(0, 0.01, n))
+    if flat is not None:
+        close[flat] = high[flat] = low[flat] = 100.0
+    return pd.DataFrame({'open': close, 'high': high, 'low': low, 'close': close,
+                         'volume': rng.uniform(100, 1000, n)},
+                        index=pd.date_range('2024-01-01', periods=n, freq='h'))
+
+def test_candles_without_atr_stay_in_the_history():
+    # ATR is exactly zero on the flat candles, they open no trades but still pass time
+    data = candles(400, flat=slice(0, 260))
+    report = backtest_frame(data, horizon=10, warmup=200)
+
+    atr_from = data.index[260]
+    assert report['start'] == atr_from
+    assert report['trades'] == 400 - 200 - 10 - 60
+    assert np.isfinite(report['pnl']) and np.isfinite(report['max_drawdown'])
+
+if __name__ == "__main__":
+    test_exit_bars()
+    test_candles_without_atr_stay_in_the_history()
+    print("✅ Backtester tests passed")
@@ -0,0 +1,63 @@
+import random
+import numpy as np
+import pandas as pd
+from candle_resampler import CandleResampler, bucket_start, resample_columns
+from market_data import TIMEFRAME_MS
+
+MINUTE = TIMEFRAME_MS['1m']
+
+def base_candles(start, count, rng):
+    close = 100 + np.cumsum([rng.uniform(-1, 1) for _ in range(count)])
+    return {
+        'ts': start + np.arange(count, dtype=np.int64) * MINUTE,
+        'open': close - 0.5,
+        'high': close + 1,
+        'low': close - 1,
+        'close': close,
+        'volume': np.array([rng.uniform(0, 10) for _ in range(count)])
+    }
+
+def test_streaming_bars_match_the_batch_resample():
+    rng = random.Random(1)
+    columns = base_candles(int(pd.Timestamp('2025-03-01 00:07').value // 10**6), 3000, rng)
+    resampler = CandleResampler(('5m', '1h', '4h'))
+    streamed = {timeframe: [] for timeframe in resampler.timeframes}
+    resampler.subscribe(lambda event: streamed[event['timeframe']].append(event))
+    for i in range(len(columns['ts'])):
+        resampler.add('BTC/USDT', {name: values[i].item() for name, values in columns.items()})
+
+    for timeframe in resampler.timeframes:
+        closed, partial = resample_columns(columns, timeframe)
+        for name, values in closed.items():
+            assert [event[name] for event in streamed[timeframe]] == values.tolist()
+        # The bar still open is the one the batch resample calls partial
+        assert resampler._bars.get(('BTC/USDT', timeframe)) == partial
+
+def test_gap_closes_the_bar_with_what_it_has():
+    resampler = CandleResampler(('5m',))
+    start = 10 * TIMEFRAME_MS['5m']
+    candle = {'ts': start, 'open': 1.0, 'high': 2.0, 'low': 0.5, 'close': 1.5, 'volume': 1.0}
+    assert resampler.add('BTC/USDT', candle) == []
+
+    events = resampler.add('BTC/USDT', dict(candle, ts=start + 12 * MINUTE))
+    assert [event['ts'] for event in events] == [start]
+    assert events[0]['close'] == 1.5 and events[0]['volume'] == 1.0
+
+def test_seeded_partial_bar_is_resumed():
+    rng = random.Random(2)
+    columns = base_candles(0, 90, rng)
+    _, partial = resample_columns({name: values[:40] for name, values in columns.items()}, '1h')
+
+    resampler = CandleResampler(('1h',))
+    resampler.seed('BTC/USDT', '1h', partial)
+    events = []
+    for i in range(40, 60):
+        events += resampler.add('BTC/USDT', {name: values[i].item() for name, values in columns.items()})
+
+    closed, _ = resample_columns(columns, '1h')
+    assert len(events) == 1
+    assert {name: events[0][name] for name in closed} == {name: values[0].item() for name, values in closed.items()}
+
+def test_weekly_buckets_open_on_monday():
+    thursday = int(pd.Timestamp('2025-01-02 15:00').value // 10**6)
+    assert pd.Timestamp(bucket_start(thursday, '1w'), unit='ms') == pd.Timestamp('2024-12-30')
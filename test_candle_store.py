@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+from candle_store import CandleSeries, CandleStore, COLUMNS
+
+def candles(start, count):
+    ts = np.arange(start, start + count, dtype=np.int64) * 60_000
+    price = np.arange(start, start + count, dtype=np.float64)
+    return {'ts': ts, 'open': price, 'high': price + 1, 'low': price - 1, 'close': price, 'volume': np.ones(count)}
+
+def test_windows_match_across_ring_and_memory_maps(tmp_path):
+    series = CandleSeries(str(tmp_path), ring_size=8)
+    for start in range(0, 30, 3):
+        series.append(candles(start, 3))
+
+    assert series.length == 30
+    for n in (1, 5, 7, 8, 20, None):
+        window = series.window(n)
+        expected = np.arange(30 - (n or 30), 30, dtype=np.float64)
+        assert np.array_equal(window['close'], expected)
+        assert np.array_equal(window['ts'], expected.astype(np.int64) * 60_000)
+
+def test_full_ring_window_survives_the_next_append(tmp_path):
+    series = CandleSeries(str(tmp_path), ring_size=8)
+    series.append(candles(0, 20))
+    window = series.window(8)
+    before = window['close'].copy()
+
+    series.append(candles(20, 1))
+    assert np.array_equal(window['close'], before)
+    # Shorter ring views last until their oldest slot comes around again
+    window = series.window(5)
+    before = window['close'].copy()
+    series.append(candles(21, 3))
+    assert np.array_equal(window['close'], before)
+
+def test_only_newer_candles_are_appended_and_survive_a_reopen(tmp_path):
+    series = CandleSeries(str(tmp_path), ring_size=8)
+    assert series.append(candles(0, 10)) == 10
+    assert series.append(candles(5, 10)) == 5
+    assert series.last_timestamp == 14 * 60_000
+
+    reopened = CandleSeries(str(tmp_path), ring_size=8)
+    assert reopened.length == 15
+    assert np.array_equal(reopened.window(3)['close'], [12.0, 13.0, 14.0])
+    assert np.array_equal(reopened.range(2 * 60_000, 4 * 60_000)['close'], [2.0, 3.0])
+
+def test_torn_append_is_dropped_on_recovery(tmp_path):
+    series = CandleSeries(str(tmp_path), ring_size=8)
+    series.append(candles(0, 4))
+    with open(tmp_path / 'close.bin', 'ab') as f:
+        f.write(b'\0' * 3)
+
+    assert CandleSeries(str(tmp_path)).length == 4
+
+def test_store_round_trips_frames(tmp_path):
+    store = CandleStore(str(tmp_path), ring_size=8)
+    index = pd.date_range('2025-01-01', periods=12, freq='h', name='timestamp')
+    df = pd.DataFrame({name: np.arange(12, dtype=np.float64) for name, _ in COLUMNS[1:]}, index=index)
+
+    assert store.append('BTC/USDT', '1h', df) == 12
+    frame = store.to_frame('BTC/USDT', '1h')
+    assert list(frame.index) == list(index)
+    assert np.array_equal(frame.to_numpy(), df.to_numpy())
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from forest_compiler import CompiledForest
+
+def fitted_forest(with_nan=False):
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(400, 5)), columns=[f"f{i}" for i in range(5)])
+    y = X['f0'] * 2 - X['f3'] + rng.normal(scale=0.1, size=len(X))
+    if with_nan:
+        X.loc[rng.random(len(X)) < 0.1, 'f0'] = np.nan
+    return RandomForestRegressor(n_estimators=20, max_depth=8, random_state=0).fit(X, y), X
+
+def test_predictions_are_bit_identical_to_sklearn():
+    model, X = fitted_forest()
+    compiled = CompiledForest.from_sklearn(model)
+
+    assert compiled.n_trees == 20
+    assert np.array_equal(compiled.predict(X), model.predict(X))
+    # Columns are picked by name
+    assert np.array_equal(compiled.predict(X[X.columns[::-1]]), model.predict(X))
+
+def test_missing_values_follow_sklearns_path():
+    model, X = fitted_forest(with_nan=True)
+    compiled = CompiledForest.from_sklearn(model)
+
+    assert np.array_equal(compiled.predict(X), model.predict(X))
+
+def test_save_and_load_round_trip(tmp_path):
+    model, X = fitted_forest()
+    compiled = CompiledForest.from_sklearn(model)
+    path = tmp_path / 'model.npz'
+    compiled.save(str(path))
+    loaded = CompiledForest.load(str(path))
+
+    assert loaded.feature_names == compiled.feature_names
+    assert loaded.max_depth == compiled.max_depth
+    assert np.array_equal(loaded.predict(X), model.predict(X))
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+from advanced_signals import AdvancedSignalGenerator, FEATURE_WINDOW
+from incremental_indicators import IncrementalIndicatorEngine
+
+def candles(n: int, seed: int = 1) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 88000 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    return pd.DataFrame({
+        'open': close * (1 + rng.normal(0, 0.002, n)),
+        'high': close * (1 + rng.uniform(0, 0.01, n)),
+        'low': close * (1 - rng.uniform(0, 0.01, n)),
+        'close': close,
+        'volume': rng.uniform(100, 1000, n)
+    }, index=pd.date_range('2024-01-01', periods=n, freq='h'))
+
+def forming(window: pd.DataFrame) -> pd.DataFrame:
+    """The window with its last candle still moving"""
+    window = window.copy()
+    window.iloc[-1, window.columns.get_loc('close')] *= 1.02
+    window.iloc[-1, window.columns.get_loc('volume')] /= 3
+    return window
+
+def test_live_features_match_batch_over_the_window():
+    data = candles(FEATURE_WINDOW + 300)
+    engine = IncrementalIndicatorEngine(FEATURE_WINDOW)
+    engine.update('BTC/USDT', '1h', data.iloc[:200])
+
+    for end in range(201, len(data) + 1, 7):
+        window = data.iloc[max(0, end - FEATURE_WINDOW):end]
+        engine.update('BTC/USDT', '1h', forming(window))
+        engine.update('BTC/USDT', '1h', window)
+        batch = AdvancedSignalGenerator._calculate_features(window)
+        # EMA-200 and OBV included: the live state slides with the window
+        assert engine.verify('BTC/USDT', '1h', batch) == {}, f"window ending at candle {end}"
+
+def test_rewound_forming_candles_leave_no_trace():
+    data = candles(FEATURE_WINDOW + 100, seed=2)
+    rewound = IncrementalIndicatorEngine(FEATURE_WINDOW)
+    straight = IncrementalIndicatorEngine(FEATURE_WINDOW)
+
+    for end in range(50, len(data) + 1):
+        window = data.iloc[max(0, end - FEATURE_WINDOW):end]
+        rewound.update('ETH/USDT', '1h', forming(window))
+        live = rewound.update('ETH/USDT', '1h', window)
+        expected = straight.update('ETH/USDT', '1h', window)
+        pd.testing.assert_series_equal(live, expected)
+
+def test_unwindowed_replay_matches_batch_on_the_whole_history():
+    data = candles(400, seed=3)
+    replayed = IncrementalIndicatorEngine.replay(data)
+    batch = AdvancedSignalGenerator._calculate_features(data)[replayed.columns]
+    np.testing.assert_allclose(replayed.to_numpy(), batch.to_numpy(), rtol=1e-6, atol=1e-8)
+
+def test_verify_refuses_features_of_another_candle():
+    data = candles(100)
+    engine = IncrementalIndicatorEngine(FEATURE_WINDOW)
+    engine.update('SOL/USDT', '1h', data)
+    with pytest.raises(ValueError):
+        engine.verify('SOL/USDT', '1h', AdvancedSignalGenerator._calculate_features(data.iloc[:-1]))
+
+if __name__ == "__main__":
+    test_live_features_match_batch_over_the_window()
+    test_rewound_forming_candles_leave_no_trace()
+    test_unwindowed_replay_matches_batch_on_the_whole_history()
+    test_verify_refuses_features_of_another_candle()
+    print("✅ Incremental indicator tests passed")
@@ -0,0 +1,46 @@
+import pandas as pd
+import pytest
+from market_data import ReplayMarketDataSource, TIMEFRAME_MS
+
+HOUR = TIMEFRAME_MS['1h']
+
+@pytest.fixture
+def tape(tmp_path):
+    rows = []
+    for i in range(48):
+        for symbol, price in (('BTC/USDT', 100.0), ('ETH/USDT', 10.0)):
+            close = price + i
+            rows.append([i * HOUR, symbol, close, close + 1, close - 1, close, 2.0])
+    path = tmp_path / 'tape.csv'
+    pd.DataFrame(rows, columns=['timestamp', 'symbol', 'open', 'high', 'low', 'close', 'volume']).to_csv(path, index=False)
+    return ReplayMarketDataSource(str(path))
+
+def test_only_the_symbols_rows_up_to_the_clock_are_visible(tape):
+    tape.clock = 10 * HOUR
+    rows = tape._visible('ETH/USDT')
+
+    assert list(rows['timestamp']) == [i * HOUR for i in range(11)]
+    assert set(rows['symbol']) == {'ETH/USDT'}
+    # A clock between two candles sees the earlier one
+    tape.clock = 10 * HOUR + 1
+    assert len(tape._visible('ETH/USDT')) == 11
+    assert tape._visible('DOGE/USDT').empty
+
+def test_ticker_follows_the_replay_clock(tape):
+    tape.clock = 30 * HOUR
+    ticker = tape.fetch_ticker('BTC/USDT')
+
+    assert ticker['timestamp'] == 30 * HOUR
+    assert ticker['last'] == 130.0
+    # Compared with the close 24 hours earlier
+    assert ticker['percentage'] == pytest.approx((130.0 / 106.0 - 1) * 100)
+    with pytest.raises(ValueError):
+        tape.fetch_ticker('DOGE/USDT')
+
+def test_ohlcv_is_resampled_from_the_visible_rows(tape):
+    tape.clock = 11 * HOUR
+    candles = tape.fetch_ohlcv('ETH/USDT', '4h')
+
+    assert list(candles['open']) == [10.0, 14.0, 18.0]
+    assert list(candles['close']) == [13.0, 17.0, 21.0]
+    assert list(candles['volume']) == [8.0, 8.0, 8.0]
@@ -0,0 +1,76 @@
+import asyncio
+import json
+from market_data import SyntheticMarketDataSource, TIMEFRAME_MS, now_ms
+from market_stream import MarketStream, StreamingMarketDataSource, parse_message
+
+MINUTE = TIMEFRAME_MS['1m']
+
+def kline(open_time, close=100.0, closed=True):
+    return json.dumps({'stream': 'btcusdt@kline_1m', 'data': {'e': 'kline', 's': 'BTCUSDT', 'k': {
+        't': open_time, 'i': '1m', 'o': '99', 'h': '101', 'l': '98', 'c': str(close), 'v': '3', 'x': closed
+    }}})
+
+def drain(queue):
+    events = []
+    while not queue.empty():
+        events.append(queue.get_nowait())
+    return events
+
+def test_parse_binance_payloads():
+    symbols = {'BTCUSDT': 'BTC/USDT'}
+    trade = parse_message({'e': 'trade', 's': 'BTCUSDT', 'T': 5, 't': 9, 'p': '88000.5', 'q': '0.1'}, symbols)
+    ticker = parse_message({'data': {'e': '24hrTicker', 's': 'BTCUSDT', 'E': 6, 'c': '88001', 'P': '-1.5',
+                                     'q': '1e9'}}, symbols)
+
+    assert trade == {'type': 'trade', 'symbol': 'BTC/USDT', 'timestamp': 5, 'id': 9, 'last': 88000.5, 'amount': 0.1}
+    assert ticker['last'] == 88001.0 and ticker['percentage'] == -1.5
+    assert parse_message({'result': None, 'id': 1}, symbols) is None
+    assert parse_message({'e': 'trade', 's': 'DOGEUSDT'}, symbols) is None
+
+def test_replayed_klines_are_dropped_and_gaps_backfilled():
+    async def scenario():
+        stream = MarketStream('ws://unused', ['BTC/USDT'], gap_source=SyntheticMarketDataSource(seed=1))
+        queue = stream.subscribe('klines', types=['kline'])
+        start = 1000 * MINUTE
+        await stream._receive(kline(start))
+        await stream._receive(kline(start))
+        await stream._receive(kline(start + 4 * MINUTE))
+        await stream._receive('{not json')
+        return stream, drain(queue)
+
+    stream, events = asyncio.run(scenario())
+    start = 1000 * MINUTE
+    assert [event['timestamp'] for event in events] == [start + i * MINUTE for i in range(5)]
+    assert [bool(event.get('backfill')) for event in events] == [False, True, True, True, False]
+    assert stream.stats['backfilled'] == 3 and stream.stats['malformed'] == 1
+
+def test_slow_subscribers_lose_their_oldest_events():
+    async def scenario():
+        stream = MarketStream('ws://unused', ['BTC/USDT'])
+        slow = stream.subscribe('slow', maxsize=2)
+        trades = stream.subscribe('trades', types=['trade'])
+        for i in range(5):
+            stream.publish({'type': 'ticker', 'symbol': 'BTC/USDT', 'n': i})
+        return stream, drain(slow), drain(trades)
+
+    stream, slow, trades = asyncio.run(scenario())
+    assert [event['n'] for event in slow] == [3, 4]
+    assert trades == []
+    assert stream.stats['dropped'] == {'slow': 3, 'trades': 0}
+
+def test_streamed_tickers_are_served_while_fresh():
+    source = StreamingMarketDataSource(SyntheticMarketDataSource(seed=1, base_prices={'ETH/USDT': 5000}))
+    now = now_ms()
+    source.apply({'type': 'trade', 'symbol': 'BTC/USDT', 'timestamp': now, 'last': 1.0})
+    # A trade only moves a ticker that is already on the board
+    assert 'BTC/USDT' not in source.tickers
+
+    source.apply({'type': 'ticker', 'symbol': 'BTC/USDT', 'timestamp': now, 'last': 88000.0, 'percentage': 1.0,
+                  'quoteVolume': 1e9})
+    source.apply({'type': 'trade', 'symbol': 'BTC/USDT', 'timestamp': now + 1, 'last': 88100.0})
+    tickers = source.fetch_tickers(['BTC/USDT', 'ETH/USDT'])
+    assert tickers['BTC/USDT']['last'] == 88100.0
+    assert 4900 <= tickers['ETH/USDT']['last'] <= 5100
+
+    source.tickers['BTC/USDT']['timestamp'] = now - 60_000
+    assert source.fetch_ticker('BTC/USDT')['last'] != 88100.0
@@ -0,0 +1,120 @@
+import threading
+import time
+from concurrent.futures import Future
+from model_registry import ModelRegistry
+
+class InlineExecutor:
+    """Runs jobs right away, so their futures are done before submit returns"""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait: bool = True):
+        pass
+
+def missing_model(symbol: str):
+    raise FileNotFoundError(symbol)
+
+def inline_registry(train_model, load_model=missing_model, **kwargs) -> ModelRegistry:
+    registry = ModelRegistry(load_model, train_model, **kwargs)
+    registry.shutdown()
+    registry._loader = InlineExecutor()
+    registry._executor = InlineExecutor()
+    return registry
+
+def test_training_finished_before_callback_does_not_deadlock():
+    registry = inline_registry(lambda symbol: f"model-{symbol}")
+
+    worker = threading.Thread(target=registry.get, args=('BTC/USDT',), daemon=True)
+    worker.start()
+    worker.join(timeout=5)
+
+    assert not worker.is_alive(), "get() deadlocked on a training that was already done"
+    assert registry.models['BTC/USDT'] == 'model-BTC/USDT'
+    assert registry.get('BTC/USDT') == 'model-BTC/USDT'
+    assert registry.readiness(['BTC/USDT']) == {'BTC/USDT': ModelRegistry.READY}
+
+def test_failed_training_backs_off():
+    trainings = []
+
+    def failing(symbol: str):
+        trainings.append(symbol)
+        raise RuntimeError("not enough candles")
+
+    registry = inline_registry(failing, retry_delay=0.2, max_retry_delay=1)
+    for _ in range(5):
+        assert registry.get('ETH/USDT') is None
+    assert len(trainings) == 1
+    assert registry.readiness(['ETH/USDT']) == {'ETH/USDT': ModelRegistry.FAILED}
+
+    time.sleep(0.25)
+    for _ in range(5):
+        registry.get('ETH/USDT')
+    assert len(trainings) == 2
+
+    # The second failure waits twice as long
+    time.sleep(0.25)
+    registry.get('ETH/USDT')
+    assert len(trainings) == 2
+
+def test_success_clears_backoff():
+    attempts = []
+
+    def flaky(symbol: str):
+        attempts.append(symbol)
+        if len(attempts) == 1:
+            raise RuntimeError("exchange unavailable")
+        return 'model'
+
+    registry = inline_registry(flaky, retry_delay=0.05)
+    assert registry.get('SOL/USDT') is None
+    time.sleep(0.1)
+    # Trained by the time get returns, the next call finds it
+    assert registry.get('SOL/USDT') is None
+    assert registry.get('SOL/USDT') == 'model'
+    assert 'SOL/USDT' not in registry._failures
+
+def test_get_loads_in_the_background_without_the_lock():
+    loading = threading.Event()
+    release = threading.Event()
+
+    def slow_load(symbol: str):
+        loading.set()
+        release.wait(5)
+        return f"model-{symbol}"
+
+    registry = ModelRegistry(slow_load, missing_model)
+    try:
+        started = time.monotonic()
+        assert registry.get('BNB/USDT') is None
+        assert time.monotonic() - started < 0.5, "get() waited for the load"
+        assert loading.wait(5)
+        assert registry.readiness(['BNB/USDT']) == {'BNB/USDT': ModelRegistry.LOADING}
+
+        # Nobody waits behind the load for the lock
+        swapped = threading.Thread(target=registry.swap, args=('ETH/USDT', 'other'), daemon=True)
+        swapped.start()
+        swapped.join(timeout=1)
+        assert not swapped.is_alive()
+        assert registry.get('BNB/USDT') is None
+
+        release.set()
+        deadline = time.monotonic() + 5
+        while registry.get('BNB/USDT') is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert registry.get('BNB/USDT') == 'model-BNB/USDT'
+    finally:
+        release.set()
+        registry.shutdown()
+
+if __name__ == "__main__":
+    test_training_finished_before_callback_does_not_deadlock()
+    test_failed_training_backs_off()
+    test_success_clears_backoff()
+    test_get_loads_in_the_background_without_the_lock()
+    print("✅ Model registry tests passed")
@@ -0,0 +1,71 @@
+import asyncio
+import time
+import pytest
+from price_cache import PriceCache
+
+class Exchange:
+    """Counts bulk fetches, each one takes a little while"""
+
+    def __init__(self, tickers):
+        self.tickers = tickers
+        self.fetches = []
+
+    async def fetch_tickers(self, symbols):
+        self.fetches.append(list(symbols))
+        await asyncio.sleep(0.01)
+        return {symbol: self.tickers[symbol] for symbol in symbols if symbol in self.tickers}
+
+def test_concurrent_lookups_share_one_fetch():
+    exchange = Exchange({'BTC/USDT': {'last': 88000.0}, 'ETH/USDT': {'last': 4900.0}})
+    cache = PriceCache(exchange.fetch_tickers, ttl=5)
+
+    async def burst():
+        lookups = [cache.get_price('BTC/USDT') for _ in range(100)] + [cache.get_price('ETH/USDT') for _ in range(2)]
+        return await asyncio.gather(*lookups)
+
+    prices = asyncio.run(burst())
+
+    assert prices[:100] == [88000.0] * 100 and prices[100:] == [4900.0] * 2
+    assert exchange.fetches == [['BTC/USDT', 'ETH/USDT']]
+    assert cache.stats()['coalesced'] == 100
+
+def test_stale_tickers_are_served_while_they_refresh():
+    exchange = Exchange({'BTC/USDT': {'last': 1.0}})
+    cache = PriceCache(exchange.fetch_tickers, ttl=0.05, stale_ttl=10)
+
+    async def lookups():
+        assert await cache.get_price('BTC/USDT') == 1.0
+        await asyncio.sleep(0.06)
+        exchange.tickers['BTC/USDT'] = {'last': 2.0}
+        # Answered from the stale entry right away, the refresh runs behind it
+        started = time.monotonic()
+        assert await cache.get_price('BTC/USDT') == 1.0
+        assert time.monotonic() - started < 0.01
+        await asyncio.sleep(0.03)
+        assert await cache.get_price('BTC/USDT') == 2.0
+
+    asyncio.run(lookups())
+    assert len(exchange.fetches) == 2
+
+def test_ticker_without_price_is_a_miss():
+    exchange = Exchange({'BTC/USDT': {'last': None}, 'ETH/USDT': {'last': 4900.0}})
+    cache = PriceCache(exchange.fetch_tickers, ttl=5)
+
+    async def lookups():
+        for symbol in ('BTC/USDT', 'XRP/USDT'):
+            with pytest.raises(KeyError):
+                await cache.get_price(symbol)
+        assert await cache.get_price('ETH/USDT') == 4900.0
+        # Not cached, asked for again
+        with pytest.raises(KeyError):
+            await cache.get('BTC/USDT')
+
+    asyncio.run(lookups())
+    assert 'BTC/USDT' not in cache._tickers
+    assert exchange.fetches.count(['BTC/USDT']) == 2
+
+if __name__ == "__main__":
+    test_concurrent_lookups_share_one_fetch()
+    test_stale_tickers_are_served_while_they_refresh()
+    test_ticker_without_price_is_a_miss()
+    print("✅ Price cache tests passed")
@@ -0,0 +1,70 @@
+import asyncio
+import pytest
+from request_scheduler import BACKGROUND, USER, RequestScheduler
+
+def drained(rate_limit: float = 20) -> RequestScheduler:
+    """A scheduler with no request token left, everything submitted now has to queue"""
+    scheduler = RequestScheduler(rate_limit=rate_limit)
+    scheduler.requests.tokens = 0
+    return scheduler
+
+def test_user_requests_go_first():
+    scheduler = drained()
+    served = []
+
+    async def request(name: str):
+        served.append(name)
+
+    async def submit_all():
+        jobs = [scheduler.submit(request, f"background-{i}", priority=BACKGROUND) for i in range(3)]
+        jobs += [scheduler.submit(request, f"user-{i}", priority=USER) for i in range(3)]
+        await asyncio.gather(*jobs)
+
+    asyncio.run(submit_all())
+
+    assert served == ['user-0', 'user-1', 'user-2', 'background-0', 'background-1', 'background-2']
+    stats = scheduler.stats()
+    assert stats['requests'] == 6
+    assert stats['wait']['user']['count'] == 3
+
+def test_worker_thread_calls_queue_on_the_attached_loop():
+    scheduler = drained()
+    served = []
+
+    async def run():
+        scheduler.attach()
+        # No submit() ran yet, the blocking call still goes through the priority queue
+        await asyncio.to_thread(scheduler.call, served.append, 'user', endpoint='fetch_ticker', priority=USER)
+        jobs = [scheduler.submit(served.append, f"background-{i}") for i in range(2)]
+        jobs.append(asyncio.to_thread(scheduler.call, served.append, 'user-again', priority=USER))
+        await asyncio.gather(*jobs)
+
+    asyncio.run(run())
+
+    assert served[0] == 'user'
+    assert set(served[1:]) == {'background-0', 'background-1', 'user-again'}
+    stats = scheduler.stats()
+    assert stats['max_queue_depth'] >= 1
+    assert stats['wait']['user']['count'] == 2
+
+def test_call_refuses_to_block_the_event_loop():
+    scheduler = RequestScheduler()
+
+    async def on_the_loop():
+        scheduler.attach()
+        with pytest.raises(RuntimeError):
+            scheduler.call(lambda: None)
+
+    asyncio.run(on_the_loop())
+
+def test_call_without_a_loop_runs_in_place():
+    scheduler = RequestScheduler()
+    assert scheduler.call(lambda x: x * 2, 21) == 42
+    assert scheduler.stats()['requests'] == 1
+
+if __name__ == "__main__":
+    test_user_requests_go_first()
+    test_worker_thread_calls_queue_on_the_attached_loop()
+    test_call_refuses_to_block_the_event_loop()
+    test_call_without_a_loop_runs_in_place()
+    print("✅ Request scheduler tests passed")
@@ -0,0 +1,49 @@
+import asyncio
+from signal_batch import BatchSignalEngine
+from signal_snapshot import SignalSnapshot, PREMIUM_FIELDS
+
+class Source:
+    def __init__(self):
+        self.calls = []
+
+    async def fetch_tickers_async(self, pairs):
+        self.calls.append(list(pairs))
+        return {pair: {'last': 100.0 * (i + 1), 'percentage': 1.234, 'quoteVolume': 5e6} for i, pair in enumerate(pairs)}
+
+class Generator:
+    def __init__(self):
+        self.data_source = Source()
+        self.signal_types = [('BUY', 2), ('SELL', 1), ('HOLD', 1)]
+        self.crypto_logos = {'BTC': '₿'}
+
+PAIRS = ['BTC/USDT', 'ETH/USDT', 'SOL/USDT']
+TIMEFRAMES = ['1h', '4h']
+
+def test_whole_grid_from_one_ticker_call():
+    generator = Generator()
+    batch = asyncio.run(BatchSignalEngine(generator, seed=1).compute(PAIRS, TIMEFRAMES))
+
+    assert generator.data_source.calls == [PAIRS]
+    assert all(values.shape == (2, 3) for values in batch.arrays.values())
+    assert ('ETH/USDT', '4h') in batch and ('DOGE/USDT', '1h') not in batch and ('BTC/USDT', '1d') not in batch
+
+def test_materialized_cells():
+    batch = asyncio.run(BatchSignalEngine(Generator(), seed=1).compute(PAIRS, TIMEFRAMES))
+    cell = batch.materialize('ETH/USDT', '4h')
+
+    assert cell['pair'] == 'ETH/USDT' and cell['logo'] == ''
+    assert cell['price'] == 200.0 and cell['change'] == 1.23
+    assert cell['signal'] in {'BUY', 'SELL', 'HOLD'}
+    assert cell['targets'] == {'tp1': 210.0, 'tp2': 220.0, 'sl': 190.0}
+    assert 0 <= cell['indicators']['rsi'] <= 100
+    assert batch.materialize('BTC/USDT', '1h')['logo'] == '₿'
+
+def test_snapshot_builds_only_the_cells_it_is_asked_for():
+    batch = asyncio.run(BatchSignalEngine(Generator(), seed=1).compute(PAIRS, TIMEFRAMES))
+    snapshot = SignalSnapshot(1, 0, batch=batch)
+
+    signals = snapshot.project(['BTC/USDT', 'DOGE/USDT'], '1h', is_premium=False)
+    assert [signal['pair'] for signal in signals] == ['BTC/USDT']
+    assert not set(PREMIUM_FIELDS) & set(signals[0])
+    assert list(snapshot.entries) == [('BTC/USDT', '1h')]
+    assert snapshot.get('BTC/USDT', '1h') is snapshot.get('BTC/USDT', '1h')
@@ -0,0 +1,56 @@
+import asyncio
+from market_data import SyntheticMarketDataSource
+from signal_generator import EnhancedSignalGenerator
+
+class Config:
+    MARKET_DATA_SEED = 42
+    SIGNAL_TICK_SECONDS = 60
+    SIGNAL_EXECUTION_MODE = 'concurrent'
+    SIGNAL_CONCURRENCY = 8
+    SIGNAL_TASK_TIMEOUT = 0.2
+    SUPPORTED_COINS = ['BTC/USDT', 'ETH/USDT', 'DOGE/USDT', 'SOL/USDT']
+
+class FlakySource(SyntheticMarketDataSource):
+    """DOGE fails, SOL hangs, the rest answer"""
+
+    async def fetch_ticker_async(self, symbol: str):
+        if symbol == 'DOGE/USDT':
+            raise ConnectionError("exchange unavailable")
+        if symbol == 'SOL/USDT':
+            await asyncio.sleep(5)
+        return self.fetch_ticker(symbol)
+
+def generator(mode: str) -> EnhancedSignalGenerator:
+    config = Config()
+    config.SIGNAL_EXECUTION_MODE = mode
+    return EnhancedSignalGenerator(config, FlakySource(seed=1))
+
+def test_failed_cells_leave_the_rest_of_the_grid():
+    signals = generator('concurrent')
+    results, timed_out, failed = asyncio.run(signals._analyze_grid(['1h', '4h'], Config.SUPPORTED_COINS))
+
+    assert set(results) == {(coin, tf) for coin in ('BTC/USDT', 'ETH/USDT') for tf in ('1h', '4h')}
+    assert set(timed_out) == {('SOL/USDT', '1h'), ('SOL/USDT', '4h')}
+    assert set(failed) == {('DOGE/USDT', '1h'), ('DOGE/USDT', '4h')}
+
+def test_snapshot_marks_failed_and_timed_out_cells_incomplete():
+    signals = generator('concurrent')
+    result = asyncio.run(signals.generate_signals(user_is_premium=True, requested_timeframe='1h'))
+
+    timeframe = result['timeframes']['1h']
+    assert [signal['pair'] for signal in timeframe['signals']] == ['BTC/USDT', 'ETH/USDT']
+    assert set(timeframe['incomplete']) == {'DOGE/USDT', 'SOL/USDT'}
+
+def test_sequential_mode_records_failures_too():
+    signals = generator('sequential')
+    coins = ['BTC/USDT', 'DOGE/USDT']
+    results, timed_out, failed = asyncio.run(signals._analyze_grid(['1h'], coins))
+
+    assert list(results) == [('BTC/USDT', '1h')]
+    assert timed_out == [] and failed == [('DOGE/USDT', '1h')]
+
+if __name__ == "__main__":
+    test_failed_cells_leave_the_rest_of_the_grid()
+    test_snapshot_marks_failed_and_timed_out_cells_incomplete()
+    test_sequential_mode_records_failures_too()
+    print("✅ Signal generator tests passed")
@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+from signal_snapshot import SignalSnapshotStore
+
+class Config:
+    SUPPORTED_COINS = ['BTC/USDT', 'ETH/USDT']
+    SIGNAL_EXECUTION_MODE = 'concurrent'
+
+class Generator:
+    """Grid analysis that counts its runs and fails when told to"""
+
+    def __init__(self):
+        self.config = Config()
+        self.timeframes = {'1h': '1 hour', '4h': '4 hours'}
+        self.runs = 0
+        self.fail = False
+
+    async def _analyze_grid(self, timeframes, coins):
+        self.runs += 1
+        if self.fail:
+            raise RuntimeError("exchange unavailable")
+        entries = {(coin, timeframe): {'pair': coin, 'run': self.runs} for timeframe in timeframes for coin in coins}
+        return entries, [], []
+
+def test_one_refresh_per_tick():
+    generator = Generator()
+    store = SignalSnapshotStore(generator, tick_seconds=3600)
+
+    async def burst():
+        return await asyncio.gather(*(store.get_snapshot() for _ in range(50)))
+
+    snapshots = asyncio.run(burst())
+
+    assert generator.runs == 1
+    assert {id(snapshot) for snapshot in snapshots} == {id(snapshots[0])}
+    assert snapshots[0].version == 1
+
+def test_failed_refresh_keeps_the_version():
+    generator = Generator()
+    store = SignalSnapshotStore(generator)
+
+    async def refreshes():
+        first = await store.refresh(1)
+        generator.fail = True
+        with pytest.raises(RuntimeError):
+            await store.refresh(2)
+        assert store.version == first.version == 1
+        assert store._snapshot is first
+        generator.fail = False
+        return first, await store.refresh(3)
+
+    first, second = asyncio.run(refreshes())
+    assert second.version == 2 and store.version == 2
+    assert second.get('BTC/USDT', '1h')['run'] == 3
+
+def test_free_users_get_no_premium_fields():
+    generator = Generator()
+    store = SignalSnapshotStore(generator)
+    snapshot = asyncio.run(store.refresh(1))
+    snapshot.entries[('BTC/USDT', '1h')]['confidence'] = 80
+
+    free = snapshot.project(['BTC/USDT'], '1h', is_premium=False)
+    premium = snapshot.project(['BTC/USDT'], '1h', is_premium=True)
+
+    assert 'confidence' not in free[0]
+    assert premium[0] is snapshot.get('BTC/USDT', '1h')
+
+if __name__ == "__main__":
+    test_one_refresh_per_tick()
+    test_failed_refresh_keeps_the_version()
+    test_free_users_get_no_premium_fields()
+    print("✅ Signal snapshot tests passed")
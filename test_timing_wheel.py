@@ -0,0 +1,52 @@
+import math
+import random
+import pytest
+from timing_wheel import TimingWheel
+
+def test_timers_expire_on_their_tick_across_cascades():
+    # 4 slots per level: anything past 4 ticks out goes through at least one cascade
+    wheel = TimingWheel(tick=1.0, slots=4, levels=4, start=0)
+    rng = random.Random(7)
+    deadlines = {key: rng.uniform(0.5, 250) for key in range(300)}
+    for key, deadline in deadlines.items():
+        wheel.schedule(key, deadline)
+
+    expired_at = {}
+    now = 0
+    while now < 256:
+        now += rng.choice([1, 1, 1, 3, 7])
+        for key in wheel.advance(now):
+            expired_at[key] = now
+    assert len(wheel) == 0
+
+    for key, deadline in deadlines.items():
+        due = math.ceil(deadline)
+        # Expired by the first advance that reached its tick, not before
+        assert due <= expired_at[key] < due + 7
+
+def test_every_tick_advance_is_exact():
+    wheel = TimingWheel(tick=1.0, slots=4, levels=4, start=0)
+    for key in range(1, 200):
+        wheel.schedule(key, key)
+
+    for now in range(1, 200):
+        assert wheel.advance(now) == [now]
+
+def test_cancel_and_reschedule():
+    wheel = TimingWheel(tick=1.0, slots=4, levels=3, start=0)
+    wheel.schedule('a', 10)
+    wheel.schedule('b', 20)
+    wheel.schedule('a', 30)
+    assert wheel.cancel('b') and not wheel.cancel('b')
+
+    assert wheel.advance(29) == []
+    assert wheel.advance(30) == ['a']
+    assert 'a' not in wheel
+
+def test_past_deadlines_expire_on_the_next_tick_and_span_is_enforced():
+    wheel = TimingWheel(tick=1.0, slots=4, levels=2, start=100)
+    wheel.schedule('late', 50)
+    assert wheel.advance(101) == ['late']
+
+    with pytest.raises(ValueError):
+        wheel.schedule('far', 101 + wheel.span)
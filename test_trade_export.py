@@ -0,0 +1,64 @@
+import asyncio
+import csv
+from datetime import datetime, timedelta
+import pyarrow.parquet as pq
+import pytest
+from database import Database, Portfolio, Trade, User
+from trade_export import EXPORT_COLUMNS, export_trades, stream_trades
+
+def run_with_trades(tmp_path, scenario):
+    async def main():
+        db = Database(f"sqlite:///{tmp_path / 'trades.db'}")
+        await db.create_all()
+        try:
+            async with db.session() as session:
+                session.add_all([User(id=1, telegram_id=111), User(id=2, telegram_id=222),
+                                 Portfolio(id=1, user_id=1), Portfolio(id=2, user_id=2)])
+                opened = datetime(2025, 1, 1)
+                session.add_all([
+                    Trade(id=i, portfolio_id=1 + i % 2, symbol='BTC/USDT', side='BUY', quantity=1.0,
+                          entry_price=100.0, exit_price=100.0 + i, pnl=float(i),
+                          entry_time=opened, exit_time=opened + timedelta(hours=i))
+                    for i in range(1, 24)
+                ])
+                await session.commit()
+            return await scenario(db)
+        finally:
+            await db.close()
+    return asyncio.run(main())
+
+def test_chunks_follow_the_trade_ids(tmp_path):
+    async def scenario(db):
+        return [chunk async for chunk in stream_trades(db, chunk_size=5)], \
+               [chunk async for chunk in stream_trades(db, telegram_id=222, chunk_size=4)]
+
+    everyone, one_user = run_with_trades(tmp_path, scenario)
+    assert [len(chunk) for chunk in everyone] == [5, 5, 5, 5, 3]
+    assert [row[0] for chunk in everyone for row in chunk] == list(range(1, 24))
+    assert [row[0] for chunk in one_user for row in chunk] == list(range(1, 24, 2))
+    assert {row[1] for chunk in one_user for row in chunk} == {222}
+
+def test_csv_export(tmp_path):
+    path = tmp_path / 'trades.csv'
+    count = run_with_trades(tmp_path, lambda db: export_trades(db, str(path), 'csv', telegram_id=111, chunk_size=3))
+
+    with open(path, newline='') as f:
+        rows = list(csv.reader(f))
+    assert count == 11
+    assert tuple(rows[0]) == EXPORT_COLUMNS
+    assert [int(row[0]) for row in rows[1:]] == list(range(2, 24, 2))
+    assert rows[1][-1] == '2025-01-01T02:00:00'
+
+def test_parquet_export_writes_a_row_group_per_chunk(tmp_path):
+    path = tmp_path / 'trades.parquet'
+    count = run_with_trades(tmp_path, lambda db: export_trades(db, str(path), 'parquet', chunk_size=10))
+
+    parquet = pq.ParquetFile(path)
+    table = parquet.read()
+    assert count == 23 and parquet.num_row_groups == 3
+    assert table.column_names == list(EXPORT_COLUMNS)
+    assert table.column('pnl').to_pylist() == [float(i) for i in range(1, 24)]
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        run_with_trades(tmp_path, lambda db: export_trades(db, str(tmp_path / 'trades.xlsx'), 'xlsx'))
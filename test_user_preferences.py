@@ -0,0 +1,60 @@
+import asyncio
+import pytest
+from database import Database
+from user_preferences import UserPreferencesManager
+
+def run_with_db(tmp_path, scenario, **kwargs):
+    async def main():
+        db = Database(f"sqlite:///{tmp_path / 'prefs.db'}")
+        await db.create_all()
+        try:
+            return await scenario(db, UserPreferencesManager(db, **kwargs))
+        finally:
+            await db.close()
+    return asyncio.run(main())
+
+def test_concurrent_loads_of_a_user_share_one_query(tmp_path):
+    async def scenario(db, manager):
+        prefs = await asyncio.gather(*(manager.get_user_preferences(1) for _ in range(10)))
+        return prefs, manager.stats()
+
+    prefs, stats = run_with_db(tmp_path, scenario)
+    assert all(p is prefs[0] for p in prefs)
+    assert stats['loads'] == 1 and stats['coalesced'] == 9
+
+def test_updates_are_served_at_once_and_written_in_one_flush(tmp_path):
+    async def scenario(db, manager):
+        await manager.update_preference(1, 'language', 'de')
+        await manager.update_preference(1, 'theme', 'light')
+        await manager.update_preference(2, 'currency', 'EUR')
+        assert (await manager.get_user_preferences(1)).language == 'de'
+        await manager.close()
+
+        fresh = UserPreferencesManager(db)
+        return await fresh.get_user_preferences(1), await fresh.get_user_preferences(2), manager.stats()
+
+    first, second, stats = run_with_db(tmp_path, scenario, flush_interval=60)
+    assert (first.language, first.theme, second.currency) == ('de', 'light', 'EUR')
+    assert stats['flushes'] == 1 and stats['writes'] == 2 and stats['pending_writes'] == 0
+
+def test_cancelled_load_does_not_strand_coalesced_waiters(tmp_path):
+    async def scenario(db, manager):
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_load(user_id):
+            started.set()
+            await release.wait()
+
+        manager._load = slow_load
+        loader = asyncio.ensure_future(manager.get_user_preferences(1))
+        await started.wait()
+        waiter = asyncio.ensure_future(manager.get_user_preferences(1))
+        await asyncio.sleep(0)
+        loader.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(waiter, 1)
+        assert manager._loading == {}
+
+    run_with_db(tmp_path, scenario)
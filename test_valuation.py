@@ -0,0 +1,72 @@
+import random
+import numpy as np
+from valuation import PositionBook, SIDES
+
+def naive_totals(positions, prices):
+    totals = {}
+    for portfolio_id, symbol, side, quantity, entry_price in positions.values():
+        value = quantity * prices[symbol]
+        total = totals.setdefault(portfolio_id, [0, 0.0, 0.0, 0.0])
+        total[0] += 1
+        total[1] += value
+        total[2] += quantity * entry_price
+        total[3] += SIDES[side] * (value - quantity * entry_price)
+    return totals
+
+def test_swap_remove_keeps_every_row_in_place():
+    book = PositionBook(capacity=2)
+    rng = random.Random(3)
+    positions = {}
+    for position_id in range(200):
+        positions[position_id] = (rng.randrange(10), rng.choice(['BTC/USDT', 'ETH/USDT', 'SOL/USDT']),
+                                  rng.choice(['BUY', 'SELL']), rng.uniform(0.1, 5), rng.uniform(10, 100))
+        book.add(position_id, *positions[position_id])
+    for position_id in rng.sample(sorted(positions), 120):
+        assert book.remove(position_id)
+        del positions[position_id]
+    assert not book.remove(-1)
+
+    assert len(book) == len(positions)
+    for position_id, row in book._rows.items():
+        assert book.columns['position_id'][row] == position_id
+        assert book.columns['quantity'][row] == positions[position_id][3]
+
+def test_mark_totals_match_a_per_position_sum():
+    book = PositionBook()
+    rng = random.Random(5)
+    positions = {}
+    for position_id in range(100):
+        positions[position_id] = (rng.randrange(8), rng.choice(['BTC/USDT', 'ETH/USDT']),
+                                  rng.choice(['BUY', 'SELL']), rng.uniform(0.1, 5), rng.uniform(10, 100))
+        book.add(position_id, *positions[position_id])
+    # Re-adding a position replaces it
+    positions[7] = (positions[7][0], 'ETH/USDT', 'SELL', 1.0, 50.0)
+    book.add(7, *positions[7])
+    prices = {'BTC/USDT': 90.0, 'ETH/USDT': 40.0}
+
+    marked = book.mark(book.price_vector(prices))
+    expected = naive_totals(positions, prices)
+    portfolios = marked['portfolios']
+    assert sorted(portfolios['portfolio_id']) == sorted(expected)
+    for i, portfolio_id in enumerate(portfolios['portfolio_id']):
+        count, value, cost, pnl = expected[portfolio_id]
+        assert portfolios['positions'][i] == count
+        assert np.isclose(portfolios['value'][i], value)
+        assert np.isclose(portfolios['cost'][i], cost)
+        assert np.isclose(portfolios['unrealized_pnl'][i], pnl)
+
+    one = book.mark(book.price_vector(prices), portfolio_id=3)
+    assert set(one['positions']['portfolio_id']) <= {3}
+    assert list(one['portfolios']['portfolio_id']) == ([3] if 3 in expected else [])
+
+def test_positions_without_a_price_are_nan_with_their_portfolio():
+    book = PositionBook()
+    book.add(1, 10, 'BTC/USDT', 'BUY', 1.0, 100.0)
+    book.add(2, 10, 'DOGE/USDT', 'BUY', 1.0, 1.0)
+    book.add(3, 20, 'BTC/USDT', 'SELL', 2.0, 100.0)
+
+    marked = book.mark(book.price_vector({'BTC/USDT': 110.0}))
+    values = dict(zip(marked['positions']['position_id'], marked['positions']['unrealized_pnl']))
+    assert values[1] == 10.0 and np.isnan(values[2]) and values[3] == -20.0
+    totals = dict(zip(marked['portfolios']['portfolio_id'], marked['portfolios']['value']))
+    assert np.isnan(totals[10]) and totals[20] == 220.0
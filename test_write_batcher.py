@@ -0,0 +1,64 @@
+import asyncio
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from database import Alert, Database
+from write_batcher import WriteBatcher
+
+async def add_alert(session, alert_id, fail=False):
+    session.add(Alert(id=alert_id, user_id=1, coin_pair='BTC/USDT', price_threshold=float(alert_id), is_above=True))
+    await session.flush()
+    if fail:
+        raise ValueError(f"write {alert_id} failed")
+    return alert_id
+
+def run_with_db(tmp_path, scenario):
+    async def main():
+        db = Database(f"sqlite:///{tmp_path / 'batch.db'}")
+        await db.create_all()
+        try:
+            return await scenario(db)
+        finally:
+            await db.close()
+    return asyncio.run(main())
+
+def test_failed_write_is_rolled_back_alone(tmp_path):
+    async def scenario(db):
+        batcher = WriteBatcher(db, max_batch=10, max_delay=0.05)
+        outcomes = await asyncio.gather(
+            *(batcher.submit(add_alert, alert_id, alert_id == 3) for alert_id in range(1, 6)),
+            return_exceptions=True
+        )
+        async with db.session() as session:
+            stored = sorted(await session.scalars(select(Alert.id)))
+        return outcomes, stored, batcher.stats()
+
+    outcomes, stored, stats = run_with_db(tmp_path, scenario)
+    assert outcomes[:2] == [1, 2] and outcomes[3:] == [4, 5]
+    assert isinstance(outcomes[2], ValueError)
+    assert stored == [1, 2, 4, 5]
+    # All five went through one transaction
+    assert stats['batches'] == 1 and stats['writes'] == 5 and stats['failed'] == 1
+
+def test_constraint_violation_only_fails_its_own_write(tmp_path):
+    async def scenario(db):
+        batcher = WriteBatcher(db, max_batch=10, max_delay=0.05)
+        await batcher.submit(add_alert, 1)
+        outcomes = await asyncio.gather(batcher.submit(add_alert, 2), batcher.submit(add_alert, 1),
+                                        batcher.submit(add_alert, 3), return_exceptions=True)
+        async with db.session() as session:
+            stored = sorted(await session.scalars(select(Alert.id)))
+        return outcomes, stored
+
+    outcomes, stored = run_with_db(tmp_path, scenario)
+    assert outcomes[0] == 2 and outcomes[2] == 3
+    assert isinstance(outcomes[1], IntegrityError)
+    assert stored == [1, 2, 3]
+
+def test_batches_are_capped(tmp_path):
+    async def scenario(db):
+        batcher = WriteBatcher(db, max_batch=4, max_delay=0.05)
+        await asyncio.gather(*(batcher.submit(add_alert, alert_id) for alert_id in range(1, 11)))
+        return batcher.stats()
+
+    stats = run_with_db(tmp_path, scenario)
+    assert stats['writes'] == 10 and stats['max_batch'] == 4 and stats['batches'] == 3
@@ -0,0 +1,85 @@
+from typing import Dict, Hashable, List, Tuple
+import time
+
+class TimingWheel:
+    """Hierarchical timing wheel: O(1) schedule, cancel and per-tick expiry.
+
+    Level 0 has `slots` buckets of one `tick` each, every level above
+    covers `slots` times the span of the one below (64 one-second slots
+    reach about 4 years in 5 levels). A timer goes to the lowest level
+    whose span covers its distance from now; when the wheel passes the
+    start of a higher level's bucket, that bucket's timers are moved down
+    to the finer levels. So each timer is touched at most once per level,
+    however far out it is, and advancing costs nothing when no timer is
+    due. Expiry is precise to one tick.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 64, levels: int = 5, start: float = None):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.current = int((time.time() if start is None else start) // tick)
+        self._wheels: List[List[Dict[Hashable, int]]] = [[{} for _ in range(slots)] for _ in range(levels)]
+        self._where: Dict[Hashable, Tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._where
+
+    @property
+    def span(self) -> float:
+        """How far ahead, in seconds, timers can be set"""
+        return self.slots ** self.levels * self.tick
+
+    def schedule(self, key: Hashable, deadline: float):
+        """Expire `key` at `deadline` (epoch seconds), replacing its earlier timer"""
+        self.cancel(key)
+        self._place(key, max(int(-(-deadline // self.tick)), self.current + 1))
+
+    def cancel(self, key: Hashable) -> bool:
+        where = self._where.pop(key, None)
+        if where is None:
+            return False
+        level, slot = where
+        del self._wheels[level][slot][key]
+        return True
+
+    def _place(self, key: Hashable, due: int):
+        distance = due - self.current
+        level = 0
+        while level < self.levels - 1 and distance >= self.slots ** (level + 1):
+            level += 1
+        if distance >= self.slots ** self.levels:
+            raise ValueError(f"Timer of {key!r} is further out than the wheel's span")
+        slot = due // self.slots ** level % self.slots
+        self._wheels[level][slot][key] = due
+        self._where[key] = (level, slot)
+
+    def advance(self, now: float = None) -> List[Hashable]:
+        """Move the wheel up to `now`, returns the keys that expired on the way"""
+        target = int((time.time() if now is None else now) // self.tick)
+        expired = []
+        while self.current < target:
+            if not self._where:
+                # Nothing scheduled, skip ahead
+                self.current = target
+                break
+            self.current += 1
+            # Cascade the higher level buckets starting at this tick, coarsest first
+            for level in range(self.levels - 1, 0, -1):
+                if self.current % self.slots ** level == 0:
+                    bucket = self._wheels[level][self.current // self.slots ** level % self.slots]
+                    timers = list(bucket.items())
+                    bucket.clear()
+                    for key, due in timers:
+                        del self._where[key]
+                        self._place(key, due)
+            bucket = self._wheels[0][self.current % self.slots]
+            if bucket:
+                for key in bucket:
+                    del self._where[key]
+                expired.extend(bucket)
+                bucket.clear()
+        return expired
@@ -0,0 +1,133 @@
+from typing import AsyncIterator, List, Optional, Tuple
+import asyncio
+import csv
+import logging
+import os
+import tempfile
+from datetime import datetime
+from sqlalchemy import select
+from database import Database, Portfolio, Trade, User
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'parquet')
+# Columns of an export, in order
+EXPORT_COLUMNS = ('trade_id', 'telegram_id', 'symbol', 'side', 'quantity', 'entry_price', 'exit_price', 'pnl',
+                  'entry_time', 'exit_time')
+
+def _trades_query(telegram_id: Optional[int]):
+    query = (
+        select(Trade.id, User.telegram_id, Trade.symbol, Trade.side, Trade.quantity, Trade.entry_price,
+               Trade.exit_price, Trade.pnl, Trade.entry_time, Trade.exit_time)
+        .join(Portfolio, Portfolio.id == Trade.portfolio_id)
+        .join(User, User.id == Portfolio.user_id)
+        .order_by(Trade.id)
+    )
+    if telegram_id is not None:
+        query = query.where(User.telegram_id == telegram_id)
+    return query
+
+async def stream_trades(db: Database, telegram_id: int = None, chunk_size: int = 5000) -> AsyncIterator[List[Tuple]]:
+    """Trade rows of one user (everyone's when None) in chunks, by trade id.
+
+    Every chunk is read in a short session of its own, starting after the
+    last id of the previous one, so no connection is held between chunks.
+    """
+    last_id = None
+    while True:
+        query = _trades_query(telegram_id).limit(chunk_size)
+        if last_id is not None:
+            query = query.where(Trade.id > last_id)
+        async with db.session() as session:
+            rows = (await session.execute(query)).all()
+        if not rows:
+            return
+        yield [tuple(row) for row in rows]
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1][0]
+
+class CsvWriter:
+    def __init__(self, path: str):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(EXPORT_COLUMNS)
+
+    def write(self, rows: List[Tuple]):
+        self.writer.writerows(
+            [value.isoformat() if isinstance(value, datetime) else value for value in row] for row in rows
+        )
+
+    def close(self):
+        self.file.close()
+
+class ParquetWriter:
+    """One row group per chunk, so only a chunk is ever held in memory"""
+
+    def __init__(self, path: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.schema = pa.schema([
+            ('trade_id', pa.int64()), ('telegram_id', pa.int64()), ('symbol', pa.string()), ('side', pa.string()),
+            ('quantity', pa.float64()), ('entry_price', pa.float64()), ('exit_price', pa.float64()),
+            ('pnl', pa.float64()), ('entry_time', pa.timestamp('us')), ('exit_time', pa.timestamp('us'))
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema, compression='snappy')
+
+    def write(self, rows: List[Tuple]):
+        columns = list(zip(*rows))
+        self.writer.write_table(self.pa.Table.from_arrays(
+            [self.pa.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+            schema=self.schema
+        ))
+
+    def close(self):
+        self.writer.close()
+
+WRITERS = {'csv': CsvWriter, 'parquet': ParquetWriter}
+
+async def export_trades(db: Database, path: str, fmt: str = 'csv', telegram_id: int = None,
+                        chunk_size: int = 5000) -> int:
+    """Write the trade history to `path` chunk by chunk, returns the number of trades.
+
+    Chunks are read one at a time, releasing the connection before the
+    chunk is written in a thread. Memory stays at one chunk, and neither
+    the event loop nor the connection pool waits on the file.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format {fmt!r}, use one of {', '.join(FORMATS)}")
+    writer = await asyncio.to_thread(WRITERS[fmt], path)
+    count = 0
+    try:
+        async for rows in stream_trades(db, telegram_id, chunk_size):
+            await asyncio.to_thread(writer.write, rows)
+            count += len(rows)
+    finally:
+        await asyncio.to_thread(writer.close)
+    return count
+
+async def send_trade_export(bot, chat_id: int, db: Database, fmt: str = 'csv', telegram_id: int = None,
+                            chunk_size: int = 5000, max_size: int = 50 * 1024 * 1024) -> int:
+    """Export to a temporary file and send it as a Telegram document, returns the number of trades"""
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}", prefix='trades_')
+    os.close(fd)
+    try:
+        count = await export_trades(db, path, fmt, telegram_id, chunk_size)
+        if not count:
+            await bot.send_message(chat_id=chat_id, text="No trades to export yet.")
+            return 0
+        if os.path.getsize(path) > max_size:
+            # Bots can't upload more than 50 MB
+            hint = " Try /export parquet, it is much smaller." if fmt == 'csv' else ""
+            await bot.send_message(chat_id=chat_id, text=f"The export of {count:,} trades is too large to send.{hint}")
+            return count
+
+        who = 'all' if telegram_id is None else telegram_id
+        filename = f"trades_{who}_{datetime.utcnow():%Y%m%d_%H%M%S}.{fmt}"
+        with open(path, 'rb') as document:
+            await bot.send_document(chat_id=chat_id, document=document, filename=filename,
+                                    caption=f"{count:,} trades")
+        return count
+    finally:
+        os.remove(path)
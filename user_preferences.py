@@ -1,21 +1,194 @@
+from typing import Dict, Optional, Tuple
+from collections import OrderedDict
+from dataclasses import asdict, fields, replace
+import asyncio
+import logging
+import time
+from datetime import datetime
+from sqlalchemy import select
+from database import Database, UserPreference, upsert
+from dynamic_stats_manager import UserPreferences
+
+logger = logging.getLogger(__name__)
+
+PREFERENCE_FIELDS = {field.name for field in fields(UserPreferences)}
+
 class UserPreferencesManager:
-    def __init__(self, db_session):
-        self.db_session = db_session
-        self.default_preferences = UserPreferences()
-        
+    """User preferences with a read-through LRU+TTL cache and write-behind.
+
+    Up to `cache_size` users' preferences are kept for `ttl` seconds, least
+    recently used first out. Loads of the same user at the same time share
+    one query. Updates go to the cache at once and are written back in the
+    background: every `flush_interval` seconds, or as soon as `max_dirty`
+    users are waiting, all pending users are upserted in one transaction,
+    however often each changed in between. Preferences that aren't written
+    yet are always served over the database's. No more than `max_dirty`
+    users are ever pending: past that, an update of another user first
+    waits for a flush, and is refused while the database keeps failing.
+    """
+
+    def __init__(self, db: Database, cache_size: int = 10000, ttl: float = 300, flush_interval: float = 2,
+                 max_dirty: int = 1000):
+        self.db = db
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.max_dirty = max_dirty
+        self._cache: 'OrderedDict[int, Tuple[UserPreferences, float]]' = OrderedDict()
+        self._dirty: Dict[int, UserPreferences] = {}
+        self._loading: Dict[int, asyncio.Future] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._flush_now: Optional[asyncio.Event] = None
+        self.metrics = {'hits': 0, 'misses': 0, 'coalesced': 0, 'loads': 0, 'updates': 0, 'rejected': 0,
+                        'writes': 0, 'flushes': 0, 'flush_errors': 0, 'evictions': 0}
+
+    @classmethod
+    def from_config(cls, db: Database, config) -> 'UserPreferencesManager':
+        return cls(
+            db,
+            cache_size=config.PREFERENCE_CACHE_SIZE,
+            ttl=config.PREFERENCE_CACHE_TTL,
+            flush_interval=config.PREFERENCE_FLUSH_INTERVAL
+        )
+
     async def get_user_preferences(self, user_id: int) -> UserPreferences:
         """Get user preferences or create default"""
-        prefs = await self.db_session.get_preferences(user_id)
-        if not prefs:
-            prefs = self.default_preferences
-            await self.save_user_preferences(user_id, prefs)
-        return prefs
-    
+        prefs = self._dirty.get(user_id)
+        if prefs is not None:
+            self.metrics['hits'] += 1
+            return prefs
+        cached = self._cache.get(user_id)
+        if cached is not None and time.monotonic() - cached[1] < self.ttl:
+            self.metrics['hits'] += 1
+            self._cache.move_to_end(user_id)
+            return cached[0]
+
+        self.metrics['misses'] += 1
+        loading = self._loading.get(user_id)
+        if loading is not None:
+            self.metrics['coalesced'] += 1
+            return await asyncio.shield(loading)
+
+        loading = self._loading[user_id] = asyncio.get_running_loop().create_future()
+        try:
+            prefs = await self._load(user_id)
+            # An update may have come in while loading
+            prefs = self._dirty.get(user_id, prefs)
+            self._remember(user_id, prefs)
+            loading.set_result(prefs)
+            return prefs
+        except Exception as e:
+            loading.set_exception(e)
+            # Retrieved here, so waiting on it elsewhere is optional
+            loading.exception()
+            raise
+        except BaseException:
+            # Cancelled mid-load, the coalesced waiters must not wait forever
+            loading.cancel()
+            raise
+        finally:
+            del self._loading[user_id]
+
     async def update_preference(self, user_id: int, key: str, value: str):
         """Update a single preference"""
-        prefs = await self.get_user_preferences(user_id)
-        if hasattr(prefs, key):
-            setattr(prefs, key, value)
-            await self.save_user_preferences(user_id, prefs)
-            return True
-        return False
\ No newline at end of file
+        if key not in PREFERENCE_FIELDS:
+            return False
+        prefs = replace(await self.get_user_preferences(user_id), **{key: value})
+        if user_id not in self._dirty and len(self._dirty) >= self.max_dirty:
+            # Backpressure, pending writes stay bounded
+            await self.flush()
+            if len(self._dirty) >= self.max_dirty:
+                self.metrics['rejected'] += 1
+                return False
+        self.metrics['updates'] += 1
+        self._remember(user_id, prefs)
+        self._dirty[user_id] = prefs
+        self._ensure_flusher()
+        if len(self._dirty) >= self.max_dirty:
+            self._flush_now.set()
+        return True
+
+    def invalidate(self, user_id: int = None):
+        """Forget cached preferences (of everyone when None), the next read goes to the database.
+
+        Pending writes are kept and still served until they are written.
+        """
+        if user_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(user_id, None)
+
+    def _remember(self, user_id: int, prefs: UserPreferences):
+        self._cache[user_id] = (prefs, time.monotonic())
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+            self.metrics['evictions'] += 1
+
+    async def _load(self, user_id: int) -> UserPreferences:
+        self.metrics['loads'] += 1
+        async with self.db.session() as session:
+            row = await session.scalar(select(UserPreference.values).where(UserPreference.user_id == user_id))
+        if row is None:
+            # Defaults aren't stored, they're written with the first change
+            return UserPreferences()
+        return UserPreferences(**{key: value for key, value in row.items() if key in PREFERENCE_FIELDS})
+
+    def _ensure_flusher(self):
+        if self._flusher is None or self._flusher.done():
+            self._flush_now = asyncio.Event()
+            self._flusher = asyncio.get_running_loop().create_task(self._run_flusher())
+
+    async def _run_flusher(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write every pending change now, in one transaction"""
+        if not self._dirty:
+            return
+        pending = dict(self._dirty)
+        now = datetime.utcnow()
+        try:
+            async with self.db.session() as session:
+                statement = upsert(session, UserPreference)
+                await session.execute(
+                    statement.on_conflict_do_update(
+                        index_elements=['user_id'],
+                        set_={'values': statement.excluded['values'], 'updated_at': statement.excluded.updated_at}
+                    ),
+                    [{'user_id': user_id, 'values': asdict(prefs), 'updated_at': now}
+                     for user_id, prefs in pending.items()]
+                )
+                await session.commit()
+        except Exception as e:
+            # Left pending, the next flush tries again
+            self.metrics['flush_errors'] += 1
+            logger.error(f"Error writing preferences of {len(pending)} users: {str(e)}")
+            return
+
+        self.metrics['flushes'] += 1
+        self.metrics['writes'] += len(pending)
+        for user_id, prefs in pending.items():
+            # Unless it changed again meanwhile
+            if self._dirty.get(user_id) is prefs:
+                del self._dirty[user_id]
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+        await self.flush()
+
+    def stats(self) -> Dict:
+        lookups = self.metrics['hits'] + self.metrics['misses']
+        return {
+            **self.metrics,
+            'hit_rate': self.metrics['hits'] / lookups if lookups else 0.0,
+            'cached': len(self._cache),
+            'pending_writes': len(self._dirty)
+        }
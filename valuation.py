@@ -0,0 +1,167 @@
+from typing import Dict, List, Tuple
+import logging
+import numpy as np
+from sqlalchemy import select
+from database import Position, follow_commits
+
+logger = logging.getLogger(__name__)
+
+SIDES = {'BUY': 1, 'SELL': -1}
+
+class PositionBook:
+    """Every open position held as NumPy columns, for marking to market at once.
+
+    Rows are (position id, portfolio, symbol id, side, quantity, entry
+    price); symbols and portfolios are numbered densely as they show up, so
+    a price vector is indexed by symbol id and per-portfolio totals are a
+    bincount. Positions are added at the end and removed by moving the last
+    row into their place, both O(1).
+
+    Bound to sessions, the book follows the positions committed through
+    them, like AlertIndex does for alerts.
+    """
+
+    COLUMNS = (('position_id', np.int64), ('portfolio', np.int32), ('symbol', np.int32),
+               ('side', np.int8), ('quantity', np.float64), ('entry_price', np.float64))
+
+    def __init__(self, capacity: int = 1024):
+        self.columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in self.COLUMNS}
+        self.symbols: List[str] = []
+        self.symbol_ids: Dict[str, int] = {}
+        self.portfolio_ids: List[int] = []
+        self._portfolio_index: Dict[int, int] = {}
+        self._rows: Dict[int, int] = {}
+        self.size = 0
+        self.loaded = False
+
+    def clear(self):
+        self.symbols.clear()
+        self.symbol_ids.clear()
+        self.portfolio_ids.clear()
+        self._portfolio_index.clear()
+        self._rows.clear()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, position_id: int) -> bool:
+        return position_id in self._rows
+
+    def _symbol_id(self, symbol: str) -> int:
+        symbol_id = self.symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = self.symbol_ids[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return symbol_id
+
+    def _portfolio(self, portfolio_id: int) -> int:
+        index = self._portfolio_index.get(portfolio_id)
+        if index is None:
+            index = self._portfolio_index[portfolio_id] = len(self.portfolio_ids)
+            self.portfolio_ids.append(portfolio_id)
+        return index
+
+    def add(self, position_id: int, portfolio_id: int, symbol: str, side: str, quantity: float, entry_price: float):
+        if position_id in self._rows:
+            self.remove(position_id)
+        if self.size == len(self.columns['position_id']):
+            self.columns = {name: np.resize(values, 2 * len(values)) for name, values in self.columns.items()}
+
+        row = self.size
+        self.columns['position_id'][row] = position_id
+        self.columns['portfolio'][row] = self._portfolio(portfolio_id)
+        self.columns['symbol'][row] = self._symbol_id(symbol)
+        self.columns['side'][row] = SIDES[side]
+        self.columns['quantity'][row] = quantity
+        self.columns['entry_price'][row] = entry_price
+        self._rows[position_id] = row
+        self.size += 1
+
+    def remove(self, position_id: int) -> bool:
+        row = self._rows.pop(position_id, None)
+        if row is None:
+            return False
+        last = self.size - 1
+        if row != last:
+            for values in self.columns.values():
+                values[row] = values[last]
+            self._rows[int(self.columns['position_id'][row])] = row
+        self.size = last
+        return True
+
+    def price_vector(self, prices: Dict[str, float]) -> np.ndarray:
+        """Prices by symbol id, NaN for symbols without one"""
+        vector = np.full(len(self.symbols), np.nan)
+        for symbol, price in prices.items():
+            symbol_id = self.symbol_ids.get(symbol)
+            if symbol_id is not None:
+                vector[symbol_id] = price
+        return vector
+
+    def mark(self, prices: np.ndarray, portfolio_id: int = None) -> Dict:
+        """Value the open positions, of everyone or of one portfolio, at a price vector.
+
+        Per position: market value and unrealized PnL. Per portfolio: their
+        sums and the cost basis. Positions without a price are NaN, and so
+        are the totals of their portfolio.
+        """
+        n = self.size
+        columns = {name: values[:n] for name, values in self.columns.items()}
+        if portfolio_id is not None:
+            index = self._portfolio_index.get(portfolio_id, -1)
+            selected = columns['portfolio'] == index
+            columns = {name: values[selected] for name, values in columns.items()}
+
+        price = prices[columns['symbol']]
+        quantity = columns['quantity']
+        value = quantity * price
+        cost = quantity * columns['entry_price']
+        pnl = columns['side'] * (value - cost)
+
+        portfolios = len(self.portfolio_ids)
+        totals = {
+            name: np.bincount(columns['portfolio'], weights=values, minlength=portfolios)
+            for name, values in (('value', value), ('cost', cost), ('unrealized_pnl', pnl))
+        }
+        counts = np.bincount(columns['portfolio'], minlength=portfolios)
+        held = np.flatnonzero(counts)
+        return {
+            'positions': {
+                'position_id': columns['position_id'],
+                'portfolio_id': np.asarray(self.portfolio_ids, dtype=np.int64)[columns['portfolio']],
+                'value': value,
+                'unrealized_pnl': pnl
+            },
+            'portfolios': {
+                'portfolio_id': np.asarray(self.portfolio_ids, dtype=np.int64)[held],
+                'positions': counts[held],
+                **{name: values[held] for name, values in totals.items()}
+            }
+        }
+
+    async def load(self, session):
+        """(Re)build the book from the positions table"""
+        self.clear()
+        rows = await session.stream(
+            select(Position.id, Position.portfolio_id, Position.symbol, Position.side, Position.quantity,
+                   Position.entry_price).execution_options(yield_per=10000)
+        )
+        async for row in rows:
+            self.add(*row)
+        self.loaded = True
+        logger.info(f"Loaded {self.size} open positions of {len(self.portfolio_ids)} portfolios")
+
+    def bind(self, target):
+        """Keep the book in sync with the positions committed through `target` (a session or Session class)"""
+        follow_commits(target, Position, self._snapshot, self._apply)
+
+    @staticmethod
+    def _snapshot(position: Position) -> Tuple:
+        return position.portfolio_id, position.symbol, position.side, position.quantity, position.entry_price
+
+    def _apply(self, position_id: int, entry):
+        if entry is None:
+            self.remove(position_id)
+        else:
+            self.add(position_id, *entry)
@@ -0,0 +1,108 @@
+from typing import Awaitable, Callable, Dict, List, Tuple
+from collections import deque
+import asyncio
+import logging
+import time
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+class WriteBatcher:
+    """Group commit: many handlers' writes share one transaction.
+
+    `submit(fn, *args)` queues `fn(session, *args)` and waits for it. A
+    single writer takes up to `max_batch` queued writes, waiting at most
+    `max_delay` seconds after the first for more, and runs them one after
+    another in one session, each in a SAVEPOINT of its own, then commits
+    once. A write that raises is rolled back alone and its caller gets the
+    exception, the others carry on; if the commit fails, every caller of
+    the batch gets that error. Writes are applied in the order they were
+    submitted, so one user's actions never overtake each other.
+    """
+
+    def __init__(self, db: Database, max_batch: int = 100, max_delay: float = 0.005):
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: asyncio.Queue = None
+        self._full: asyncio.Event = None
+        self._writer: asyncio.Task = None
+        self.metrics = {'batches': 0, 'writes': 0, 'failed': 0, 'commit_errors': 0, 'max_batch': 0}
+        self._commit_times = deque(maxlen=1000)
+
+    def _ensure_writer(self):
+        if self._writer is None or self._writer.done():
+            self._queue = asyncio.Queue()
+            self._full = asyncio.Event()
+            self._writer = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, fn: Callable[..., Awaitable], *args):
+        """Run `fn(session, *args)` in the next group commit, returns its result once committed"""
+        self._ensure_writer()
+        done = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((fn, args, done))
+        if self._queue.qsize() >= self.max_batch:
+            self._full.set()
+        return await done
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            if self._queue.qsize() < self.max_batch - 1:
+                # Give other writers a moment to join, unless the batch fills up first
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._write(batch)
+
+    async def _write(self, batch: List[Tuple[Callable, tuple, asyncio.Future]]):
+        self.metrics['batches'] += 1
+        self.metrics['max_batch'] = max(self.metrics['max_batch'], len(batch))
+        results: List[Tuple[asyncio.Future, bool, object]] = []
+        try:
+            async with self.db.session() as session:
+                for fn, args, done in batch:
+                    try:
+                        async with session.begin_nested():
+                            results.append((done, True, await fn(session, *args)))
+                    except Exception as e:
+                        results.append((done, False, e))
+                started = time.monotonic()
+                await session.commit()
+                self._commit_times.append(time.monotonic() - started)
+        except Exception as e:
+            self.metrics['commit_errors'] += 1
+            logger.error(f"Group commit of {len(batch)} writes failed: {str(e)}")
+            for _, _, done in batch:
+                if not done.done():
+                    done.set_exception(e)
+            self.metrics['failed'] += len(batch)
+            return
+
+        for done, succeeded, outcome in results:
+            self.metrics['writes'] += 1
+            if done.done():
+                # Its caller went away
+                continue
+            if succeeded:
+                done.set_result(outcome)
+            else:
+                self.metrics['failed'] += 1
+                done.set_exception(outcome)
+
+    def stats(self) -> Dict:
+        commits = sorted(self._commit_times)
+        return {
+            **self.metrics,
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'avg_batch': self.metrics['writes'] / self.metrics['batches'] if self.metrics['batches'] else 0.0,
+            'commit_ms': {
+                'avg': sum(commits) / len(commits) * 1000 if commits else 0.0,
+                'p95': commits[int(len(commits) * 0.95)] * 1000 if commits else 0.0,
+                'max': commits[-1] * 1000 if commits else 0.0
+            }
+        }